@@ -1,17 +1,46 @@
 """
 🏅 KaratMeter Labs - One-Click Fetch & Email Script
 This script fetches live gold prices and sends email report
+
+Options:
+    --timing       print a per-source phase breakdown (dns, headers, download, parse)
+    --profile [N]  run the fetch under cProfile and print the N hottest functions
+    --cache-max-age SECONDS
+                   reuse pages fetched by a previous run within this many seconds
+                   (default 300; older pages are revalidated, 0 always revalidates)
+    --no-cache     ignore the on-disk page cache
+    --force-email  send the full report even if prices have not changed since the last one
 """
 
 import sys
 import os
+import argparse
 
 # Add backend to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
-from price_fetcher_api import fetch_all_internal, send_email_report
+from price_fetcher_api import (
+    enable_http_cache, enable_stats_file, fetch_all_internal, fetch_all_timed, send_changed_reports
+)
+from profiling import format_hot_functions, format_timings, run_profiled
 
 def main():
+    parser = argparse.ArgumentParser(description='Fetch live gold prices and email the report')
+    parser.add_argument('--timing', action='store_true', help='print a per-phase timing breakdown')
+    parser.add_argument('--profile', nargs='?', type=int, const=25, metavar='N',
+                        help='profile the fetch and print the N hottest functions (default 25)')
+    parser.add_argument('--cache-max-age', type=int, default=300, metavar='SECONDS',
+                        help='reuse pages from a previous run for this long (default 300)')
+    parser.add_argument('--no-cache', action='store_true', help='ignore the on-disk page cache')
+    parser.add_argument('--force-email', action='store_true',
+                        help='send the full report even if prices have not changed')
+    args = parser.parse_args()
+    
+    if not args.no_cache:
+        enable_http_cache(max_age=args.cache_max_age)
+    # Trends in the report need the ticks recorded by earlier runs
+    enable_stats_file()
+    
     print("\n" + "="*60)
     print("  🏅 KaratMeter Labs - Fetch & Email Script")
     print("="*60)
@@ -19,7 +48,21 @@ def main():
     print("This will take 5-10 seconds...\n")
     
     # Fetch all prices and calculations
-    data = fetch_all_internal()
+    timings = {} if args.timing else None
+    hot = None
+    if args.profile:
+        data, hot = run_profiled(fetch_all_timed, timings, top=args.profile)
+    elif args.timing:
+        data = fetch_all_timed(timings)
+    else:
+        data = fetch_all_internal()
+    
+    if timings is not None:
+        print("\n⏱️  Timing breakdown:")
+        print(format_timings(timings))
+    if hot is not None:
+        print("\n🔥 Hottest functions (cumulative time):")
+        print(format_hot_functions(hot))
     
     if data['success']:
         print("\n✅ Prices fetched successfully!")
@@ -38,19 +81,19 @@ def main():
             print(f"   24K: ₹{ca['prices'].get('24k')}/10gm")
             print(f"   22K: ₹{ca['prices'].get('22k')}/10gm")
         
-        # Send email
+        # Send email (only to recipients whose prices moved since their last report)
         print("\n📧 Sending email report...")
-        email_sent = send_email_report(data)
+        outcomes = send_changed_reports(data, force=args.force_email)
         
-        if email_sent:
-            print("\n✅ Email sent successfully to: faseen1532@gmail.com")
-            print("\nEmail contains:")
-            print("  • Live gold prices from all sources")
-            print("  • Sovereign calculations (8g & 16g)")
-            print("  • Customs duty calculations (Red & Green)")
-            print("  • All with beautiful HTML formatting")
-        else:
-            print("\n❌ Failed to send email. Check your email configuration.")
+        for recipient, outcome in outcomes.items():
+            if outcome == 'full':
+                print(f"\n✅ Full report sent to: {recipient}")
+            elif outcome == 'digest':
+                print(f"\n📨 No significant change, digest sent to: {recipient}")
+            elif outcome == 'skip':
+                print(f"\n⏭️  No significant change, nothing sent to: {recipient}")
+            else:
+                print(f"\n❌ Failed to send email to {recipient}. Check your email configuration.")
         
         print("\n" + "="*60)
         print("  Task Complete!")
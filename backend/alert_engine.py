@@ -0,0 +1,221 @@
+"""
+KaratMate Labs - Price Alerts
+"Notify me when Kerala 22K drops below X" subscriptions, indexed so that a price
+update only visits the alerts whose thresholds it crossed
+
+Per metric, 'below' and 'above' alerts are kept in lists sorted by threshold.
+A move from old to new fires the below-alerts with new < threshold <= old, or
+the above-alerts with old <= threshold < new: two bisects and a slice however
+many alerts are registered.
+
+Alerts live in a SQLite file: adding or removing one writes just that row, however
+many there are. The in-memory index is rebuilt only when another process (an API
+worker) has changed the file. An alerts.json from older versions is imported once.
+"""
+
+import bisect
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+DIRECTIONS = ('below', 'above')
+DEFAULT_ALERTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alerts.db')
+LEGACY_ALERTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alerts.json')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    metric TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    email TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (email, metric, direction, threshold)
+);
+"""
+COLUMNS = ('id', 'metric', 'direction', 'threshold', 'email', 'created_at')
+
+# An alert that fired stays quiet this long, so a price hovering at the threshold mails once
+DEFAULT_COOLDOWN = 6 * 3600
+
+
+class AlertError(ValueError):
+    """Raised for an invalid alert subscription"""
+
+
+def group_by_recipient(crossings):
+    """Crossings -> {email: [crossing, ...]} (one notification per recipient)"""
+    grouped = {}
+    for crossing in crossings:
+        grouped.setdefault(crossing['email'], []).append(crossing)
+    return grouped
+
+
+class AlertEngine:
+    """Threshold alerts indexed by (metric, direction)"""
+
+    def __init__(self, path=DEFAULT_ALERTS_FILE, cooldown=DEFAULT_COOLDOWN, legacy_path=LEGACY_ALERTS_FILE):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._alerts = {}    # id -> alert
+        self._index = {}     # (metric, direction) -> sorted [(threshold, id)]
+        self._keys = {}      # (email, metric, direction, threshold) -> id
+        self._conn = None    # opened on first use, only used under _lock
+        self._data_version = None
+        self._last = {}      # metric -> last value evaluated
+        self._fired = {}     # id -> time it last fired
+
+    def _connect(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            self._import_legacy()
+        return self._conn
+
+    def _import_legacy(self):
+        """Copy the alerts of an old alerts.json into an empty database (once)"""
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        if self._conn.execute('SELECT 1 FROM alerts LIMIT 1').fetchone():
+            return
+        try:
+            with open(self.legacy_path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO alerts (id, metric, direction, threshold, email, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [tuple(alert.get(column, 0) for column in COLUMNS) for alert in saved.get('alerts', [])])
+
+    def _reload_if_changed(self):
+        # data_version moves only when another connection commits; our own writes update memory directly
+        conn = self._connect()
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if version == self._data_version:
+            return
+        self._rebuild([dict(zip(COLUMNS, row)) for row in conn.execute(f"SELECT {', '.join(COLUMNS)} FROM alerts")])
+        self._data_version = version
+
+    def _rebuild(self, alerts):
+        self._alerts = {alert['id']: alert for alert in alerts}
+        self._index = {}
+        self._keys = {}
+        for alert in alerts:
+            self._index.setdefault((alert['metric'], alert['direction']), []).append((alert['threshold'], alert['id']))
+            self._keys[self._key(alert)] = alert['id']
+        for entries in self._index.values():
+            entries.sort()
+
+    def _key(self, alert):
+        return (alert['email'], alert['metric'], alert['direction'], alert['threshold'])
+
+    def add(self, metric, direction, threshold, email):
+        """
+        Subscribe email to a threshold crossing; returns the alert
+
+        Registering the same (email, metric, direction, threshold) twice returns
+        the existing alert instead of a duplicate.
+        """
+        if direction not in DIRECTIONS:
+            raise AlertError(f"direction must be one of {', '.join(DIRECTIONS)}")
+        try:
+            threshold = float(threshold)
+        except (TypeError, ValueError):
+            raise AlertError('threshold must be a number')
+        if not math.isfinite(threshold):
+            raise AlertError('threshold must be a number')
+        email = (email or '').strip().lower()
+        if '@' not in email:
+            raise AlertError('a valid email is required')
+
+        with self._lock:
+            self._reload_if_changed()
+            existing = self._keys.get((email, metric, direction, threshold))
+            if existing is not None:
+                return dict(self._alerts[existing])
+            alert = {
+                'metric': metric,
+                'direction': direction,
+                'threshold': threshold,
+                'email': email,
+                'created_at': time.time()
+            }
+            with self._conn:
+                cursor = self._conn.execute(
+                    'INSERT OR IGNORE INTO alerts (metric, direction, threshold, email, created_at) '
+                    'VALUES (?, ?, ?, ?, ?)', (metric, direction, threshold, email, alert['created_at']))
+            if not cursor.rowcount:
+                # Another process registered the same alert since our last reload
+                self._reload_if_changed()
+                return dict(self._alerts[self._keys[(email, metric, direction, threshold)]])
+            alert = dict({'id': cursor.lastrowid}, **alert)
+            self._alerts[alert['id']] = alert
+            bisect.insort(self._index.setdefault((metric, direction), []), (threshold, alert['id']))
+            self._keys[self._key(alert)] = alert['id']
+            return dict(alert)
+
+    def remove(self, alert_id):
+        """Unsubscribe; False if there is no such alert"""
+        with self._lock:
+            self._reload_if_changed()
+            alert = self._alerts.pop(alert_id, None)
+            if alert is None:
+                return False
+            entries = self._index[(alert['metric'], alert['direction'])]
+            del entries[bisect.bisect_left(entries, (alert['threshold'], alert_id))]
+            del self._keys[self._key(alert)]
+            self._fired.pop(alert_id, None)
+            with self._conn:
+                self._conn.execute('DELETE FROM alerts WHERE id = ?', (alert_id,))
+            return True
+
+    def alerts(self, email=None):
+        with self._lock:
+            self._reload_if_changed()
+            return [dict(alert) for alert in self._alerts.values() if email is None or alert['email'] == email]
+
+    def count(self):
+        with self._lock:
+            self._reload_if_changed()
+            return len(self._alerts)
+
+    def evaluate(self, values, now=None):
+        """
+        Feed the latest {metric: value}; returns the alerts crossed since the last call
+
+        The first value seen for a metric only sets the baseline. Each crossing is
+        {'id', 'metric', 'direction', 'threshold', 'email', 'value', 'previous'}.
+        """
+        now = time.time() if now is None else now
+        crossings = []
+        with self._lock:
+            self._reload_if_changed()
+            for metric, value in values.items():
+                previous = self._last.get(metric)
+                self._last[metric] = value
+                if previous is None or value == previous:
+                    continue
+                if value < previous:
+                    entries = self._index.get((metric, 'below'), ())
+                    lo = bisect.bisect_right(entries, (value, math.inf))
+                    hi = bisect.bisect_right(entries, (previous, math.inf))
+                else:
+                    entries = self._index.get((metric, 'above'), ())
+                    lo = bisect.bisect_left(entries, (previous, -math.inf))
+                    hi = bisect.bisect_left(entries, (value, -math.inf))
+                for _, alert_id in entries[lo:hi]:
+                    if now - self._fired.get(alert_id, -math.inf) < self.cooldown:
+                        continue
+                    self._fired[alert_id] = now
+                    crossings.append(dict(self._alerts[alert_id], value=value, previous=previous))
+        return crossings
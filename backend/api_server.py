@@ -8,50 +8,64 @@ from flask_cors import CORS
 import json
 import os
 from datetime import datetime
-from gold_tracker import GoldPriceTracker
+from gold_tracker import GoldPriceTracker, DEFAULT_CONFIG
+from config_store import ConfigStore, ConfigConflict
+from metrics import TRACKER_RUNS, install_flask_metrics
+from run_queue import QueueFull, RunQueue
+from tracker_jobs import JobStore
+from spot_quota import spot_quotes
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['Retry-After', 'Location'])
+install_flask_metrics(app, 'tracker_api')
 
 CONFIG_FILE = 'config.json'
+config_store = ConfigStore(CONFIG_FILE, defaults=DEFAULT_CONFIG)
+
+# Each tracker run drives several headless Chromes: run one at a time, queue a few more,
+# and let requests arriving during a run (same config) share its report
+tracker_runs = RunQueue(max_running=1, max_waiting=4, default_duration=60, name='tracker')
+
+# Every run is a job (progress events, report by id); finished jobs are kept for 15 minutes.
+# Both live in this process, so serve.py runs the tracker as a single worker
+tracker_jobs = JobStore(tracker_runs, ttl=900)
+
+
+def run_tracker(config, progress=None):
+    return GoldPriceTracker(config=config).run(progress=progress)
+
+
+def start_tracker_job():
+    """Start a run with the current config (or join the one in progress) -> (job, shared)"""
+    config = config_store.get()
+    job, shared = tracker_jobs.start(config.get('version'), run_tracker, config)
+    TRACKER_RUNS.inc(admission='shared' if shared else 'started')
+    return job, shared
+
+
+def queue_full_response(e):
+    TRACKER_RUNS.inc(admission='rejected')
+    return jsonify({'success': False, 'error': 'Too many price fetches in progress, retry shortly',
+                    'queue': tracker_runs.status()}), 429, {'Retry-After': str(e.retry_after)}
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat(), 'tracker_runs': tracker_runs.status()})
+
+
+@app.route('/api/spot-quota', methods=['GET'])
+def spot_quota_status():
+    """Remaining spot-price API budget and cached quote age per API"""
+    return jsonify({'success': True, 'apis': spot_quotes.status()})
 
 
 @app.route('/api/config', methods=['GET'])
 def get_config():
     """Get current configuration"""
     try:
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-        else:
-            # Return default config
-            config = {
-                'sources': {
-                    'kalyan': True,
-                    'joy_alukkas': True,
-                    'bhima': True,
-                    'candere': True
-                },
-                'email': {
-                    'sender': 'fasin.absons@gmail.com',
-                    'password': '',  # Don't send password to frontend
-                    'recipient': 'faseen1532@gmail.com'
-                },
-                'calculations': {
-                    'making_charges': 12,
-                    'making_gst': 3,
-                    'vat_gst': 5,
-                    'customs_exemption': 50000,
-                    'red_channel_rate': 6,
-                    'green_channel_rate': 33
-                }
-            }
+        config = config_store.get()
         
         # Remove password before sending
         if 'email' in config and 'password' in config['email']:
@@ -65,29 +79,14 @@ def get_config():
 
 @app.route('/api/config', methods=['POST'])
 def update_config():
-    """Update configuration"""
+    """Update configuration (only provided fields; send 'version' to reject stale edits)"""
     try:
-        new_config = request.json
-        
-        # Load existing config
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-        else:
-            config = {}
-        
-        # Update config (only update provided fields)
-        for key, value in new_config.items():
-            if isinstance(value, dict) and key in config:
-                config[key].update(value)
-            else:
-                config[key] = value
+        config = config_store.update(request.json)
         
-        # Save config
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=4)
-        
-        return jsonify({'success': True, 'message': 'Configuration updated'})
+        return jsonify({'success': True, 'message': 'Configuration updated', 'version': config['version']})
+    
+    except ConfigConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -95,17 +94,79 @@ def update_config():
 
 @app.route('/api/fetch-prices', methods=['POST'])
 def fetch_prices():
-    """Fetch current gold prices"""
+    """
+    Fetch current gold prices
+    
+    Joins the run already in progress for the same config; answers 429 with Retry-After
+    when the run queue is full. Holds the request until the run ends; POST /api/jobs
+    returns at once instead.
+    """
     try:
-        tracker = GoldPriceTracker(CONFIG_FILE)
-        report = tracker.run()
+        try:
+            job, shared = start_tracker_job()
+        except QueueFull as e:
+            return queue_full_response(e)
+        report = job.wait()
         
-        return jsonify({'success': True, 'report': report})
+        return jsonify({'success': True, 'report': report, 'shared': shared})
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Start a price fetch in the background -> 202 with the job id (or the running job's)"""
+    try:
+        job, shared = start_tracker_job()
+    except QueueFull as e:
+        return queue_full_response(e)
+    return jsonify({'success': True, 'job': job.summary(report=False), 'shared': shared}), 202, {
+        'Location': f'/api/jobs/{job.id}'}
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job state and per-source progress; the report once it is done"""
+    job = tracker_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found (or expired)'}), 404
+    return jsonify({'success': True, 'job': job.summary()})
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Server-sent events for a job: started, running, one 'source' per finished source,
+    saved, then done or failed. Reconnects resume after the Last-Event-ID header.
+    """
+    job = tracker_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found (or expired)'}), 404
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_id = 0
+    return app.response_class(job_event_stream(job, last_id), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def job_event_stream(job, last_id, keepalive=15):
+    """SSE lines for the job's events after last_id, until it finishes (the job outlives the stream)"""
+    while True:
+        events = job.events_after(last_id, timeout=keepalive)
+        if not events:
+            if job.finished:
+                return
+            yield ': keepalive\n\n'
+            continue
+        for event in events:
+            last_id = event['id']
+            yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        if job.finished and last_id == len(job.events):
+            return
+
+
 @app.route('/api/reports', methods=['GET'])
 def get_reports():
     """Get list of saved reports"""
@@ -157,21 +218,15 @@ def send_test_email():
     try:
         data = request.json
         
-        # Update config temporarily for test
-        config = {
+        # Override the email settings for this request only (nothing written to disk)
+        config = config_store.with_overrides({
             'email': {
                 'sender': data.get('sender', 'fasin.absons@gmail.com'),
                 'password': data.get('password', ''),
                 'recipient': data.get('recipient', 'faseen1532@gmail.com')
             }
-        }
-        
-        # Save temporary config
-        with open('temp_config.json', 'w') as f:
-            json.dump(config, f)
-        
-        # Create tracker with temp config
-        tracker = GoldPriceTracker('temp_config.json')
+        })
+        tracker = GoldPriceTracker(config=config)
         
         # Create simple test report
         test_report = {
@@ -183,10 +238,6 @@ def send_test_email():
         # Send email
         success = tracker.send_email_notification(test_report)
         
-        # Clean up
-        if os.path.exists('temp_config.json'):
-            os.remove('temp_config.json')
-        
         if success:
             return jsonify({'success': True, 'message': 'Test email sent successfully'})
         else:
@@ -205,9 +256,14 @@ if __name__ == '__main__':
     print("  GET  /api/config")
     print("  POST /api/config")
     print("  POST /api/fetch-prices")
+    print("  POST /api/jobs")
+    print("  GET  /api/jobs/<id>")
+    print("  GET  /api/jobs/<id>/events")
     print("  GET  /api/reports")
     print("  GET  /api/reports/<filename>")
     print("  POST /api/send-test-email")
+    print("  GET  /api/spot-quota")
+    print("  GET  /metrics")
     print("="*50 + "\n")
     
     app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,105 @@
+"""
+KaratMate Labs - Import-Time Budget
+Measures `python -X importtime` for each entry point and fails (exit 1) if any
+of them imports slower than its budget
+
+Usage:
+    python bench_imports.py                 # all entry points, best of 3
+    python bench_imports.py api_server --top 15
+    python bench_imports.py --json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+
+# Entry point -> (directory it is imported from, budget in milliseconds)
+ENTRY_POINTS = {
+    'api_server': (BACKEND_DIR, 400),
+    'price_fetcher_api': (BACKEND_DIR, 400),
+    'price_api_async': (BACKEND_DIR, 600),
+    'serve': (BACKEND_DIR, 150),
+    'gold_tracker': (BACKEND_DIR, 250),
+    'export_history': (BACKEND_DIR, 100),
+    'RUN_FETCH_EMAIL': (ROOT_DIR, 450)
+}
+
+
+def parse_importtime(stderr):
+    """-X importtime output -> [(module, self_us, cumulative_us, depth)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(module, directory):
+    """Import `module` in a fresh interpreter -> (cumulative ms, rows)"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([directory, BACKEND_DIR]))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=directory, env=env, capture_output=True, text=True
+    )
+    rows = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr.splitlines()[-1]}')
+    total = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    return total / 1000, rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import-time budget check for the backend entry points')
+    parser.add_argument('modules', nargs='*', metavar='module',
+                        help=f"entry points to measure (default: all of {', '.join(ENTRY_POINTS)})")
+    parser.add_argument('--repeat', type=int, default=3, help='runs per entry point (best is kept)')
+    parser.add_argument('--top', type=int, default=5, help='slowest imports to list per entry point')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args(argv)
+    unknown = [module for module in args.modules if module not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(unknown)}")
+
+    results = []
+    for module in args.modules or ENTRY_POINTS:
+        directory, budget = ENTRY_POINTS[module]
+        try:
+            best, rows = min((measure(module, directory) for _ in range(args.repeat)), key=lambda r: r[0])
+        except RuntimeError as e:
+            results.append({'module': module, 'budget_ms': budget, 'error': str(e), 'ok': False})
+            continue
+        slowest = sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]
+        results.append({
+            'module': module,
+            'import_ms': round(best, 1),
+            'budget_ms': budget,
+            'ok': best <= budget,
+            'slowest': [{'module': name, 'self_ms': round(self_us / 1000, 1)} for name, self_us, _, _ in slowest]
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'Entry point':<20} {'Import ms':>10} {'Budget ms':>10}  Result")
+        for row in results:
+            if 'error' in row:
+                print(f"{row['module']:<20} {'-':>10} {row['budget_ms']:>10}  ERROR {row['error']}")
+                continue
+            print(f"{row['module']:<20} {row['import_ms']:>10.1f} {row['budget_ms']:>10}  "
+                  f"{'ok' if row['ok'] else 'OVER BUDGET'}")
+            for slow in row['slowest']:
+                print(f"{'':<22}{slow['self_ms']:>8.1f}  {slow['module']}")
+
+    return 0 if all(row['ok'] for row in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
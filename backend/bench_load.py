@@ -0,0 +1,397 @@
+"""
+KaratMate Labs - API Load Test
+Runs a weighted request mix at one or more concurrency levels against the price
+API (serve.py or the async app) or the tracker API and reports throughput and
+p50/p95/p99 latency per route
+
+The scraped sites, the FX API and SMTP are replaced by local stubs: the server
+runs as a subprocess with a generated sitecustomize.py that sends its upstream
+HTTP (requests and httpx) to the stub site and its mail to the stub SMTP server,
+in every worker process it spawns too. Nothing leaves the machine.
+
+Usage:
+    python bench_load.py price --workers 4 --concurrency 8 32 --duration 15
+    python bench_load.py async --mix "GET /api/fetch/all=20,POST /api/fetch-and-email=1"
+    python bench_load.py tracker --reports 500 --json > tracker.json
+"""
+
+import argparse
+import http.client
+import http.server
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+STUB_UPSTREAM_ENV = 'KARATMATE_STUB_UPSTREAM'
+STUB_SMTP_ENV = 'KARATMATE_STUB_SMTP'
+
+DEFAULT_MIXES = {
+    'price': 'GET /api/fetch/all=20,GET /api/fetch/all?since=1=4,GET /api/stats=2,POST /api/fetch-and-email=1',
+    'async': 'GET /api/fetch/all=20,GET /api/fetch/all?since=1=4,GET /api/stats=2,POST /api/fetch-and-email=1',
+    'tracker': 'GET /api/reports=10,GET /api/config=2,GET /api/health=1'
+}
+
+# Pages the stub site serves, by upstream host (every path on the host gets the same page)
+STUB_PAGES = {
+    'eshop.joyalukkas.com': (
+        'text/html',
+        '<div id="myModal"><table><tr><td>24K</td><td>AED 400.50</td></tr><tr><td>22K</td><td>AED 371.00</td></tr>'
+        '<tr><td>18K</td><td>AED 303.75</td></tr></table></div>'
+    ),
+    'www.candere.com': (
+        'text/html',
+        '<div class="goldCard goldCard--one"><p class="goldCard--rate">₹ 1,25,000/10gm</p></div>'
+        '<div class="goldCard goldCard--two"><p class="goldCard--rate">₹ 1,14,600/10gm</p></div>'
+    ),
+    'open.er-api.com': (
+        'application/json',
+        json.dumps({'result': 'success', 'rates': {'USD': 1, 'AED': 3.6725, 'INR': 88.0}})
+    ),
+    'api.gold-api.com': ('application/json', json.dumps({'price': 2400.0})),
+    'www.goldapi.io': ('application/json', json.dumps({'price': 2400.0}))
+}
+
+
+def stub_url(upstream, url):
+    """https://host/path?q -> http://<stub>/host/path?q (local URLs are left alone)"""
+    parts = urlsplit(url)
+    if parts.hostname in (None, '127.0.0.1', 'localhost'):
+        return url
+    query = f'?{parts.query}' if parts.query else ''
+    return f'http://{upstream}/{parts.hostname}{parts.path or "/"}{query}'
+
+
+def install_stubs():
+    """Route this process's upstream HTTP and SMTP to the stubs named in the environment"""
+    upstream = os.environ.get(STUB_UPSTREAM_ENV)
+    if upstream:
+        import requests
+
+        original_request = requests.Session.request
+
+        def request(self, method, url, *args, **kwargs):
+            return original_request(self, method, stub_url(upstream, url), *args, **kwargs)
+
+        requests.Session.request = request
+
+        # Stub FX rates must not end up in the real cache file
+        from fx_rates import fx_rates
+        fx_rates.cache_file = None
+
+        try:
+            import httpx
+        except ImportError:
+            pass
+        else:
+            original_build = httpx.AsyncClient.build_request
+
+            def build_request(self, method, url, *args, **kwargs):
+                return original_build(self, method, stub_url(upstream, str(url)), *args, **kwargs)
+
+            httpx.AsyncClient.build_request = build_request
+
+    smtp = os.environ.get(STUB_SMTP_ENV)
+    if smtp:
+        import smtplib
+
+        host, port = smtp.rsplit(':', 1)
+        original_connect = smtplib.SMTP.connect
+        smtplib.SMTP.connect = lambda self, *args, **kwargs: original_connect(self, host, int(port))
+        smtplib.SMTP.starttls = lambda self, *args, **kwargs: (220, b'stub: no TLS')
+        try:
+            import aiosmtplib
+        except ImportError:
+            pass
+        else:
+            original_send = aiosmtplib.send
+
+            async def send(message, **kwargs):
+                kwargs.update(hostname=host, port=int(port), start_tls=False)
+                return await original_send(message, **kwargs)
+
+            aiosmtplib.send = send
+
+
+class StubSiteHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        host = self.path.lstrip('/').split('/', 1)[0].split('?', 1)[0]
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        content_type, body = STUB_PAGES.get(host, ('text/html', '<html></html>'))
+        body = body.encode('utf-8')
+        self.send_response(200 if host in STUB_PAGES else 404)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib / aiosmtplib: accepts any login and message"""
+
+    def reply(self, text):
+        self.wfile.write(text.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.reply('220 karatmate-stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply('250-karatmate-stub\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME')
+            elif command == b'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class StubServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # connections are cut when the server under test is stopped
+
+
+class StubSiteServer(StubServer, http.server.HTTPServer):
+    pass
+
+
+def start_stubs(latency):
+    """Stub site and SMTP server on free local ports, served from daemon threads"""
+    site = StubSiteServer(('127.0.0.1', 0), StubSiteHandler)
+    site.latency = latency
+    smtp = StubServer(('127.0.0.1', 0), StubSMTPHandler)
+    smtp.lock = threading.Lock()
+    smtp.messages = 0
+    for server in (site, smtp):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return site, smtp
+
+
+def parse_mix(spec):
+    """'GET /a=5,POST /b=1' -> [('GET', '/a', 5.0), ('POST', '/b', 1.0)]"""
+    mix = []
+    for item in spec.split(','):
+        request, _, weight = item.strip().rpartition('=')
+        method, _, path = request.strip().partition(' ')
+        if not path.startswith('/') or method.upper() not in ('GET', 'POST', 'DELETE'):
+            raise ValueError(f"bad mix entry '{item}', expected 'METHOD /path=weight'")
+        mix.append((method.upper(), path, float(weight)))
+    return mix
+
+
+def write_sample_reports(directory, count):
+    """`count` gold_report_*.json files like GoldPriceTracker.run() saves"""
+    reports_dir = os.path.join(directory, 'reports')
+    os.makedirs(reports_dir, exist_ok=True)
+    start = time.time() - count * 86400
+    for i in range(count):
+        stamp = time.localtime(start + i * 86400)
+        report = {
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S', stamp),
+            'sources': {
+                'joy_alukkas': {'prices': {'24k': 400.5 + i % 7, '22k': 371.0 + i % 5}},
+                'candere': {'prices': {'24k': 125000.0 + i * 10, '22k': 114600.0 + i * 10}}
+            },
+            'calculations': {}
+        }
+        with open(os.path.join(reports_dir, f"gold_report_{time.strftime('%Y%m%d_%H%M%S', stamp)}.json"), 'w') as f:
+            json.dump(report, f)
+
+
+def server_command(target, args, port, workdir):
+    if target == 'async':
+        return [sys.executable, '-m', 'uvicorn', 'price_api_async:app', '--app-dir', BACKEND_DIR,
+                '--host', '127.0.0.1', '--port', str(port), '--workers', str(args.workers), '--no-access-log']
+    return [sys.executable, os.path.join(BACKEND_DIR, 'serve.py'), target, '--workers', str(args.workers),
+            '--threads', str(args.threads), '--host', '127.0.0.1', '--port', str(port),
+            '--refresh-interval', str(args.refresh_interval),
+            '--snapshot-file', os.path.join(workdir, 'snapshot.mmap')]
+
+
+def wait_until_ready(port, path, timeout=60):
+    """Poll until the server answers `path` with 200 (the price API needs a first snapshot)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', path)
+            if conn.getresponse().status == 200:
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def client_loop(port, mix, duration, seed, results):
+    """One client process: keep-alive requests drawn from the weighted mix until time is up"""
+    rng = random.Random(seed)
+    routes = [f'{method} {path}' for method, path, _ in mix]
+    weights = [weight for _, _, weight in mix]
+    latencies = {route: [] for route in routes}
+    errors = dict.fromkeys(routes, 0)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        i = rng.choices(range(len(mix)), weights)[0]
+        method, path, _ = mix[i]
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=b'' if method == 'POST' else None,
+                         headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors[routes[i]] += 1
+        except (OSError, http.client.HTTPException):
+            errors[routes[i]] += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        latencies[routes[i]].append(time.perf_counter() - start)
+    results.put((latencies, errors))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index] * 1000, 2)
+
+
+def summarize(latencies, errors, duration):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'requests_per_sec': round(len(values) / duration, 1),
+        'p50_ms': percentile(values, 50),
+        'p95_ms': percentile(values, 95),
+        'p99_ms': percentile(values, 99)
+    }
+
+
+def run_level(port, mix, concurrency, duration, smtp):
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client_loop, args=(port, mix, duration, seed, results))
+             for seed in range(concurrency)]
+    messages_before = smtp.messages
+    for proc in procs:
+        proc.start()
+    latencies, errors = {}, {}
+    for _ in procs:
+        client_latencies, client_errors = results.get()
+        for route, values in client_latencies.items():
+            latencies.setdefault(route, []).extend(values)
+            errors[route] = errors.get(route, 0) + client_errors[route]
+    for proc in procs:
+        proc.join()
+
+    everything = [value for values in latencies.values() for value in values]
+    return dict(
+        {'concurrency': concurrency, 'duration': duration},
+        **summarize(everything, sum(errors.values()), duration),
+        routes={route: summarize(latencies[route], errors[route], duration) for route in latencies},
+        smtp_messages=smtp.messages - messages_before
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the KaratMate APIs against stubbed upstreams')
+    parser.add_argument('target', choices=sorted(DEFAULT_MIXES),
+                        help='price (serve.py), async (uvicorn price_api_async) or tracker (serve.py)')
+    parser.add_argument('--mix', help="weighted requests, e.g. 'GET /api/fetch/all=20,POST /api/fetch-and-email=1'")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='client processes per level')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+    parser.add_argument('--workers', type=int, default=2, help='server worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per serve.py worker')
+    parser.add_argument('--refresh-interval', type=float, default=60,
+                        help="seconds between the price refresher's scrapes (serve.py)")
+    parser.add_argument('--upstream-latency', type=float, default=50, help='stub site response delay in ms')
+    parser.add_argument('--reports', type=int, default=100, help='sample reports for the tracker API')
+    parser.add_argument('--port', type=int, default=5103)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args(argv)
+    try:
+        mix = parse_mix(args.mix or DEFAULT_MIXES[args.target])
+    except ValueError as e:
+        parser.error(str(e))
+
+    site, smtp = start_stubs(args.upstream_latency / 1000)
+    workdir = tempfile.mkdtemp(prefix='karatmate_load_')
+    with open(os.path.join(workdir, 'sitecustomize.py'), 'w') as f:
+        f.write('import bench_load\nbench_load.install_stubs()\n')
+    write_sample_reports(workdir, args.reports)
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join([workdir, BACKEND_DIR]),
+               **{STUB_UPSTREAM_ENV: f'127.0.0.1:{site.server_address[1]}',
+                  STUB_SMTP_ENV: f'127.0.0.1:{smtp.server_address[1]}'})
+
+    server = subprocess.Popen(server_command(args.target, args, args.port, workdir), cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready_path = '/api/health' if args.target == 'tracker' else '/api/fetch/all'
+        if not wait_until_ready(args.port, ready_path):
+            print('server did not become ready', file=sys.stderr)
+            return 1
+        levels = [run_level(args.port, mix, concurrency, args.duration, smtp) for concurrency in args.concurrency]
+    finally:
+        server.terminate()
+        server.wait()
+        site.shutdown()
+        smtp.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'target': args.target,
+        'workers': args.workers,
+        'threads': args.threads,
+        'refresh_interval': args.refresh_interval,
+        'upstream_latency_ms': args.upstream_latency,
+        'mix': [{'route': f'{method} {path}', 'weight': weight} for method, path, weight in mix],
+        'levels': levels
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+
+    print(f"\n{'Clients':>8} {'Route':<36} {'Requests':>9} {'Req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'Errors':>7}")
+    for level in levels:
+        for route, row in [('all', level)] + sorted(level['routes'].items()):
+            print(f"{level['concurrency']:>8} {route:<36} {row['requests']:>9} {row['requests_per_sec']:>9} "
+                  f"{row['p50_ms']!s:>8} {row['p95_ms']!s:>8} {row['p99_ms']!s:>8} {row['errors']:>7}")
+        print(f"{'':>8} emails received by the stub SMTP server: {level['smtp_messages']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
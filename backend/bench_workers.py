@@ -0,0 +1,168 @@
+"""
+KaratMate Labs - Worker Scaling Load Test
+Measures /api/fetch/all requests/sec for serve.py with 1, 2, 4... workers
+
+The shared snapshot is seeded with sample prices and the refresher is disabled,
+so the numbers reflect serving cost only (no scraping).
+
+Usage:
+    python bench_workers.py --workers 1 2 4 --clients 8 --duration 10
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from snapshot_store import SnapshotStore
+from shared_snapshot import SharedSnapshotFile
+
+SAMPLE_PAYLOAD = {
+    'success': True,
+    'timestamp': '2025-01-01T12:00:00',
+    'sources': {
+        'sourcea': {'prices': {'24k': 400.5, '22k': 371.0, '18k': 303.75}, 'currency': 'AED', 'location': 'UAE'},
+        'sourceb': {'prices': {'24k': 125000.0, '22k': 114600.0}, 'currency': 'INR',
+                    'location': 'Kerala, India', 'unit': '10gm'}
+    },
+    'calculations': {},
+    'provider': 'KaratMate Labs'
+}
+
+
+def seed_snapshot(path):
+    import price_fetcher_api
+    from fx_rates import FxRates, StaticRateProvider
+
+    # Offline, and nothing written into the tree: built-in rates, no cache file
+    price_fetcher_api.fx_rates = FxRates(provider=StaticRateProvider(), cache_file=None)
+    payload = dict(SAMPLE_PAYLOAD)
+    payload['calculations'] = price_fetcher_api.build_calculations(payload['sources'])
+    snapshot = SnapshotStore().publish(payload)
+    shared = SharedSnapshotFile(path, create=True)
+    shared.write(snapshot)
+    shared.close()
+
+
+def port_in_use(port):
+    try:
+        socket.create_connection(('127.0.0.1', port), timeout=1).close()
+        return True
+    except OSError:
+        return False
+
+
+def wait_for_port(port, server, timeout=30):
+    """True once the server listens on port; False if it exits (e.g. could not bind) or times out"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            return False
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def client_loop(port, path, duration, results):
+    """One client process: keep-alive GETs until the duration elapses"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    latencies = []
+    errors = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        latencies.append(time.perf_counter() - start)
+    results.put((latencies, errors))
+
+
+def run_level(workers, clients, duration, port, snapshot_path):
+    # Something else on the port would answer instead and its numbers would look valid
+    if port_in_use(port):
+        raise RuntimeError(f'port {port} is already in use (leftover server?), pick another with --port')
+    server = subprocess.Popen(
+        [sys.executable, 'serve.py', 'price', '--workers', str(workers), '--host', '127.0.0.1',
+         '--port', str(port), '--refresh-interval', '0', '--snapshot-file', snapshot_path],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL
+    )
+    try:
+        if not wait_for_port(port, server):
+            raise RuntimeError(f'server did not start (exit code {server.poll()})')
+        time.sleep(1)  # let every worker finish importing
+        if server.poll() is not None:
+            raise RuntimeError(f'server exited during startup (exit code {server.returncode})')
+
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=client_loop, args=(port, '/api/fetch/all', duration, results))
+                 for _ in range(clients)]
+        for proc in procs:
+            proc.start()
+        latencies, errors = [], 0
+        for _ in procs:
+            lat, err = results.get()
+            latencies.extend(lat)
+            errors += err
+        for proc in procs:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'workers': workers,
+        'requests': count,
+        'errors': errors,
+        'requests_per_sec': round(count / duration, 1),
+        'p50_ms': round(latencies[count // 2] * 1000, 2) if count else None,
+        'p99_ms': round(latencies[int(count * 0.99) - 1] * 1000, 2) if count else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Requests/sec scaling with serve.py worker count')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=5102)
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args(argv)
+
+    snapshot_path = os.path.join(tempfile.gettempdir(), 'karatmate_bench_snapshot.mmap')
+    seed_snapshot(snapshot_path)
+
+    rows = [run_level(n, args.clients, args.duration, args.port, snapshot_path) for n in args.workers]
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+
+    print(f"\n{'Workers':>8} {'Requests':>10} {'Req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'Errors':>7}")
+    for row in rows:
+        print(f"{row['workers']:>8} {row['requests']:>10} {row['requests_per_sec']:>10} "
+              f"{row['p50_ms']:>8} {row['p99_ms']:>8} {row['errors']:>7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
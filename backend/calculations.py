@@ -0,0 +1,154 @@
+"""
+KaratMate Labs - Price Calculations
+Sovereign prices (UAE and India), customs duty and the landed cost of UAE gold
+in India; plain functions of the prices, shared by the price APIs and the
+history export
+"""
+
+import math
+
+
+def calculate_sovereign_uae(price_per_gram, grams=8):
+    """
+    Calculate sovereign price for UAE
+    Formula: (price_per_gram * grams) + 8% making charges + 5% VAT
+    Note: 8% is average, can be higher
+    """
+    base_price = price_per_gram * grams
+    making_charges = base_price * 0.08  # 8% (average)
+    subtotal = base_price + making_charges
+    vat = base_price * 0.05  # 5%
+    total = subtotal + vat
+    
+    return {
+        'base_price': round(base_price, 2),
+        'making_charges': round(making_charges, 2),
+        'subtotal': round(subtotal, 2),
+        'vat': round(vat, 2),
+        'total': round(total, 2),
+        'grams': grams
+    }
+
+
+def calculate_sovereign_india(price_per_10gm, grams=8):
+    """
+    Calculate sovereign price for India
+    Formula: (price/10 * grams) + 12% making + 3% GST on making + 5% GST on total
+    """
+    price_per_gram = price_per_10gm / 10
+    base_price = price_per_gram * grams
+    
+    making_charges = base_price * 0.12  # 12% making charges (minimum)
+    making_gst = making_charges * 0.03  # 3% GST on making
+    subtotal = base_price + making_charges + making_gst
+    gst = base_price * 0.05  # 5% GST on total
+    total = subtotal + gst
+    
+    return {
+        'base_price': round(base_price, 2),
+        'making_charges': round(making_charges, 2),
+        'making_gst': round(making_gst, 2),
+        'subtotal': round(subtotal, 2),
+        'gst': round(gst, 2),
+        'total': round(total, 2),
+        'grams': grams
+    }
+
+
+def calculate_landed_cost(uae_price_per_gram, grams, aed_to_inr, india_price_per_10gm=None, channel='red'):
+    """
+    Cost in INR of buying gold in the UAE and bringing it into India
+    
+    Args:
+        uae_price_per_gram: UAE 22K rate in AED per gram
+        grams: Weight in grams
+        aed_to_inr: Conversion rate (from the cached FX matrix)
+        india_price_per_10gm: India 22K rate, to compare against buying in India
+        channel: Customs channel, 'red' or 'green'
+    
+    Landed cost = UAE sovereign total in INR + customs duty (with GST) on the gold value in INR
+    """
+    uae = calculate_sovereign_uae(uae_price_per_gram, grams)
+    uae_total_inr = uae['total'] * aed_to_inr
+    customs = calculate_customs_duty(uae['base_price'] * aed_to_inr, grams, channel)
+    landed = uae_total_inr + customs['total_with_gst']
+    
+    result = {
+        'uae_total_aed': uae['total'],
+        'aed_to_inr': round(aed_to_inr, 4),
+        'uae_total_inr': round(uae_total_inr, 2),
+        'customs_duty': customs['total_with_gst'],
+        'landed_total_inr': round(landed, 2),
+        'channel': channel.upper(),
+        'grams': grams
+    }
+    
+    if india_price_per_10gm:
+        india_total = calculate_sovereign_india(india_price_per_10gm, grams)['total']
+        result['india_total_inr'] = india_total
+        result['savings_inr'] = round(india_total - landed, 2)
+    
+    return result
+
+
+def calculate_customs_duty(base_price_inr, grams, channel='red'):
+    """
+    Calculate customs duty when bringing gold from UAE to India
+    
+    Args:
+        base_price_inr: Base gold value in INR (without making/GST)
+        grams: Weight in grams
+        channel: 'red' (6%) or 'green' (33%)
+    
+    Rules:
+    - Red Channel: 6%
+    - Green Channel: 33%
+    - ₹50,000 exemption
+    """
+    exemption = 50000
+    
+    if base_price_inr <= exemption:
+        return {
+            'gold_value': base_price_inr,
+            'exemption': exemption,
+            'taxable_amount': 0,
+            'customs_duty': 0,
+            'gst_on_duty': 0,
+            'total_with_gst': 0,
+            'total_without_gst': 0,
+            'channel': channel.upper(),
+            'grams': grams,
+            'duty_rate': '0%'
+        }
+    
+    taxable_amount = base_price_inr - exemption
+    
+    # Calculate duty based on channel
+    if channel.lower() == 'red':
+        customs_rate = 0.06  # 6% for red channel
+        rate_display = '6%'
+    else:
+        customs_rate = 0.33  # 33% for green channel
+        rate_display = '33%'
+    
+    customs_duty = taxable_amount * customs_rate
+    
+    # Round up to nearest 50
+    customs_duty_rounded = math.ceil(customs_duty / 50) * 50
+    
+    # GST is optional (5% of customs duty)
+    gst_on_duty = customs_duty_rounded * 0.05
+    gst_rounded = math.ceil(gst_on_duty / 50) * 50
+    
+    return {
+        'gold_value': round(base_price_inr, 2),
+        'exemption': exemption,
+        'taxable_amount': round(taxable_amount, 2),
+        'customs_duty': customs_duty_rounded,
+        'gst_on_duty': gst_rounded,
+        'total_with_gst': customs_duty_rounded + gst_rounded,
+        'total_without_gst': customs_duty_rounded,
+        'channel': channel.upper(),
+        'duty_rate': rate_display,
+        'grams': grams
+    }
@@ -0,0 +1,136 @@
+"""
+KaratMate Labs - Change-Driven Report Emails
+Decides per recipient whether a scheduled run sends the full report, a compact
+"no change" digest or nothing, by comparing the prices with the last report
+that recipient was sent
+
+A recipient is a plain address or
+    {"email": ..., "min_change_pct": 0.25, "no_change": "digest" | "skip"}
+min_change_pct 0 means any price movement is significant.
+"""
+
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+DEFAULT_SENT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sent_reports.json')
+NO_CHANGE_MODES = ('skip', 'digest')
+DEFAULT_RULE = {'min_change_pct': 0.0, 'no_change': 'skip'}
+
+
+def flatten_prices(sources):
+    """{'source': {'prices': {'22k': v}}} -> {'source.22k': v}"""
+    return {
+        f'{source}.{karat}': value
+        for source, entry in sources.items()
+        for karat, value in entry.get('prices', {}).items()
+        if isinstance(value, (int, float))
+    }
+
+
+def price_changes(previous, current):
+    """Prices that differ between two flattened snapshots (added and removed ones included)"""
+    changes = []
+    for metric in sorted(set(previous) | set(current)):
+        old, new = previous.get(metric), current.get(metric)
+        if old == new:
+            continue
+        change_pct = (new - old) / old * 100 if old and new is not None else None
+        changes.append({'metric': metric, 'previous': old, 'value': new,
+                        'change_pct': round(change_pct, 3) if change_pct is not None else None})
+    return changes
+
+
+def is_significant(changes, min_change_pct):
+    """Any change at or above the threshold; a price appearing or disappearing always counts"""
+    return any(change['change_pct'] is None or abs(change['change_pct']) >= min_change_pct
+               for change in changes)
+
+
+def recipient_rules(recipients):
+    """Normalize addresses / dicts -> [{'email', 'min_change_pct', 'no_change'}]"""
+    rules = []
+    for recipient in recipients:
+        rule = dict(DEFAULT_RULE, **(recipient if isinstance(recipient, dict) else {'email': recipient}))
+        if rule['no_change'] not in NO_CHANGE_MODES:
+            raise ValueError(f"no_change must be one of {', '.join(NO_CHANGE_MODES)} ({rule['email']})")
+        rule['min_change_pct'] = float(rule['min_change_pct'])
+        rules.append(rule)
+    return rules
+
+
+class SentReports:
+    """Prices of the last full report sent to each recipient, kept in a JSON file"""
+
+    def __init__(self, path=DEFAULT_SENT_FILE, namespace='report'):
+        self.path = path
+        self.namespace = namespace
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def last(self, email):
+        return self._load().get(self.namespace, {}).get(email)
+
+    def record(self, emails, prices):
+        """Remember `prices` as the last full report for every address in emails"""
+        state = self._load()
+        sent = state.setdefault(self.namespace, {})
+        for email in emails:
+            sent[email] = {'prices': prices, 'sent_at': time.time()}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.sent-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def plan(self, recipients, prices, force=False):
+        """
+        Decide what each recipient gets -> [{'email', 'action', 'changes', 'last_sent_at'}]
+
+        action is 'full' (first report, significant change or force), 'digest' or 'skip'.
+        """
+        plans = []
+        for rule in recipient_rules(recipients):
+            last = self.last(rule['email'])
+            changes = price_changes(last['prices'], prices) if last else []
+            if force or last is None or is_significant(changes, rule['min_change_pct']):
+                action = 'full'
+            else:
+                action = rule['no_change']
+            plans.append({'email': rule['email'], 'action': action, 'changes': changes,
+                          'last_sent_at': last['sent_at'] if last else None})
+        return plans
+
+
+def format_digest_html(plan, names=None):
+    """Compact "no significant change" email body for one recipient's plan"""
+    names = names or {}
+    since = datetime.fromtimestamp(plan['last_sent_at']).strftime('%d %b %Y, %I:%M %p')
+    if plan['changes']:
+        rows = ''.join(
+            f"<tr><td>{names.get(c['metric'].split('.')[0], c['metric'].split('.')[0])} "
+            f"{c['metric'].split('.')[-1].upper()}</td><td>{c['previous']} → {c['value']}</td>"
+            f"<td>{c['change_pct']:+.2f}%</td></tr>"
+            for c in plan['changes'] if c['change_pct'] is not None
+        )
+        moves = f'<table cellpadding="6" style="border-collapse: collapse;">{rows}</table>'
+    else:
+        moves = '<p>Prices are exactly the same.</p>'
+    return f"""
+    <html><body style="font-family: Arial, sans-serif;">
+        <h3>🏅 KaratMate Labs - No significant change</h3>
+        <p>Gold prices have not moved enough since your last report ({since}).</p>
+        {moves}
+    </body></html>
+    """
@@ -0,0 +1,166 @@
+"""
+KaratMate Labs - Source Circuit Breakers
+Per-source circuit breaker (closed / open / half-open), adaptive timeouts and
+hedge delays from observed latency percentiles, and the last-known-good prices
+to fall back on
+"""
+
+import collections
+import threading
+import time
+
+from hedging import HedgeStats
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class LatencyTracker:
+    """Recent request latencies (seconds) for percentile estimates"""
+
+    def __init__(self, size=100):
+        self._samples = collections.deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, pct):
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open every call is
+    skipped; after `reset_timeout` seconds a single probe is let through (half-open).
+    A successful probe closes the breaker, a failed one re-opens it.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go to the source now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.time()
+
+
+class SourceGuard:
+    """Breaker, latency history and last-known-good entry for one source"""
+
+    def __init__(self, default_timeout=10, min_timeout=2, max_timeout=10,
+                 failure_threshold=3, reset_timeout=60, max_hedge_rate=0.25):
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+        self.hedge = HedgeStats()
+        self.max_hedge_rate = max_hedge_rate
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.last_good = None
+        self.last_good_at = None
+
+    def timeout(self):
+        """Adaptive timeout: twice the observed p95, clamped to [min, max]"""
+        if len(self.latency) < 5:
+            return self.default_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.latency.percentile(95) * 2))
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging (the observed p95), or None to not hedge"""
+        if len(self.latency) < 5 or self.hedge.hedge_rate() > self.max_hedge_rate:
+            return None
+        return self.latency.percentile(95)
+
+    def record_success(self, entry, seconds=None):
+        """seconds: the upstream request's latency, None when no request was made"""
+        if seconds is not None:
+            self.latency.add(seconds)
+        self.breaker.record_success()
+        self.last_good = entry
+        self.last_good_at = time.time()
+
+    def record_failure(self, seconds=None):
+        if seconds is not None:
+            self.latency.add(seconds)
+        self.breaker.record_failure()
+
+    def stale_entry(self):
+        """Last-known-good entry flagged as stale, or None if the source never answered"""
+        if self.last_good is None:
+            return None
+        return dict(self.last_good, stale=True,
+                    fetched_at=time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.last_good_at)))
+
+    def fresh_entry(self, max_age):
+        """Last-known-good entry if it is at most max_age seconds old, else None"""
+        if self.last_good is None or time.time() - self.last_good_at > max_age:
+            return None
+        return self.last_good
+
+    def status(self):
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        return {
+            'state': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            'timeout': round(self.timeout(), 2),
+            'latency_p50': round(p50, 3) if p50 is not None else None,
+            'latency_p95': round(p95, 3) if p95 is not None else None,
+            'has_last_good': self.last_good is not None,
+            'hedging': self.hedge.status()
+        }
+
+
+class SourceGuards:
+    """Lazily created SourceGuard per source key"""
+
+    def __init__(self, **options):
+        self._options = options
+        self._guards = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        guard = self._guards.get(key)
+        if guard is None:
+            with self._lock:
+                guard = self._guards.setdefault(key, SourceGuard(**self._options))
+        return guard
+
+    def status(self):
+        return {key: guard.status() for key, guard in sorted(self._guards.items())}
@@ -0,0 +1,106 @@
+"""
+KaratMate Labs - Configuration Store
+Keeps config.json parsed in memory, reloads it when the file changes on disk
+and writes updates atomically with a version number
+"""
+
+import copy
+import json
+import os
+import tempfile
+import threading
+
+
+class ConfigConflict(Exception):
+    """Raised when an update was based on an older config version"""
+
+
+def merge_config(base, changes):
+    """Copy of base with changes applied (sections are merged one level deep)"""
+    merged = copy.deepcopy(base)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key].update(copy.deepcopy(value))
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+class ConfigStore:
+    """In-memory view of a JSON config file"""
+
+    def __init__(self, path, defaults=None):
+        self.path = path
+        self.defaults = defaults or {}
+        self._lock = threading.Lock()
+        self._config = None
+        self._stat = None
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _reload_if_changed(self):
+        stat = self._file_stat()
+        if self._config is not None and stat == self._stat:
+            return
+        if stat is None:
+            config = copy.deepcopy(self.defaults)
+        else:
+            with open(self.path, 'r') as f:
+                config = json.load(f)
+        config.setdefault('version', 0)
+        self._config = config
+        self._stat = stat
+
+    def get(self):
+        """Current config (a copy, safe to modify)"""
+        with self._lock:
+            self._reload_if_changed()
+            return copy.deepcopy(self._config)
+
+    def with_overrides(self, overrides):
+        """Current config with per-request overrides applied in memory only"""
+        with self._lock:
+            self._reload_if_changed()
+            return merge_config(self._config, overrides)
+
+    def update(self, changes):
+        """
+        Merge changes into the config and write it atomically
+
+        If changes carries a 'version' it must match the current one,
+        otherwise ConfigConflict is raised (someone else saved in between).
+        Returns the new config.
+        """
+        changes = dict(changes)
+        expected = changes.pop('version', None)
+
+        with self._lock:
+            self._reload_if_changed()
+            if expected is not None and expected != self._config['version']:
+                raise ConfigConflict(
+                    f"Config changed since version {expected} (now {self._config['version']})"
+                )
+
+            config = merge_config(self._config, changes)
+            config['version'] = self._config['version'] + 1
+
+            # Write to a temp file in the same directory, then swap it in
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.config-', suffix='.json', dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(config, f, indent=4)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            self._config = config
+            self._stat = self._file_stat()
+            return copy.deepcopy(config)
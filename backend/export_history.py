@@ -0,0 +1,62 @@
+"""
+KaratMate Labs - History Export CLI
+Writes price history from the history store (history_store.py) as CSV or
+NDJSON, with each 22K row's sovereign and customs breakdown, to a file or stdout
+
+Rows are streamed from the database cursor, so memory stays flat however long
+the date range is.
+
+Usage:
+    python export_history.py --from 2026-01-01 --to 2026-03-31 > q1.csv
+    python export_history.py --source sourceb --karat 22k --format ndjson --grams 16
+    python export_history.py --no-calculations --output history.csv
+"""
+
+import argparse
+import sys
+
+from history_export import FORMATS, export_chunks, export_params, history_breakdown
+from history_store import DEFAULT_HISTORY_DB, HistoryStore
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export price history as CSV or NDJSON')
+    parser.add_argument('--from', dest='start', help='first date (YYYY-MM-DD) or ISO timestamp')
+    parser.add_argument('--to', dest='end', help='last date (inclusive) or ISO timestamp')
+    parser.add_argument('--source', help='source key (sourcea, sourceb, spot...)')
+    parser.add_argument('--karat', help='karat (24k, 22k...)')
+    parser.add_argument('--region', help='region key (dubai, kerala...)')
+    parser.add_argument('--format', choices=list(FORMATS), default='csv')
+    parser.add_argument('--grams', default='8', help='weight for the 22K breakdown (default 8)')
+    parser.add_argument('--no-calculations', action='store_true', help='export prices only')
+    parser.add_argument('--db', default=DEFAULT_HISTORY_DB, help='history database file')
+    parser.add_argument('--output', '-o', help='output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    try:
+        query, fmt, grams = export_params({
+            'format': args.format, 'from': args.start, 'to': args.end, 'source': args.source,
+            'karat': args.karat, 'region': args.region, 'grams': args.grams,
+            'calculations': '0' if args.no_calculations else '1'
+        })
+    except ValueError as e:
+        parser.error(str(e))
+
+    breakdown = (lambda row: history_breakdown(row, grams)) if grams else None
+    chunks = export_chunks(HistoryStore(args.db).query(**query), fmt, breakdown)
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    except BrokenPipeError:
+        # `| head` closed the pipe; stop quietly
+        sys.stderr.close()
+        return 0
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
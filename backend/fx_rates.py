@@ -0,0 +1,194 @@
+"""
+KaratMate Labs - FX Rates
+USD/AED/INR conversion matrix with a TTL cache persisted to disk
+
+Calculations read the cached matrix (a dict lookup) and never wait on the
+network: when it expires the old rates keep being served while one background
+thread refreshes them, and with nothing loaded yet (no cache file) the built-in
+rates stand in until the first refresh lands. The servers call warm() at startup
+to load real rates before the first request. Set KARATMATE_FX_PROVIDER=static to
+use the built-in rates offline.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+CURRENCIES = ('USD', 'AED', 'INR')
+DEFAULT_TTL = 6 * 3600
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fx_rates.json')
+PROVIDER_ENV = 'KARATMATE_FX_PROVIDER'
+
+# Units of each currency per 1 USD (AED is pegged; INR is an offline approximation)
+STATIC_USD_RATES = {'USD': 1.0, 'AED': 3.6725, 'INR': 88.0}
+
+
+def build_matrix(usd_rates, currencies=CURRENCIES):
+    """{from: {to: rate}} for every pair, from rates quoted per 1 USD"""
+    return {
+        base: {quote: usd_rates[quote] / usd_rates[base] for quote in currencies}
+        for base in currencies
+    }
+
+
+class StaticRateProvider:
+    """Fixed rates: the offline / test stand-in for the HTTP provider"""
+
+    name = 'static'
+
+    def __init__(self, usd_rates=None):
+        self.usd_rates = dict(usd_rates or STATIC_USD_RATES)
+
+    def fetch(self):
+        return dict(self.usd_rates)
+
+
+class HttpRateProvider:
+    """Latest USD rates from open.er-api.com (free, no key)"""
+
+    name = 'open.er-api.com'
+
+    def __init__(self, url='https://open.er-api.com/v6/latest/USD', timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('result') != 'success':
+            raise ValueError(f"FX provider error: {data.get('error-type', 'unknown')}")
+        return {code: float(data['rates'][code]) for code in CURRENCIES}
+
+
+def default_provider():
+    if os.environ.get(PROVIDER_ENV, '').lower() == 'static':
+        return StaticRateProvider()
+    return HttpRateProvider()
+
+
+class FxRates:
+    """Cached conversion matrix for CURRENCIES"""
+
+    def __init__(self, provider=None, ttl=DEFAULT_TTL, cache_file=DEFAULT_CACHE_FILE, fallback=None,
+                 retry_after=300):
+        self.provider = provider or default_provider()
+        self.fallback = fallback or StaticRateProvider()
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.cache_file = cache_file
+        self._state = None  # {'usd_rates', 'matrix', 'fetched_at', 'provider'}
+        self._lock = threading.Lock()
+        self._warming = threading.Lock()
+        self._next_refresh = 0  # earliest time for the next background refresh
+
+    def _load_cache(self):
+        if not self.cache_file:
+            return None
+        try:
+            with open(self.cache_file, 'r') as f:
+                cached = json.load(f)
+            return self._make_state(cached['usd_rates'], cached['fetched_at'], cached['provider'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save_cache(self, state):
+        if not self.cache_file:
+            return
+        directory = os.path.dirname(os.path.abspath(self.cache_file))
+        fd, tmp_path = tempfile.mkstemp(prefix='.fx-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({key: state[key] for key in ('usd_rates', 'fetched_at', 'provider')}, f, indent=4)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _make_state(self, usd_rates, fetched_at, provider):
+        return {
+            'usd_rates': usd_rates,
+            'matrix': build_matrix(usd_rates),
+            'fetched_at': fetched_at,
+            'provider': provider
+        }
+
+    def _fetch_state(self):
+        """Rates from the provider, or from the static fallback if it fails"""
+        try:
+            return self._make_state(self.provider.fetch(), time.time(), self.provider.name)
+        except Exception:
+            return self._fallback_state()
+
+    def _refresh(self):
+        state = self._fetch_state()
+        with self._lock:
+            # A failed refresh never replaces real rates with the fallback ones
+            if state['fetched_at'] or self._state is None or not self._state['fetched_at']:
+                self._state = state
+        if state['fetched_at']:
+            self._save_cache(state)
+
+    def _expired(self, state):
+        return time.time() - state['fetched_at'] > self.ttl
+
+    def _fallback_state(self):
+        # fetched_at=0 keeps it expired, so the next matrix() starts a refresh
+        return self._make_state(self.fallback.fetch(), 0, f'{self.fallback.name} (fallback)')
+
+    def warm(self):
+        """Load the cache file, or fetch from the provider if there is none (blocking: call at startup)"""
+        # Concurrent callers wait for the one load rather than fetching again
+        with self._warming:
+            with self._lock:
+                if self._state is not None and self._state['fetched_at']:
+                    return
+                cached = self._load_cache()
+                if cached is not None:
+                    self._state = cached
+                    return
+                self._next_refresh = time.time() + self.retry_after
+            self._refresh()
+
+    def matrix(self):
+        """{from: {to: rate}}; stale (or, before the first load, built-in) rates are served while a refresh runs"""
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._state = self._load_cache() or self._fallback_state()
+                state = self._state
+
+        if self._expired(state) and time.time() >= self._next_refresh:
+            with self._lock:
+                start = time.time() >= self._next_refresh
+                if start:
+                    self._next_refresh = time.time() + self.retry_after
+            if start:
+                threading.Thread(target=self._refresh, name='fx-refresh', daemon=True).start()
+        return state['matrix']
+
+    def rate(self, from_currency, to_currency):
+        return self.matrix()[from_currency][to_currency]
+
+    def convert(self, amount, from_currency, to_currency):
+        return amount * self.rate(from_currency, to_currency)
+
+    def status(self):
+        self.matrix()
+        state = self._state
+        return {
+            'provider': state['provider'],
+            'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(state['fetched_at']))
+                          if state['fetched_at'] else None,
+            'stale': self._expired(state),
+            'usd_rates': state['usd_rates']
+        }
+
+
+# Shared by the price APIs and the tracker
+fx_rates = FxRates()
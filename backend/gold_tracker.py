@@ -4,29 +4,50 @@ Fetches gold prices from multiple gold sources
 Calculates custom duties and sends email notifications
 """
 
+import copy
 import os
 import sys
 import json
 import time
-import smtplib
 import requests
 from datetime import datetime
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
 import math
+from metrics import EMAIL_RENDER_SECONDS, FETCH_SECONDS, SMTP_SEND_SECONDS
+from fx_rates import fx_rates
+from spot_quota import spot_quotes
+from change_detection import SentReports, flatten_prices, format_digest_html
+
+
+DEFAULT_CONFIG = {
+    'sources': {
+        'kalyan': True,
+        'joy_alukkas': True,
+        'bhima': True,
+        'candere': True,
+        'goldapi': True
+    },
+    'email': {
+        'sender': 'fasin.absons@gmail.com',
+        'password': 'zrxj vfjt wjos wkwy',
+        'recipient': 'faseen1532@gmail.com'
+    },
+    'calculations': {
+        'making_charges': 12,
+        'making_gst': 3,
+        'vat_gst': 5,
+        'customs_exemption': 50000,
+        'red_channel_rate': 6,
+        'green_channel_rate': 33
+    }
+}
 
 
 class GoldPriceTracker:
     """Track gold prices from multiple sources"""
     
-    def __init__(self, config_file='config.json'):
-        self.config = self.load_config(config_file)
+    def __init__(self, config_file='config.json', config=None):
+        # An already-loaded config (e.g. from the API's ConfigStore) skips the file read
+        self.config = config if config is not None else self.load_config(config_file)
         self.prices = {}
         self.timestamp = datetime.now()
         
@@ -39,6 +60,9 @@ class GoldPriceTracker:
             'recipient': 'faseen1532@gmail.com'
         }
         
+        # Prices of the last report each recipient was sent
+        self.sent_reports = SentReports(namespace='tracker')
+        
         # API-based gold price fallback
         self.api_sources = {
             'goldapi': 'https://www.goldapi.io/api/XAU/USD',
@@ -48,40 +72,24 @@ class GoldPriceTracker:
     
     def load_config(self, config_file):
         """Load configuration from JSON file"""
-        default_config = {
-            'sources': {
-                'kalyan': True,
-                'joy_alukkas': True,
-                'bhima': True,
-                'candere': True,
-                'goldapi': True
-            },
-            'email': {
-                'sender': 'fasin.absons@gmail.com',
-                'password': 'zrxj vfjt wjos wkwy',
-                'recipient': 'faseen1532@gmail.com'
-            },
-            'calculations': {
-                'making_charges': 12,
-                'making_gst': 3,
-                'vat_gst': 5,
-                'customs_exemption': 50000,
-                'red_channel_rate': 6,
-                'green_channel_rate': 33
-            }
-        }
-        
         if os.path.exists(config_file):
             with open(config_file, 'r') as f:
                 return json.load(f)
         else:
             # Save default config
             with open(config_file, 'w') as f:
-                json.dump(default_config, f, indent=4)
-            return default_config
+                json.dump(DEFAULT_CONFIG, f, indent=4)
+            # A copy: callers change their config (e.g. the email password), not the shared defaults
+            return copy.deepcopy(DEFAULT_CONFIG)
+    
+    # Selenium, BeautifulSoup and the email modules are imported on first use so the
+    # API server (and its /api/health, /api/reports endpoints) starts without them
     
     def setup_driver(self, headless=True):
         """Setup Selenium Chrome driver"""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        
         chrome_options = Options()
         if headless:
             chrome_options.add_argument("--headless")
@@ -92,6 +100,21 @@ class GoldPriceTracker:
         
         return webdriver.Chrome(options=chrome_options)
     
+    def wait_for(self, driver, by, value, timeout=10):
+        """Wait until an element is present; `by` is a selenium By attribute name, e.g. 'ID'"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        
+        return WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((getattr(By, by), value))
+        )
+    
+    def page_soup(self, driver):
+        """Parse the driver's current page"""
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(driver.page_source, 'html.parser')
+    
     def fetch_kalyan_prices(self):
         """Fetch prices from Kalyan Jewellers"""
         print("\n📊 Fetching Kalyan Jewellers prices...")
@@ -102,11 +125,9 @@ class GoldPriceTracker:
             time.sleep(3)
             
             # Wait for price block
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "priceBlock"))
-            )
+            self.wait_for(driver, 'CLASS_NAME', "priceBlock")
             
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
+            soup = self.page_soup(driver)
             price_block = soup.find('div', class_='priceBlock')
             
             prices = {}
@@ -161,11 +182,9 @@ class GoldPriceTracker:
             # Find and click gold rate modal
             try:
                 # Wait for modal to appear
-                modal = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.ID, "myModal"))
-                )
+                modal = self.wait_for(driver, 'ID', "myModal")
                 
-                soup = BeautifulSoup(driver.page_source, 'html.parser')
+                soup = self.page_soup(driver)
                 table = soup.select_one('#myModal table')
                 
                 prices = {}
@@ -212,7 +231,7 @@ class GoldPriceTracker:
             driver.get("https://bhima.ae/gold-rates/")
             time.sleep(3)
             
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
+            soup = self.page_soup(driver)
             
             # Find gold rate table
             prices = {}
@@ -258,7 +277,7 @@ class GoldPriceTracker:
             driver.get("https://www.candere.com/gold-rate-today/kerala")
             time.sleep(3)
             
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
+            soup = self.page_soup(driver)
             
             prices = {}
             
@@ -309,82 +328,84 @@ class GoldPriceTracker:
         return None
     
     def fetch_goldapi_prices(self):
-        """Fetch live gold prices from GoldAPI.io (free tier: 100 requests/month)"""
+        """
+        Fetch live gold prices from the spot-price APIs
+        
+        Calls go through spot_quotes: each API has a monthly budget (GoldAPI.io's free
+        tier is 100 requests/month), and between budgeted calls the last quote is reused.
+        A quote past spot_quotes.max_age is only used when no API has a current one,
+        and is then shown (and stored) as stale with its age.
+        """
         print("\n📊 Fetching GoldAPI.io prices (International)...")
         
+        def spot_price(url, headers=None):
+            def fetch():
+                try:
+                    response = requests.get(url, headers=headers, timeout=10)
+                    if response.status_code == 200:
+                        return response.json().get('price')
+                except (requests.RequestException, ValueError) as e:
+                    print(f"   ⚠️ {url}: {e}")
+                return None
+            return fetch
+        
         try:
-            # Using free Gold Price API
-            response = requests.get('https://api.gold-api.com/price/XAU', timeout=10)
+            # Free Gold Price API first, then GoldAPI.io with the demo token
+            apis = [
+                ('gold-api.com', 'Gold-API.com', spot_price('https://api.gold-api.com/price/XAU')),
+                ('goldapi.io', 'GoldAPI.io', spot_price('https://www.goldapi.io/api/XAU/USD',
+                                                        {'x-access-token': 'goldapi-demo'}))
+            ]
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Gold price in USD per troy ounce
-                if 'price' in data:
-                    usd_per_troy_oz = data['price']
-                    
-                    # Convert to AED per gram
-                    # 1 troy oz = 31.1035 grams
-                    # 1 USD ≈ 3.67 AED (approximate)
-                    usd_to_aed = 3.67
-                    gram_per_troy_oz = 31.1035
-                    
-                    # Calculate 24K price per gram in AED
-                    aed_per_gram_24k = (usd_per_troy_oz / gram_per_troy_oz) * usd_to_aed
-                    
-                    # Calculate 22K and 18K based on purity
-                    aed_per_gram_22k = aed_per_gram_24k * (22/24)
-                    aed_per_gram_18k = aed_per_gram_24k * (18/24)
-                    
-                    prices = {
-                        '24k': round(aed_per_gram_24k, 2),
-                        '22k': round(aed_per_gram_22k, 2),
-                        '18k': round(aed_per_gram_18k, 2)
-                    }
-                    
-                    print(f"   ✅ GoldAPI: 24K={prices['24k']} AED, 22K={prices['22k']} AED")
-                    self.prices['goldapi'] = {
-                        'prices': prices,
-                        'currency': 'AED',
-                        'location': 'International (Live Market)',
-                        'source': 'Gold-API.com'
-                    }
-                    return prices
+            stale_quote = None
+            for api, label, fetch in apis:
+                quote = spot_quotes.get(api, fetch)
+                if quote is None:
+                    print(f"   {label}: no quote (budget exhausted or request failed), trying next API...")
+                    continue
+                if quote['stale']:
+                    print(f"   {label}: cached quote is {quote['age'] // 3600}h old, trying next API...")
+                    stale_quote = stale_quote or (label, quote)
+                    continue
+                break
+            else:
+                if stale_quote is None:
+                    print("   ❌ No prices available from APIs")
+                    return None
+                label, quote = stale_quote
             
-            # Fallback to another free API
-            print("   Trying alternative API...")
-            response = requests.get('https://www.goldapi.io/api/XAU/USD', 
-                                   headers={'x-access-token': 'goldapi-demo'}, 
-                                   timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'price' in data:
-                    usd_per_troy_oz = data['price']
-                    usd_to_aed = 3.67
-                    gram_per_troy_oz = 31.1035
-                    
-                    aed_per_gram_24k = (usd_per_troy_oz / gram_per_troy_oz) * usd_to_aed
-                    aed_per_gram_22k = aed_per_gram_24k * (22/24)
-                    aed_per_gram_18k = aed_per_gram_24k * (18/24)
-                    
-                    prices = {
-                        '24k': round(aed_per_gram_24k, 2),
-                        '22k': round(aed_per_gram_22k, 2),
-                        '18k': round(aed_per_gram_18k, 2)
-                    }
-                    
-                    print(f"   ✅ GoldAPI: 24K={prices['24k']} AED, 22K={prices['22k']} AED")
-                    self.prices['goldapi'] = {
-                        'prices': prices,
-                        'currency': 'AED',
-                        'location': 'International (Live Market)',
-                        'source': 'GoldAPI.io'
-                    }
-                    return prices
+            # Gold price in USD per troy ounce -> AED per gram (1 troy oz = 31.1035 grams)
+            usd_per_troy_oz = quote['value']
+            usd_to_aed = fx_rates.rate('USD', 'AED')
+            gram_per_troy_oz = 31.1035
             
-            print("   ❌ No prices available from APIs")
-            return None
+            # Calculate 24K price per gram in AED, then 22K and 18K based on purity
+            aed_per_gram_24k = (usd_per_troy_oz / gram_per_troy_oz) * usd_to_aed
+            aed_per_gram_22k = aed_per_gram_24k * (22/24)
+            aed_per_gram_18k = aed_per_gram_24k * (18/24)
+            
+            prices = {
+                '24k': round(aed_per_gram_24k, 2),
+                '22k': round(aed_per_gram_22k, 2),
+                '18k': round(aed_per_gram_18k, 2)
+            }
+            
+            quoted_at = datetime.fromtimestamp(quote['fetched_at'])
+            cached_note = f" (cached quote from {quoted_at:%d %b %H:%M})" if quote['cached'] else ""
+            if quote['stale']:
+                cached_note = f" (⚠️ stale quote, {quote['age'] // 3600}h old)"
+            print(f"   ✅ GoldAPI: 24K={prices['24k']} AED, 22K={prices['22k']} AED{cached_note}")
+            self.prices['goldapi'] = {
+                'prices': prices,
+                'currency': 'AED',
+                'location': 'International (Live Market)',
+                'source': label,
+                'quoted_at': quoted_at.isoformat(),
+                'cached': quote['cached'],
+                'stale': quote['stale'],
+                'quote_age': quote['age']
+            }
+            return prices
         
         except Exception as e:
             print(f"   ❌ Error: {e}")
@@ -514,16 +535,18 @@ class GoldPriceTracker:
         
         return report
     
-    def send_email_notification(self, report):
-        """Send email with price report"""
+    def send_email_notification(self, report, recipient=None, html=None):
+        """Send email with price report (to the configured recipient unless one is given)"""
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+        
         print("\n📧 Sending email notification...")
         
         try:
             # Use config email settings if available
             email_config = self.config.get('email', {})
             sender = email_config.get('sender', self.gmail_config['sender_email'])
-            password = email_config.get('password', self.gmail_config['sender_password'])
-            recipient = email_config.get('recipient', self.gmail_config['recipient'])
+            recipient = recipient or email_config.get('recipient', self.gmail_config['recipient'])
             
             msg = MIMEMultipart('alternative')
             msg['Subject'] = f"Gold Price Report - {datetime.now().strftime('%Y-%m-%d %H:%M')}"
@@ -531,14 +554,13 @@ class GoldPriceTracker:
             msg['To'] = recipient
             
             # Create HTML email
-            html = self.format_email_html(report)
+            if html is None:
+                with EMAIL_RENDER_SECONDS.time():
+                    html = self.format_email_html(report)
             msg.attach(MIMEText(html, 'html'))
             
             # Send email
-            with smtplib.SMTP(self.gmail_config['smtp_server'], self.gmail_config['smtp_port']) as server:
-                server.starttls()
-                server.login(sender, password)
-                server.send_message(msg)
+            self.send_message(msg)
             
             print(f"   ✅ Email sent to {recipient}")
             return True
@@ -547,6 +569,72 @@ class GoldPriceTracker:
             print(f"   ❌ Error sending email: {e}")
             return False
     
+    def send_message(self, msg):
+        """Deliver a message through the configured Gmail account"""
+        import smtplib
+        
+        email_config = self.config.get('email', {})
+        sender = email_config.get('sender', self.gmail_config['sender_email'])
+        password = email_config.get('password', self.gmail_config['sender_password'])
+        
+        start = time.perf_counter()
+        try:
+            with smtplib.SMTP(self.gmail_config['smtp_server'], self.gmail_config['smtp_port']) as server:
+                server.starttls()
+                server.login(sender, password)
+                server.send_message(msg)
+        except Exception:
+            SMTP_SEND_SECONDS.observe(time.perf_counter() - start, outcome='failure')
+            raise
+        SMTP_SEND_SECONDS.observe(time.perf_counter() - start, outcome='success')
+    
+    def send_changed_notifications(self, report, force=False):
+        """
+        Email the report only to recipients whose prices moved past their threshold
+        since the last report they got; the others get a digest or nothing
+        
+        Recipients come from config email.recipients (see change_detection.py),
+        defaulting to email.recipient. Returns {email: 'full' | 'digest' | 'skip' | 'failed'}.
+        """
+        from email.mime.text import MIMEText
+        
+        email_config = self.config.get('email', {})
+        recipients = email_config.get('recipients') or [email_config.get('recipient', self.gmail_config['recipient'])]
+        prices = flatten_prices(report['sources'])
+        plans = self.sent_reports.plan(recipients, prices, force)
+        
+        html = None
+        outcomes = {}
+        delivered = []
+        for plan in plans:
+            if plan['action'] == 'full':
+                if html is None:
+                    with EMAIL_RENDER_SECONDS.time():
+                        html = self.format_email_html(report)
+                sent = self.send_email_notification(report, plan['email'], html)
+                if sent:
+                    delivered.append(plan['email'])
+            elif plan['action'] == 'digest':
+                msg = MIMEText(format_digest_html(plan), 'html')
+                msg['Subject'] = f"Gold Price Report - no significant change {datetime.now().strftime('%Y-%m-%d')}"
+                msg['From'] = email_config.get('sender', self.gmail_config['sender_email'])
+                msg['To'] = plan['email']
+                try:
+                    self.send_message(msg)
+                    print(f"   📨 No significant change, digest sent to {plan['email']}")
+                    sent = True
+                except Exception as e:
+                    print(f"   ❌ Error sending digest: {e}")
+                    sent = False
+            else:
+                print(f"   ⏭️  No significant change, no email to {plan['email']}")
+                sent = True
+            outcomes[plan['email']] = plan['action'] if sent else 'failed'
+        
+        if delivered:
+            self.sent_reports.record(delivered, prices)
+        return outcomes
+    
     def format_email_html(self, report):
         """Format report as HTML email"""
         html = f"""
@@ -765,28 +853,35 @@ class GoldPriceTracker:
         
         return html
     
-    def run(self):
-        """Main execution"""
+    def run(self, force_email=False, progress=None):
+        """
+        Main execution
+        
+        progress(event, **data), if given, is called with 'started' (the enabled sources),
+        then 'source' as each source finishes, and 'saved' once the report is written.
+        """
         print(f"\n{'='*70}")
         print(f"  GOLD PRICE TRACKER - {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*70}")
         
-        # Fetch live API prices first (fast and reliable)
-        if self.config['sources'].get('goldapi', True):
-            self.fetch_goldapi_prices()
-        
-        # Fetch prices from all sources
-        if self.config['sources'].get('kalyan', True):
-            self.fetch_kalyan_prices()
-        
-        if self.config['sources'].get('joy_alukkas', True):
-            self.fetch_joy_alukkas_prices()
-        
-        if self.config['sources'].get('bhima', True):
-            self.fetch_bhima_prices()
-        
-        if self.config['sources'].get('candere', True):
-            self.fetch_candere_prices()
+        # Fetch live API prices first (fast and reliable), then the browser-based sources
+        fetchers = [
+            ('goldapi', self.fetch_goldapi_prices),
+            ('kalyan', self.fetch_kalyan_prices),
+            ('joy_alukkas', self.fetch_joy_alukkas_prices),
+            ('bhima', self.fetch_bhima_prices),
+            ('candere', self.fetch_candere_prices)
+        ]
+        fetchers = [(source, fetch) for source, fetch in fetchers if self.config['sources'].get(source, True)]
+        if progress:
+            progress('started', sources=[source for source, _ in fetchers])
+        for done, (source, fetch) in enumerate(fetchers, 1):
+            with FETCH_SECONDS.time(source=source):
+                fetch()
+            if progress:
+                entry = self.prices.get(source)
+                progress('source', source=source, success=entry is not None,
+                         prices=entry['prices'] if entry else None, done=done, total=len(fetchers))
         
         # Generate report
         report = self.generate_report()
@@ -797,9 +892,11 @@ class GoldPriceTracker:
         with open(report_file, 'w') as f:
             json.dump(report, f, indent=4)
         print(f"\n💾 Report saved: {report_file}")
+        if progress:
+            progress('saved', report_file=report_file)
         
-        # Send email notification
-        self.send_email_notification(report)
+        # Send email notification (skipped for recipients whose prices have not moved)
+        self.send_changed_notifications(report, force=force_email)
         
         print(f"\n{'='*70}")
         print("  ✅ TRACKING COMPLETE")
@@ -0,0 +1,108 @@
+"""
+KaratMate Labs - Hedged Requests
+If the primary request has not answered within the source's p95 latency, fire a
+second one (same URL or a configured alternate) and use whichever answers first
+"""
+
+import concurrent.futures
+import threading
+import time
+
+
+class HedgeStats:
+    """Per-source hedge counters"""
+
+    def __init__(self):
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latency_won = 0.0  # seconds saved when the hedge beat the primary
+        self._lock = threading.Lock()
+
+    def record(self, hedged, hedge_won):
+        with self._lock:
+            self.requests += 1
+            self.hedges += hedged
+            self.hedge_wins += hedge_won
+
+    def record_latency_won(self, seconds):
+        with self._lock:
+            self.latency_won += max(0.0, seconds)
+
+    def hedge_rate(self):
+        return self.hedges / self.requests if self.requests else 0.0
+
+    def status(self):
+        return {
+            'requests': self.requests,
+            'hedges': self.hedges,
+            'hedge_rate': round(self.hedge_rate(), 3),
+            'hedge_wins': self.hedge_wins,
+            'latency_won_ms': round(self.latency_won * 1000, 1)
+        }
+
+
+def _timed(fn, cancelled):
+    """Run one attempt -> (result, finished_at); exceptions propagate through the future"""
+    result = fn(cancelled)
+    return result, time.perf_counter()
+
+
+def hedged_call(primary, hedge, delay, executor, stats):
+    """
+    Run primary(cancelled); if it is still running after `delay` seconds also run
+    hedge(cancelled) and return the first non-None result.
+
+    Attempts receive a threading.Event that is set once the other attempt has won,
+    so they can stop downloading. Requests already waiting on the network cannot be
+    interrupted; the loser's finish time is used to measure the latency won.
+    """
+    if delay is None:
+        stats.record(hedged=False, hedge_won=False)
+        return primary(threading.Event())
+
+    primary_cancel = threading.Event()
+    first = executor.submit(_timed, primary, primary_cancel)
+    try:
+        result, _ = first.result(timeout=delay)
+        stats.record(hedged=False, hedge_won=False)
+        return result
+    except concurrent.futures.TimeoutError:
+        pass
+
+    hedge_cancel = threading.Event()
+    second = executor.submit(_timed, hedge, hedge_cancel)
+    attempts = {first: primary_cancel, second: hedge_cancel}
+    error = None
+
+    for future in concurrent.futures.as_completed(attempts):
+        try:
+            result, finished_at = future.result()
+        except Exception as e:
+            error = error or e
+            continue
+        if result is None:
+            continue
+
+        loser = second if future is first else first
+        attempts[loser].set()
+        hedge_won = future is second
+        stats.record(hedged=True, hedge_won=hedge_won)
+        if hedge_won:
+            loser.add_done_callback(
+                lambda f: stats.record_latency_won(_finished_at(f) - finished_at)
+            )
+        return result
+
+    stats.record(hedged=True, hedge_won=False)
+    if error is not None:
+        raise error
+    return None
+
+
+def _finished_at(future):
+    """When a (possibly failed) attempt finished; failures count as finishing now"""
+    try:
+        return future.result()[1]
+    except Exception:
+        return time.perf_counter()
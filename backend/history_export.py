@@ -0,0 +1,136 @@
+"""
+KaratMate Labs - History Export
+Streams price history rows, optionally with each 22K row's sovereign and
+customs breakdown, as CSV or NDJSON
+
+export_chunks() is a generator of text chunks fed straight from the database
+cursor, so any date range exports in constant memory and the first bytes go out
+before the query has finished.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+from calculations import calculate_customs_duty, calculate_sovereign_india, calculate_sovereign_uae
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+PRICE_FIELDS = ('ts', 'source', 'region', 'karat', 'price', 'currency')
+CALCULATION_FIELDS = ('grams', 'base_price', 'making_charges', 'making_gst', 'tax', 'total',
+                      'customs_red', 'customs_red_with_gst', 'customs_green', 'customs_green_with_gst')
+CHUNK_ROWS = 500
+
+
+def _date_arg(value, name):
+    if not value:
+        return None
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD) or ISO timestamp')
+    return value
+
+
+def export_params(args):
+    """
+    Validate export arguments (query string or CLI) -> (query kwargs, format, grams)
+
+    Keys: format, from, to, source, karat, region, grams, calculations ('0' = no
+    breakdown, grams is then None). Raises ValueError with a message for the user.
+    """
+    fmt = args.get('format') or 'csv'
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    query = {
+        'start': _date_arg(args.get('from'), 'from'),
+        'end': _date_arg(args.get('to'), 'to'),
+        'source': args.get('source') or None,
+        'karat': (args.get('karat') or '').lower() or None,
+        'region': args.get('region') or None
+    }
+    grams = None
+    if str(args.get('calculations', '1')) != '0':
+        try:
+            grams = float(args.get('grams') or 8)
+        except ValueError:
+            raise ValueError('grams must be a number')
+        if grams <= 0:
+            raise ValueError('grams must be positive')
+        grams = int(grams) if grams.is_integer() else grams
+    return query, fmt, grams
+
+
+def export_filename(fmt, query):
+    span = '_'.join(part for part in (query.get('start'), query.get('end')) if part) or 'all'
+    return f"karatmate_history_{span.replace(':', '')}.{fmt}"
+
+
+def history_breakdown(row, grams=8):
+    """Sovereign (and for India, customs) breakdown of one 22K history row; {} for other karats"""
+    if row['karat'] != '22k':
+        return {}
+    if row['currency'] == 'INR' or row['source'] == 'sourceb':
+        calc = calculate_sovereign_india(row['price'], grams)
+        red = calculate_customs_duty(calc['base_price'], grams, 'red')
+        green = calculate_customs_duty(calc['base_price'], grams, 'green')
+        return {
+            'grams': grams,
+            'base_price': calc['base_price'],
+            'making_charges': calc['making_charges'],
+            'making_gst': calc['making_gst'],
+            'tax': calc['gst'],
+            'total': calc['total'],
+            'customs_red': red['customs_duty'],
+            'customs_red_with_gst': red['total_with_gst'],
+            'customs_green': green['customs_duty'],
+            'customs_green_with_gst': green['total_with_gst']
+        }
+    calc = calculate_sovereign_uae(row['price'], grams)
+    return {
+        'grams': grams,
+        'base_price': calc['base_price'],
+        'making_charges': calc['making_charges'],
+        'tax': calc['vat'],
+        'total': calc['total']
+    }
+
+
+def _take(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+def export_chunks(rows, fmt='csv', breakdown=None):
+    """
+    rows (dicts from HistoryStore.query()) -> text chunks of CHUNK_ROWS rows
+
+    breakdown(row) returns the calculation fields for a row ({} when there are
+    none); pass None to export prices only. The CSV header is yielded first, on its own.
+    """
+    fields = PRICE_FIELDS + (CALCULATION_FIELDS if breakdown else ())
+    buffer = io.StringIO()
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore', lineterminator='\n')
+        writer.writeheader()
+        yield _take(buffer)
+
+    count = 0
+    for row in rows:
+        record = {field: row[field] for field in PRICE_FIELDS}
+        if breakdown:
+            record.update(breakdown(row))
+        if writer:
+            writer.writerow(record)
+        else:
+            buffer.write(json.dumps(record, separators=(',', ':')) + '\n')
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield _take(buffer)
+
+    rest = _take(buffer)
+    if rest:
+        yield rest
@@ -0,0 +1,136 @@
+"""
+KaratMate Labs - Price History Store
+SQLite table of every price ever recorded, one row per (source, region, karat,
+time), indexed for time-range queries
+
+Source keys from old tracker reports (joy_alukkas, candere, goldapi...) are
+normalized to the price API's keys, so history from both lines up.
+"""
+
+import contextlib
+import os
+import re
+import sqlite3
+
+DEFAULT_HISTORY_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'price_history.db')
+
+# Report source key -> (source, region) as used by the price API
+SOURCE_ALIASES = {
+    'joy_alukkas': ('sourcea', 'dubai'),
+    'joyalukkas': ('sourcea', 'dubai'),
+    'sourcea': ('sourcea', 'dubai'),
+    'candere': ('sourceb', 'kerala'),
+    'sourceb': ('sourceb', 'kerala'),
+    'bhima': ('bhima', ''),
+    'kalyan': ('kalyan', ''),
+    'goldapi': ('spot', ''),
+    'gold_api': ('spot', '')
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    ts TEXT NOT NULL,
+    source TEXT NOT NULL,
+    region TEXT NOT NULL DEFAULT '',
+    karat TEXT NOT NULL,
+    price REAL NOT NULL,
+    currency TEXT,
+    origin TEXT,
+    PRIMARY KEY (source, region, karat, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS prices_ts ON prices (ts);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    imported_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+COLUMNS = ('ts', 'source', 'region', 'karat', 'price', 'currency', 'origin')
+
+
+def normalize_source(key):
+    """'Joy Alukkas' / 'joy-alukkas' / 'joy_alukkas' -> ('sourcea', 'dubai')"""
+    key = re.sub(r'[\s\-]+', '_', key.strip().lower())
+    return SOURCE_ALIASES.get(key, (key, ''))
+
+
+class HistoryStore:
+    """Thin wrapper around the SQLite file; every call opens its own connection"""
+
+    def __init__(self, path=DEFAULT_HISTORY_DB):
+        self.path = path
+        with contextlib.closing(self.connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=check_same_thread)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def imported_files(self, conn):
+        """{path: (size, mtime_ns)} of report files already imported"""
+        return {path: (size, mtime_ns) for path, size, mtime_ns in
+                conn.execute('SELECT path, size, mtime_ns FROM imported_files')}
+
+    def import_batch(self, conn, rows, files):
+        """
+        Insert price rows and mark their files imported in one transaction
+
+        Rows already present are ignored, so re-importing is harmless. Returns the
+        number of new rows.
+        """
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO prices (ts, source, region, karat, price, currency, origin) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            inserted = conn.total_changes - before
+            conn.executemany(
+                'INSERT OR REPLACE INTO imported_files (path, size, mtime_ns, rows) VALUES (?, ?, ?, ?)', files)
+        return inserted
+
+    def query(self, start=None, end=None, source=None, karat=None, region=None):
+        """
+        Rows as dicts in time order, read lazily from the cursor
+
+        start / end are ISO timestamps or dates (end is inclusive of the whole day
+        when only a date is given).
+        """
+        clauses, params = [], []
+        if start:
+            clauses.append('ts >= ?')
+            params.append(start.replace(' ', 'T'))
+        if end:
+            end = end.replace(' ', 'T')
+            clauses.append('ts <= ?')
+            params.append(end if 'T' in end else end + 'T23:59:59')
+        for column, value in (('source', source), ('karat', karat), ('region', region)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        # A streaming response may pull each row batch on a different threadpool thread; the connection
+        # belongs to this generator alone and is only ever used by one thread at a time
+        conn = self.connect(check_same_thread=False)
+        try:
+            # The ts index (which also holds the key columns) already has this order, so rows stream
+            # straight off it; without INDEXED BY a source filter makes SQLite sort the whole result first
+            cursor = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM prices INDEXED BY prices_ts{where} "
+                                  f"ORDER BY ts, source, region, karat", params)
+            for row in cursor:
+                yield dict(zip(COLUMNS, row))
+        finally:
+            conn.close()
+
+    def summary(self):
+        """Row count and time span per source"""
+        with contextlib.closing(self.connect()) as conn:
+            return {
+                source: {'rows': rows, 'first': first, 'last': last}
+                for source, rows, first, last in conn.execute(
+                    'SELECT source, COUNT(*), MIN(ts), MAX(ts) FROM prices GROUP BY source ORDER BY source')
+            }
@@ -0,0 +1,57 @@
+"""
+KaratMate Labs - Per-Host Concurrency Limits
+Caps simultaneous requests to any one site when many regions are fetched at once
+"""
+
+import asyncio
+import contextlib
+import threading
+from urllib.parse import urlsplit
+
+
+def host_of(url):
+    return (urlsplit(url).hostname or '').lower()
+
+
+class HostLimiter:
+    """At most `limit` concurrent requests per host (threads)"""
+
+    def __init__(self, limit=4):
+        self.limit = limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, host):
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            with self._lock:
+                semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.limit))
+        return semaphore
+
+    def acquire(self, url):
+        """Wait for a slot on url's host; release() the returned semaphore when done"""
+        semaphore = self._semaphore(host_of(url))
+        semaphore.acquire()
+        return semaphore
+
+    @contextlib.contextmanager
+    def slot(self, url):
+        semaphore = self.acquire(url)
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+class AsyncHostLimiter:
+    """HostLimiter for asyncio code (one event loop)"""
+
+    def __init__(self, limit=4):
+        self.limit = limit
+        self._semaphores = {}
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url):
+        semaphore = self._semaphores.setdefault(host_of(url), asyncio.Semaphore(self.limit))
+        async with semaphore:
+            yield
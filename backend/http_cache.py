@@ -0,0 +1,88 @@
+"""
+KaratMate Labs - On-Disk HTTP Cache
+Per-URL cache of page body, validators, fetch time and parsed prices for
+short-lived processes (RUN_FETCH_EMAIL.py, scheduled jobs)
+
+Within max_age a cached page is used without touching the network or the
+parser. After that the page is revalidated with If-None-Match /
+If-Modified-Since; a 304, or an identical body from a server without
+validators, reuses the stored parse result.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'karatmate_http_cache')
+DEFAULT_MAX_AGE = 300
+
+
+def body_digest(body):
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+class HttpCache:
+    """One JSON file per URL under `directory`"""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_age=DEFAULT_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        """Cached entry for url, or None"""
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('url') == url else None
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] <= self.max_age
+
+    def validators(self, entry):
+        """Conditional request headers for revalidating entry"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def parsed(self, entry, parser):
+        """The stored parse result if it came from the same parser"""
+        if entry.get('parser') == parser:
+            return entry.get('parsed')
+        return None
+
+    def put(self, url, body, parsed, parser, etag=None, last_modified=None):
+        self._write({
+            'url': url,
+            'fetched_at': time.time(),
+            'etag': etag,
+            'last_modified': last_modified,
+            'digest': body_digest(body),
+            'body': body,
+            'parser': parser,
+            'parsed': parsed
+        })
+
+    def touch(self, entry):
+        """Mark entry as just revalidated"""
+        self._write(dict(entry, fetched_at=time.time()))
+
+    def _write(self, entry):
+        fd, tmp_path = tempfile.mkstemp(prefix='.page-', suffix='.json', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(entry['url']))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,162 @@
+"""
+KaratMate Labs - History Backfill
+Imports the reports/gold_report_*.json files saved by GoldPriceTracker.run()
+into the price history store (history_store.py)
+
+Files are parsed in a process pool and written by this process in large
+transactions. Each imported file is recorded (path, size, mtime) in the same
+transaction as its rows, so an interrupted import resumes where it stopped,
+and re-running only picks up new or changed files.
+
+Usage:
+    python import_history.py                      # ./reports into price_history.db
+    python import_history.py ../reports --workers 8 --batch-rows 100000
+    python import_history.py --json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from history_store import DEFAULT_HISTORY_DB, HistoryStore, normalize_source
+
+REPORT_NAME = re.compile(r'gold_report_(\d{8}_\d{6})\.json$')
+
+
+def report_timestamp(report, filename):
+    """The report's own timestamp, else the one in its file name -> 'YYYY-MM-DDTHH:MM:SS'"""
+    raw = report.get('timestamp')
+    if isinstance(raw, str):
+        try:
+            return datetime.fromisoformat(raw.strip().replace(' ', 'T')).strftime('%Y-%m-%dT%H:%M:%S')
+        except ValueError:
+            pass
+    match = REPORT_NAME.search(filename)
+    if match:
+        return datetime.strptime(match.group(1), '%Y%m%d_%H%M%S').strftime('%Y-%m-%dT%H:%M:%S')
+    return None
+
+
+def read_report(path):
+    """
+    Parse one report file (runs in a pool worker)
+
+    Returns (path, size, mtime_ns, rows, error); rows are history_store row tuples.
+    """
+    try:
+        stat = os.stat(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError) as e:
+        return path, 0, 0, [], str(e)
+
+    filename = os.path.basename(path)
+    ts = report_timestamp(report, filename)
+    if ts is None:
+        return path, stat.st_size, stat.st_mtime_ns, [], 'no timestamp'
+
+    rows = []
+    for key, entry in (report.get('sources') or {}).items():
+        if not isinstance(entry, dict):
+            continue
+        source, region = normalize_source(key)
+        for karat, price in (entry.get('prices') or {}).items():
+            try:
+                price = float(str(price).replace(',', ''))
+            except ValueError:
+                continue
+            if price > 0:
+                rows.append((ts, source, region, karat.lower(), price, entry.get('currency'), filename))
+    return path, stat.st_size, stat.st_mtime_ns, rows, None
+
+
+def pending_reports(reports_dir, imported, stats):
+    """Report paths not imported yet, or changed since (lazily, straight from the directory)"""
+    with os.scandir(reports_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.json') or not entry.is_file():
+                continue
+            path = os.path.abspath(entry.path)
+            stat = entry.stat()
+            if imported.get(path) == (stat.st_size, stat.st_mtime_ns):
+                stats['skipped'] += 1
+            else:
+                yield path
+
+
+def run_import(reports_dir, store, workers=None, batch_rows=50000, chunksize=32, progress=None):
+    """Import everything pending; returns the counts and files/sec"""
+    start = time.perf_counter()
+    stats = {'files': 0, 'rows': 0, 'inserted': 0, 'skipped': 0, 'errors': []}
+    conn = store.connect()
+    try:
+        imported = store.imported_files(conn)
+        rows, files = [], []
+
+        def flush():
+            stats['inserted'] += store.import_batch(conn, rows, files)
+            rows.clear()
+            files.clear()
+            if progress:
+                elapsed = time.perf_counter() - start
+                progress(f"{stats['files']} files, {stats['inserted']} new rows, "
+                         f"{stats['files'] / elapsed:.0f} files/s")
+
+        with multiprocessing.Pool(workers) as pool:
+            for path, size, mtime_ns, report_rows, error in pool.imap_unordered(
+                    read_report, pending_reports(reports_dir, imported, stats), chunksize):
+                if error:
+                    stats['errors'].append({'path': path, 'error': error})
+                    continue
+                rows.extend(report_rows)
+                files.append((path, size, mtime_ns, len(report_rows)))
+                stats['files'] += 1
+                stats['rows'] += len(report_rows)
+                if len(rows) >= batch_rows:
+                    flush()
+        if files:
+            flush()
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    stats['seconds'] = round(elapsed, 2)
+    stats['files_per_sec'] = round(stats['files'] / elapsed, 1) if elapsed else None
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill the price history store from saved tracker reports')
+    parser.add_argument('reports_dir', nargs='?', default='reports', help='directory of gold_report_*.json files')
+    parser.add_argument('--db', default=DEFAULT_HISTORY_DB, help='history database file')
+    parser.add_argument('--workers', type=int, help='parser processes (default: CPU count)')
+    parser.add_argument('--batch-rows', type=int, default=50000, help='rows per transaction')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.reports_dir):
+        parser.error(f'{args.reports_dir} is not a directory')
+
+    store = HistoryStore(args.db)
+    progress = None if args.json else (lambda line: print(f'   {line}', flush=True))
+    stats = run_import(args.reports_dir, store, args.workers, args.batch_rows, progress=progress)
+
+    if args.json:
+        print(json.dumps(dict(stats, history=store.summary()), indent=2))
+        return 1 if stats['errors'] else 0
+
+    print(f"\n✅ Imported {stats['files']} files ({stats['inserted']} new rows of {stats['rows']}) "
+          f"in {stats['seconds']}s - {stats['files_per_sec']} files/s; {stats['skipped']} already imported")
+    for error in stats['errors']:
+        print(f"   ❌ {error['path']}: {error['error']}")
+    for source, row in store.summary().items():
+        print(f"   {source:<10} {row['rows']:>9} rows  {row['first']} → {row['last']}")
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
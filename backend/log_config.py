@@ -0,0 +1,101 @@
+"""
+KaratMate Labs - Structured Logging
+JSON-lines logging through a queue: request threads only enqueue records and a
+background listener thread does the (slow, on Windows consoles) stream writes
+
+    log = get_logger('price_api')
+    log.info('fetched', extra={'source': 'sourcea', 'duration_ms': 412.5, 'outcome': 'success'})
+
+Level comes from KARATMATE_LOG_LEVEL (default INFO); per-row parser output is
+logged at DEBUG and therefore off unless KARATMATE_LOG_LEVEL=DEBUG.
+"""
+
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+ROOT_LOGGER = 'karatmate'
+LOG_LEVEL_ENV = 'KARATMATE_LOG_LEVEL'
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message and any `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        # Queued records carry the traceback already formatted (see _QueueHandler)
+        exception = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if exception:
+            entry['exception'] = exception
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that keeps the traceback in exc_text
+
+    The stock prepare() folds the traceback into the message and drops exc_info,
+    so the JSON formatter on the listener thread could not output "exception".
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None  # tracebacks hold frames; only the text goes on the queue
+        return record
+
+
+def configure_logging(level=None, stream=None):
+    """
+    Route the 'karatmate' loggers through a QueueHandler (idempotent)
+
+    Records are formatted and written by a QueueListener thread, so a slow or
+    blocked console never stalls the thread that logged.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter())
+
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel((level or os.environ.get(LOG_LEVEL_ENV) or 'INFO').upper())
+        root.addHandler(_QueueHandler(log_queue))
+        root.propagate = False
+
+
+def get_logger(name):
+    """Logger under the 'karatmate' hierarchy"""
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
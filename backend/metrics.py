@@ -0,0 +1,173 @@
+"""
+KaratMate Labs - Metrics
+Minimal Prometheus-style counters and histograms (text exposition format 0.0.4)
+Recording is a dict lookup and an addition under a per-metric lock.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Shared metrics (both APIs and the tracker record into these)
+FETCH_SECONDS = REGISTRY.histogram(
+    'karatmate_fetch_seconds', 'HTTP download time per source', ['source'])
+PARSE_SECONDS = REGISTRY.histogram(
+    'karatmate_parse_seconds', 'HTML parse time per source', ['source'])
+FETCH_RESULTS = REGISTRY.counter(
+    'karatmate_fetch_total', 'Source fetches by outcome (success, failure, stale, circuit_open)',
+    ['source', 'outcome'])
+SELECTOR_DEPTH = REGISTRY.histogram(
+    'karatmate_selector_fallback_depth', 'Index of the selector that matched (0 = primary)',
+    ['source', 'karat'], buckets=(0, 1, 2, 3, 4))
+CACHE_REQUESTS = REGISTRY.counter(
+    'karatmate_cache_requests_total', 'Cache lookups by cache and result (hit, miss)', ['cache', 'result'])
+CALCULATION_SECONDS = REGISTRY.histogram(
+    'karatmate_calculation_seconds', 'Time to compute sovereign and customs calculations')
+EMAIL_RENDER_SECONDS = REGISTRY.histogram(
+    'karatmate_email_render_seconds', 'Time to render the HTML report email')
+SMTP_SEND_SECONDS = REGISTRY.histogram(
+    'karatmate_smtp_send_seconds', 'Time to connect, log in and send over SMTP', ['outcome'])
+ALERTS_FIRED = REGISTRY.counter(
+    'karatmate_alerts_fired_total', 'Price alert threshold crossings', ['direction'])
+ALERT_EVALUATE_SECONDS = REGISTRY.histogram(
+    'karatmate_alert_evaluate_seconds', 'Time to match one price update against the alert index',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+TRACKER_RUNS = REGISTRY.counter(
+    'karatmate_tracker_runs_total', 'Browser-based tracker run requests by admission (started, shared, rejected)',
+    ['admission'])
+REQUEST_SECONDS = REGISTRY.histogram(
+    'karatmate_request_seconds', 'API request latency per route', ['app', 'method', 'route', 'status'])
+
+
+def install_flask_metrics(app, app_name):
+    """Record per-route request latency and expose GET /metrics on a Flask app"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - start, app=app_name, method=request.method,
+                                    route=route, status=str(response.status_code))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,526 @@
+"""
+KaratMate Labs - Live Gold Price API (async / ASGI)
+Same routes and JSON as price_fetcher_api.py, with non-blocking upstream I/O:
+httpx for the scrapers and aiosmtplib for the report email
+
+Run with:
+    uvicorn price_api_async:app --host 0.0.0.0 --port 5002
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import datetime
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from price_fetcher_api import (
+    DEFAULT_EMAIL_CONFIG, REQUEST_HEADERS, SNAPSHOT_MAX_AGE, SOURCES, DeadlineExceeded, alert_engine,
+    alert_metric_names, build_email_message, calculation_sources, collect_results, empty_results, finish_results,
+    guard_key, history_export_stream, no_calculations, parse_deadline, parse_selection, price_stats, region_pages,
+    select_payload, selection_etag, selection_pages, selection_payload, source_guards, source_region, stats_only
+)
+from history_export import FORMATS
+from alert_engine import AlertError
+from host_limiter import AsyncHostLimiter
+from snapshot_store import SnapshotStore, etag_matches
+from fx_rates import fx_rates
+from log_config import get_logger
+from metrics import (
+    CACHE_REQUESTS, CONTENT_TYPE, FETCH_RESULTS, FETCH_SECONDS, PARSE_SECONDS,
+    REGISTRY, REQUEST_SECONDS, SMTP_SEND_SECONDS
+)
+
+log = get_logger('price_api_async')
+snapshot_store = SnapshotStore(history=32, calculation_sources=calculation_sources,
+                               stats_ticks=lambda: price_stats.recorded)
+http_client = None
+refresh_round = None
+selection_rounds = {}
+background_rounds = set()
+host_limiter = None
+
+
+async def fetch_source_async(key, timeout=10, region=None, upstream=None):
+    """
+    Download one source (region) without blocking the loop; BeautifulSoup runs in a worker thread
+
+    The request's own time (not the wait for a host slot) is appended to the `upstream` list.
+    """
+    source = SOURCES[key]
+    region, url, location = source_region(key, region)
+    async with host_limiter.slot(url):
+        start = time.perf_counter()
+        try:
+            response = await http_client.get(url, headers=REQUEST_HEADERS, timeout=timeout)
+        finally:
+            if upstream is not None:
+                upstream.append(time.perf_counter() - start)
+
+    if response.status_code == 200:
+        FETCH_SECONDS.observe(time.perf_counter() - start, source=key)
+        start = time.perf_counter()
+        prices = await asyncio.to_thread(source['parse'], response.text)
+        PARSE_SECONDS.observe(time.perf_counter() - start, source=key)
+        if prices:
+            entry = dict({'prices': prices}, **source['info'])
+            if region is not None:
+                entry.update(location=location, region=region)
+            return entry
+    return None
+
+
+async def fetch_source_guarded_async(key, region=None):
+    """fetch_source_async() behind the source's circuit breaker (see fetch_source_guarded)"""
+    guarded = guard_key(key, region)
+    guard = source_guards.get(guarded)
+    name = SOURCES[key]['name'] if guarded == key else f"{SOURCES[key]['name']} [{region}]"
+
+    def outcome(result, elapsed=None, **fields):
+        FETCH_RESULTS.inc(source=guarded, outcome=result)
+        duration_ms = round(elapsed * 1000, 2) if elapsed is not None else None
+        level = logging.INFO if result == 'success' else logging.WARNING
+        log.log(level, f'{name}: {result}', extra=dict(
+            {'source': guarded, 'duration_ms': duration_ms, 'outcome': result}, **fields))
+
+    if not guard.breaker.allow():
+        outcome('circuit_open')
+        return guard.stale_entry()
+
+    start = time.perf_counter()
+    error = None
+    upstream = []
+    try:
+        entry = await fetch_source_async(key, timeout=guard.timeout(), region=region, upstream=upstream)
+    except Exception as e:
+        error = str(e)
+        entry = None
+    elapsed = time.perf_counter() - start
+    latency = upstream[0] if upstream else None
+
+    if entry:
+        guard.record_success(entry, latency)
+        outcome('success', elapsed, prices=entry['prices'])
+        return entry
+
+    guard.record_failure(latency)
+    stale = guard.stale_entry()
+    outcome('stale' if stale else 'failure', elapsed, error=error)
+    return stale
+
+
+class AsyncFetchRound:
+    """
+    One concurrent fetch of every region page, awaited by callers up to their own deadline
+    (see FetchRound); the page tasks keep running after a deadline passes
+    """
+
+    def __init__(self, publish=False, pages=None, max_age=None, wanted=None, finish=True):
+        self.started = time.perf_counter()
+        self.publish = publish
+        self.wanted = wanted
+        self.finish = finish
+        self.tasks = {}
+        for (key, _), regions in (region_pages() if pages is None else pages).items():
+            reused = source_guards.get(guard_key(key, regions[0])).fresh_entry(max_age) if max_age else None
+            if reused:
+                task = asyncio.get_running_loop().create_future()
+                task.set_result(reused)
+            else:
+                task = asyncio.ensure_future(fetch_source_guarded_async(key, regions[0]))
+            self.tasks[task] = (key, regions)
+        self.task = asyncio.ensure_future(self._complete())
+        # The loop only keeps weak references to tasks; hold this round until it is done
+        background_rounds.add(self)
+        self.task.add_done_callback(lambda task: background_rounds.discard(self))
+
+    async def _complete(self):
+        await asyncio.wait(self.tasks)
+        fetched = [(key, regions, task.result()) for task, (key, regions) in self.tasks.items()]
+        results = collect_results(fetched)
+        # Off the loop: stats/alert files and brotli-11 + gzip serialization would stall every request
+        if self.finish:
+            await asyncio.to_thread(finish_results, results, self.started, wanted=self.wanted)
+        if self.publish:
+            await asyncio.to_thread(snapshot_store.publish, results)
+        return results
+
+    async def wait(self, deadline=None):
+        """The full results, or partial ones (see collect_results) if `deadline` seconds pass first"""
+        done, _ = await asyncio.wait({self.task}, timeout=deadline)
+        if done:
+            return self.task.result()
+        fetched, late = [], []
+        for task, (key, regions) in self.tasks.items():
+            if task.done():
+                fetched.append((key, regions, task.result()))
+            else:
+                late.append((key, regions))
+        return collect_results(fetched, late, self.wanted)
+
+
+async def fetch_all_internal_async(deadline=None, publish=False):
+    """Fetch every source and region page concurrently and add the calculations (partial past `deadline`)"""
+    return await AsyncFetchRound(publish).wait(deadline)
+
+
+async def current_snapshot(force=False, deadline=None):
+    """
+    Latest snapshot, scraping once (single-flight) when it is older than SNAPSHOT_MAX_AGE
+
+    Raises DeadlineExceeded with the partial results if the scrape misses `deadline`.
+    """
+    global refresh_round
+    snapshot = snapshot_store.current()
+    if not force and snapshot is not None and snapshot.age() <= SNAPSHOT_MAX_AGE:
+        CACHE_REQUESTS.inc(cache='snapshot', result='hit')
+        return snapshot
+
+    started = refresh_round is None or refresh_round.task.done()
+    if started:
+        refresh_round = AsyncFetchRound(publish=True)
+    CACHE_REQUESTS.inc(cache='snapshot', result='miss' if started else 'hit')
+
+    results = await refresh_round.wait(deadline)
+    if results.get('partial'):
+        raise DeadlineExceeded(results)
+    return snapshot_store.current()
+
+
+async def selection_results(keys, fields, force=False, deadline=None):
+    """Scrape just the pages a selection needs, one shared round per page set (see the Flask app)"""
+    snapshot = snapshot_store.current()
+    version = snapshot.version if snapshot is not None else 0
+    if stats_only(fields):
+        return selection_payload(empty_results(), keys, fields, version)
+    pages = selection_pages(keys, fields)
+    round_key = (frozenset(pages), force)
+    fetch_round = selection_rounds.get(round_key)
+    if fetch_round is None or fetch_round.task.done():
+        fetch_round = selection_rounds[round_key] = AsyncFetchRound(
+            pages=pages, max_age=None if force else SNAPSHOT_MAX_AGE, wanted=no_calculations, finish=False)
+    return selection_payload(await fetch_round.wait(deadline), keys, fields, version)
+
+
+def snapshot_response(request, snapshot):
+    """Serve a snapshot's pre-built bytes, answering 304 when the client's ETag is current"""
+    coding, body, etag = snapshot.negotiate(request.headers.get('accept-encoding', ''))
+    headers = {
+        'ETag': f'"{etag}"',
+        'Vary': 'Accept-Encoding',
+        'Cache-Control': 'no-cache'
+    }
+
+    if snapshot.matches(request.headers.get('if-none-match')):
+        CACHE_REQUESTS.inc(cache='etag', result='hit')
+        return Response(status_code=304, headers=headers)
+    CACHE_REQUESTS.inc(cache='etag', result='miss')
+
+    if coding != 'identity':
+        headers['Content-Encoding'] = coding
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def selection_response(request, snapshot, keys, fields):
+    """A snapshot cut down by ?sources= / ?fields= (see the Flask app)"""
+    etag = selection_etag(snapshot, keys, fields)
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if etag_matches(request.headers.get('if-none-match'), (etag,)):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(select_payload(snapshot.payload, keys, fields), headers=headers)
+
+
+def error_response(error, status_code=500):
+    return JSONResponse({'success': False, 'error': error, 'provider': 'KaratMate Labs'}, status_code=status_code)
+
+
+async def fetch_source_route(request, key):
+    source = SOURCES[key]
+    region = request.query_params.get('region')
+    if region is not None and region not in source.get('regions', {}):
+        return error_response(f"Unknown region '{region}'", 400)
+    start = time.perf_counter()
+
+    try:
+        entry = await fetch_source_async(key, region=region)
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        if entry:
+            log.info(f"{source['name']}: success", extra={
+                'source': key, 'duration_ms': duration_ms, 'outcome': 'success', 'prices': entry['prices']})
+            return JSONResponse({
+                'success': True,
+                'source': source['name'],
+                'timestamp': datetime.now().isoformat(),
+                **entry,
+                'provider': 'KaratMate Labs'
+            })
+        log.warning(f"{source['name']}: no prices", extra={
+            'source': key, 'duration_ms': duration_ms, 'outcome': 'failure'})
+        return error_response('Could not fetch prices')
+
+    except Exception as e:
+        log.exception(f"{source['name']}: error", extra={
+            'source': key, 'duration_ms': round((time.perf_counter() - start) * 1000, 2), 'outcome': 'error'})
+        return error_response(str(e))
+
+
+async def fetch_sourcea(request):
+    """Fetch Source A (UAE) prices"""
+    return await fetch_source_route(request, 'sourcea')
+
+
+async def fetch_sourceb(request):
+    """Fetch Source B prices"""
+    return await fetch_source_route(request, 'sourceb')
+
+
+async def fetch_bhima(request):
+    """Fetch Bhima Jewellers prices (UAE)"""
+    return await fetch_source_route(request, 'bhima')
+
+
+async def fetch_all(request):
+    """Fetch prices from all sources (snapshot with ETag, compression, ?since= deltas and ?deadline_ms=)"""
+    since = request.query_params.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return error_response('since must be an integer snapshot version', 400)
+    try:
+        deadline = parse_deadline(request.query_params.get('deadline_ms'))
+        selection = parse_selection(request.query_params)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    force = request.query_params.get('refresh') == '1'
+
+    snapshot = snapshot_store.current()
+    fresh = snapshot is not None and snapshot.age() <= SNAPSHOT_MAX_AGE
+    if selection is not None and since is None and (force or not fresh):
+        # Scrape only what the selection needs rather than refreshing the whole snapshot
+        results = await selection_results(*selection, force=force, deadline=deadline)
+        return JSONResponse(results, headers={'Cache-Control': 'no-store'})
+
+    try:
+        snapshot = await current_snapshot(force=force, deadline=deadline)
+    except DeadlineExceeded as e:
+        return JSONResponse(e.results, headers={'Cache-Control': 'no-store'})
+    if since is not None:
+        snapshot = snapshot_store.delta_since(snapshot, since)
+    if selection is not None:
+        return selection_response(request, snapshot, *selection)
+    return snapshot_response(request, snapshot)
+
+
+async def send_email_report_async(data):
+    """Send the report email over async SMTP"""
+    import aiosmtplib
+
+    start = time.perf_counter()
+
+    try:
+        config = DEFAULT_EMAIL_CONFIG
+        msg = await asyncio.to_thread(build_email_message, data, config)
+        start = time.perf_counter()
+        try:
+            await aiosmtplib.send(
+                msg,
+                hostname=config['smtp_server'],
+                port=config['smtp_port'],
+                start_tls=True,
+                username=config['sender_email'],
+                password=config['app_password']
+            )
+        except Exception:
+            SMTP_SEND_SECONDS.observe(time.perf_counter() - start, outcome='failure')
+            raise
+        SMTP_SEND_SECONDS.observe(time.perf_counter() - start, outcome='success')
+        log.info('email report sent', extra={
+            'recipient': config['recipient_email'], 'outcome': 'success',
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2)})
+        return True
+
+    except Exception as e:
+        log.error(f'email report failed: {e}', extra={
+            'outcome': 'failure', 'duration_ms': round((time.perf_counter() - start) * 1000, 2)})
+        return False
+
+
+async def fetch_and_email(request):
+    """Fetch prices and send email report (?deadline_ms= sends what was fetched by then)"""
+    try:
+        deadline = parse_deadline(request.query_params.get('deadline_ms'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    data = await fetch_all_internal_async(deadline, publish=True)
+
+    if data['success']:
+        email_sent = await send_email_report_async(data)
+        return JSONResponse({
+            'success': True,
+            'email_sent': email_sent,
+            'data': data,
+            'provider': 'KaratMate Labs'
+        })
+    return error_response('Failed to fetch prices')
+
+
+async def sources_health(request):
+    """Circuit breaker state, adaptive timeout and latency per source"""
+    return JSONResponse({'success': True, 'sources': source_guards.status(), 'provider': 'KaratMate Labs'})
+
+
+async def metrics(request):
+    """Prometheus metrics"""
+    return Response(REGISTRY.render(), headers={'Content-Type': CONTENT_TYPE})
+
+
+async def create_alert(request):
+    """Subscribe to a threshold: {"email", "metric", "direction": "below"|"above", "threshold"}"""
+    try:
+        body = await request.json()
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    try:
+        if body.get('metric') not in alert_metric_names():
+            raise AlertError(f"unknown metric '{body.get('metric')}', see GET /api/alerts/metrics")
+        alert = await asyncio.to_thread(alert_engine.add, body['metric'], body.get('direction'),
+                                        body.get('threshold'), body.get('email'))
+    except AlertError as e:
+        return error_response(str(e), 400)
+    return JSONResponse({'success': True, 'alert': alert, 'provider': 'KaratMate Labs'}, status_code=201)
+
+
+async def list_alerts(request):
+    """Alerts registered for ?email="""
+    email = request.query_params.get('email', '').strip().lower()
+    if not email:
+        return error_response('email is required', 400)
+    return JSONResponse({'success': True, 'alerts': alert_engine.alerts(email), 'provider': 'KaratMate Labs'})
+
+
+async def delete_alert(request):
+    """Unsubscribe one alert"""
+    if not await asyncio.to_thread(alert_engine.remove, request.path_params['alert_id']):
+        return error_response('No such alert', 404)
+    return JSONResponse({'success': True, 'provider': 'KaratMate Labs'})
+
+
+async def alert_metrics(request):
+    """Metric names alerts can be registered on"""
+    return JSONResponse({'success': True, 'metrics': alert_metric_names(), 'provider': 'KaratMate Labs'})
+
+
+async def history_export(request):
+    """Stream price history as CSV or NDJSON (same parameters as the Flask app)"""
+    try:
+        chunks, fmt, filename = history_export_stream(request.query_params)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    # A plain generator: Starlette pulls it in a worker thread, off the event loop
+    return StreamingResponse(chunks, media_type=FORMATS[fmt],
+                             headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+async def stats(request):
+    """Rolling trend statistics per source and karat"""
+    return JSONResponse({'success': True, 'stats': price_stats.summary(),
+                         'provider': 'KaratMate Labs'})
+
+
+async def fx(request):
+    """Cached AED/INR/USD conversion matrix"""
+    return JSONResponse({'success': True, 'rates': fx_rates.matrix(), 'fx': fx_rates.status(),
+                         'provider': 'KaratMate Labs'})
+
+
+async def health(request):
+    """Health check"""
+    return JSONResponse({
+        'status': 'healthy',
+        'provider': 'KaratMate Labs',
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+class RequestMetricsMiddleware:
+    """Record per-route request latency (ASGI counterpart of install_flask_metrics)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = {'code': 500}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            REQUEST_SECONDS.observe(time.perf_counter() - start, app='price_api_async', method=scope['method'],
+                                    route=getattr(route, 'path', 'unmatched'), status=str(status['code']))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global http_client, host_limiter
+    host_limiter = AsyncHostLimiter(limit=4)
+    # The first FX load may hit the network; do it off the loop before serving
+    await asyncio.to_thread(fx_rates.warm)
+    limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    async with httpx.AsyncClient(limits=limits, follow_redirects=True) as client:
+        http_client = client
+        yield
+
+
+app = Starlette(
+    routes=[
+        Route('/api/health', health, methods=['GET']),
+        Route('/api/fetch/sourcea', fetch_sourcea, methods=['GET']),
+        Route('/api/fetch/sourceb', fetch_sourceb, methods=['GET']),
+        Route('/api/fetch/bhima', fetch_bhima, methods=['GET']),
+        Route('/api/fetch/all', fetch_all, methods=['GET']),
+        Route('/api/fetch-and-email', fetch_and_email, methods=['POST']),
+        Route('/api/sources/health', sources_health, methods=['GET']),
+        Route('/api/alerts', create_alert, methods=['POST']),
+        Route('/api/alerts', list_alerts, methods=['GET']),
+        Route('/api/alerts/metrics', alert_metrics, methods=['GET']),
+        Route('/api/alerts/{alert_id:int}', delete_alert, methods=['DELETE']),
+        Route('/api/history/export', history_export, methods=['GET']),
+        Route('/api/stats', stats, methods=['GET']),
+        Route('/api/fx', fx, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET'])
+    ],
+    middleware=[Middleware(RequestMetricsMiddleware),
+                Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'],
+                           allow_headers=['*'], expose_headers=['ETag'])],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("\n" + "="*60)
+    print("  🏅 KaratMate Labs - Live Gold Price API (async)")
+    print("="*60)
+    print("  API Server running at: http://localhost:5002")
+    print("="*60 + "\n")
+
+    uvicorn.run(app, host='0.0.0.0', port=5002)
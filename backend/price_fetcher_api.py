@@ -5,17 +5,122 @@ Provides CORS-enabled endpoints for browser-based price fetching
 
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+import logging
 import requests
-from bs4 import BeautifulSoup
+import hashlib
 import re
+import threading
 import time
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 from datetime import datetime
+from snapshot_store import PriceSnapshot, SnapshotStore, content_digest, etag_matches
+from calculations import (
+    calculate_customs_duty, calculate_landed_cost, calculate_sovereign_india, calculate_sovereign_uae
+)
+from circuit_breaker import SourceGuards
+from hedging import hedged_call
+from concurrent.futures import Future, ThreadPoolExecutor
+from metrics import (
+    ALERT_EVALUATE_SECONDS, ALERTS_FIRED, CACHE_REQUESTS, CALCULATION_SECONDS, EMAIL_RENDER_SECONDS, FETCH_RESULTS, FETCH_SECONDS,
+    PARSE_SECONDS, SELECTOR_DEPTH, SMTP_SEND_SECONDS, install_flask_metrics
+)
+from profiling import phase, profile_allowed, record_dns, run_profiled
+from log_config import configure_logging, get_logger
+from fx_rates import fx_rates
+from http_cache import DEFAULT_DIRECTORY, DEFAULT_MAX_AGE, HttpCache, body_digest
+from host_limiter import HostLimiter
+from rolling_stats import DEFAULT_STATS_FILE, RollingStats
+from alert_engine import AlertEngine, AlertError, group_by_recipient
+from change_detection import SentReports, flatten_prices, format_digest_html
+from history_store import HistoryStore
+from history_export import FORMATS, export_chunks, export_filename, export_params, history_breakdown
+
+configure_logging()
+log = get_logger('price_api')
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag'])
+install_flask_metrics(app, 'price_api')
+
+# /api/fetch/all serves the last snapshot for this many seconds before scraping again
+SNAPSHOT_MAX_AGE = 60
+
+# Which sources each calculation block is derived from (prefix -> source keys)
+CALCULATION_DEPENDENCIES = {
+    'sourcea_': ('sourcea',),
+    'sourceb_': ('sourceb',),
+    'customs_': ('sourceb',),
+    'landed_': ('sourcea', 'sourceb')
+}
+
+
+# Weights of the sovereign, customs and landed-cost blocks
+SOVEREIGN_GRAMS = (8, 16, 20)
+
+
+def calculation_sources(key):
+    """Source keys a calculation block depends on"""
+    for prefix, sources in CALCULATION_DEPENDENCIES.items():
+        if key.startswith(prefix):
+            return sources
+    return ()
+
+
+# A new stats tick (a price move, or every MIN_TICK_INTERVAL while flat) also makes a new version
+snapshot_store = SnapshotStore(history=32, calculation_sources=calculation_sources,
+                               stats_ticks=lambda: price_stats.recorded)
+
+# Set by serve.py in worker processes: snapshots come from the shared refresher, not from scraping
+shared_snapshot = None
+
+
+def attach_shared_snapshot(path):
+    """Serve /api/fetch/all from the memory-mapped snapshot written by serve.py's refresher"""
+    global shared_snapshot
+    from shared_snapshot import SharedSnapshotFile
+    shared_snapshot = SharedSnapshotFile(path)
+
+
+class DeadlineExceeded(Exception):
+    """The snapshot was not ready by the caller's deadline; .results holds what was"""
+
+    def __init__(self, results):
+        super().__init__('deadline exceeded')
+        self.results = results
+
+
+# The scrape in progress for the snapshot, shared by every caller that finds it stale
+refresh_round = None
+refresh_round_lock = threading.Lock()
+
+
+def current_snapshot(force=False, deadline=None):
+    """
+    Latest snapshot: from shared memory under serve.py, otherwise scraped when stale
+    
+    Concurrent callers wait on one FetchRound. With a deadline (seconds) a scrape that
+    has not finished in time raises DeadlineExceeded carrying its partial results; the
+    snapshot is still published when the late pages land.
+    """
+    global refresh_round
+    if shared_snapshot is not None:
+        return shared_snapshot.sync(snapshot_store)
+    
+    snapshot = snapshot_store.current()
+    if not force and snapshot is not None and snapshot.age() <= SNAPSHOT_MAX_AGE:
+        CACHE_REQUESTS.inc(cache='snapshot', result='hit')
+        return snapshot
+    
+    with refresh_round_lock:
+        fetch_round = refresh_round
+        started = fetch_round is None or fetch_round.done.is_set()
+        if started:
+            fetch_round = refresh_round = FetchRound(publish=True)
+    CACHE_REQUESTS.inc(cache='snapshot', result='miss' if started else 'hit')
+    
+    results = fetch_round.wait(deadline)
+    if results.get('partial'):
+        raise DeadlineExceeded(results)
+    return snapshot_store.current()
 
 # Default email configuration (hardcoded for easy use)
 DEFAULT_EMAIL_CONFIG = {
@@ -23,9 +128,15 @@ DEFAULT_EMAIL_CONFIG = {
     'smtp_port': 587,
     'sender_email': 'fasin.absons@gmail.com',
     'app_password': 'zrxj vfjt wjos wkwy',
-    'recipient_email': 'faseen1532@gmail.com'
+    'recipient_email': 'faseen1532@gmail.com',
+    # Scheduled reports (send_changed_reports): addresses or
+    # {'email', 'min_change_pct', 'no_change': 'skip' | 'digest'}, see change_detection.py
+    'recipients': ['faseen1532@gmail.com']
 }
 
+# Prices of the last full report each recipient was sent
+sent_reports = SentReports()
+
 # Customs duty rates for red channel (males)
 # Source: Indian Customs regulations
 CUSTOMS_RED_CHANNEL_RATES = {
@@ -46,272 +157,569 @@ def extract_price(text):
     return None
 
 
-def calculate_sovereign_uae(price_per_gram, grams=8):
-    """
-    Calculate sovereign price for UAE
-    Formula: (price_per_gram * grams) + 8% making charges + 5% VAT
-    Note: 8% is average, can be higher
-    """
-    base_price = price_per_gram * grams
-    making_charges = base_price * 0.08  # 8% (average)
-    subtotal = base_price + making_charges
-    vat = base_price * 0.05  # 5%
-    total = subtotal + vat
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+
+def make_soup(html):
+    """BeautifulSoup for a page (bs4 is imported on the first parse, not at startup)"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
+
+def parse_sourcea(html):
+    """Parse Source A (UAE) gold rate modal - Multiple selectors for robustness"""
+    soup = make_soup(html)
     
-    return {
-        'base_price': round(base_price, 2),
-        'making_charges': round(making_charges, 2),
-        'subtotal': round(subtotal, 2),
-        'vat': round(vat, 2),
-        'total': round(total, 2),
-        'grams': grams
+    prices = {}
+    
+    # Multiple selector strategies for robustness
+    selectors = [
+        '#myModal table',  # Primary selector
+        '.gold-rate-attribute-list table',  # Alternate class
+        'div.modal-body table',  # Modal body table
+        'table tbody'  # Generic table
+    ]
+    
+    modal = None
+    for depth, selector in enumerate(selectors):
+        modal = soup.select_one(selector)
+        if modal:
+            SELECTOR_DEPTH.observe(depth, source='sourcea', karat='all')
+            log.debug('selector matched', extra={'source': 'sourcea', 'selector': selector, 'depth': depth})
+            break
+    
+    if modal:
+        debug = log.isEnabledFor(logging.DEBUG)
+        rows = modal.find_all('tr')
+        for idx, row in enumerate(rows):
+            cells = row.find_all('td')
+            if len(cells) >= 2:
+                karat = cells[0].text.strip().lower()
+                price_text = cells[1].text.strip()
+                price = extract_price(price_text)
+                
+                if price and karat:
+                    prices[karat] = price
+                
+                if debug:
+                    log.debug('table row', extra={'source': 'sourcea', 'row': idx + 1, 'karat': karat,
+                                                  'text': price_text, 'price': price})
+    
+    # Try CSS selectors as backup
+    if not prices:
+        SELECTOR_DEPTH.observe(len(selectors), source='sourcea', karat='all')
+        css_selectors = [
+            ('#myModal > div > div > div > div.modal-body > div > table > tbody > tr:nth-child(1) > td:nth-child(2)', '24k'),
+            ('#myModal > div > div > div > div.modal-body > div > table > tbody > tr:nth-child(2) > td:nth-child(2)', '22k'),
+            ('#myModal > div > div > div > div.modal-body > div > table > tbody > tr:nth-child(3) > td:nth-child(2)', '18k')
+        ]
+        
+        for selector, karat in css_selectors:
+            elem = soup.select_one(selector)
+            if elem:
+                price = extract_price(elem.text)
+                if price:
+                    prices[karat] = price
+    
+    return prices
+
+
+def parse_sourceb(html):
+    """Parse Source B (India) gold rate cards - Multiple selectors for robustness"""
+    soup = make_soup(html)
+    
+    prices = {}
+    
+    # Multiple selectors for 24K
+    selectors_24k = [
+        '.goldCard--one .goldCard--rate',  # Primary
+        '.goldCard.goldCard--one .goldCard--left p.goldCard--rate',  # Full path
+        '#maincontent > div.columns > div > div.goldRateWrapper > div.sectionBanner > div > div > div.goldCard__wrapper > div.goldCard.goldCard--one > div',  # CSS selector
+        'div.goldCard--one p'  # Generic
+    ]
+    
+    for depth, selector in enumerate(selectors_24k):
+        card_24k = soup.select_one(selector)
+        if card_24k:
+            price_text = card_24k.text.strip()
+            price = extract_price(price_text)
+            if price:
+                prices['24k'] = price
+                SELECTOR_DEPTH.observe(depth, source='sourceb', karat='24k')
+                log.debug('selector matched', extra={'source': 'sourceb', 'karat': '24k', 'selector': selector,
+                                                     'depth': depth, 'price': price})
+                break
+    
+    # Multiple selectors for 22K
+    selectors_22k = [
+        '.goldCard--two .goldCard--rate',  # Primary
+        '.goldCard.goldCard--two .goldCard--left p.goldCard--rate',  # Full path
+        '#maincontent > div.columns > div > div.goldRateWrapper > div.sectionBanner > div > div > div.goldCard__wrapper > div.goldCard.goldCard--two',  # CSS selector
+        'div.goldCard--two p'  # Generic
+    ]
+    
+    for depth, selector in enumerate(selectors_22k):
+        card_22k = soup.select_one(selector)
+        if card_22k:
+            price_text = card_22k.text.strip()
+            price = extract_price(price_text)
+            if price:
+                prices['22k'] = price
+                SELECTOR_DEPTH.observe(depth, source='sourceb', karat='22k')
+                log.debug('selector matched', extra={'source': 'sourceb', 'karat': '22k', 'selector': selector,
+                                                     'depth': depth, 'price': price})
+                break
+    
+    return prices
+
+
+def parse_bhima(html):
+    """Parse Bhima Jewellers (UAE) gold rates - Multiple strategies for robustness"""
+    soup = make_soup(html)
+    
+    prices = {}
+    
+    # Try multiple strategies to find prices
+    # Strategy 1: Look for price tables
+    tables = soup.find_all('table')
+    for table in tables:
+        rows = table.find_all('tr')
+        for row in rows:
+            cells = row.find_all(['td', 'th'])
+            if len(cells) >= 2:
+                karat_text = cells[0].text.strip().lower()
+                price_text = cells[1].text.strip()
+                
+                if '24' in karat_text:
+                    price = extract_price(price_text)
+                    if price and price > 200:  # Sanity check
+                        prices['24k'] = price
+                elif '22' in karat_text:
+                    price = extract_price(price_text)
+                    if price and price > 200:
+                        prices['22k'] = price
+                elif '18' in karat_text:
+                    price = extract_price(price_text)
+                    if price and price > 150:
+                        prices['18k'] = price
+    
+    SELECTOR_DEPTH.observe(0 if prices else 1, source='bhima', karat='all')
+    
+    # Strategy 2: Look for divs with price classes
+    if not prices:
+        price_divs = soup.find_all(['div', 'span', 'p'], class_=lambda x: x and ('price' in x.lower() or 'rate' in x.lower()))
+        for div in price_divs:
+            text = div.text.strip()
+            if '24' in text:
+                price = extract_price(text)
+                if price:
+                    prices['24k'] = price
+            elif '22' in text:
+                price = extract_price(text)
+                if price:
+                    prices['22k'] = price
+    
+    return prices
+
+
+# Scraped sources: display name, page URL, parser and the metadata stored with the prices.
+# 'alternates' lists other pages carrying the same rates (e.g. a regional mirror) as
+# {'url': ..., 'parse': ...}; slow requests are hedged to the first one, or to the same URL.
+# 'regions' maps a region to its page and location; 'url' is the default region's page.
+# Regions sharing a page (the UAE emirates all get the UAE rate) are fetched once. To cover
+# another city, add a region with its own page.
+INDIA_STATES = (
+    ('kerala', 'Kerala'), ('tamil-nadu', 'Tamil Nadu'), ('karnataka', 'Karnataka'),
+    ('maharashtra', 'Maharashtra'), ('delhi', 'Delhi'), ('telangana', 'Telangana'),
+    ('andhra-pradesh', 'Andhra Pradesh'), ('gujarat', 'Gujarat'), ('west-bengal', 'West Bengal')
+)
+
+SOURCES = {
+    'sourcea': {
+        'name': 'Source A (UAE)',
+        'url': 'https://eshop.joyalukkas.com/',
+        'parse': parse_sourcea,
+        'alternates': [],
+        'info': {'currency': 'AED', 'location': 'UAE'},
+        'default_region': 'dubai',
+        'regions': {
+            region: {'url': 'https://eshop.joyalukkas.com/', 'location': f'{city}, UAE'}
+            for region, city in (('dubai', 'Dubai'), ('abu-dhabi', 'Abu Dhabi'), ('sharjah', 'Sharjah'),
+                                 ('ajman', 'Ajman'))
+        }
+    },
+    'sourceb': {
+        'name': 'Source B',
+        'url': 'https://www.candere.com/gold-rate-today/kerala',
+        'parse': parse_sourceb,
+        'alternates': [],
+        'info': {'currency': 'INR', 'location': 'Kerala, India', 'unit': '10gm'},
+        'default_region': 'kerala',
+        'regions': {
+            region: {'url': f'https://www.candere.com/gold-rate-today/{region}', 'location': f'{state}, India'}
+            for region, state in INDIA_STATES
+        }
+    },
+    'bhima': {
+        'name': 'Bhima Jewellers',
+        'url': 'https://bhima.ae/gold-rates/',
+        'parse': parse_bhima,
+        'alternates': [],
+        'info': {'currency': 'AED', 'location': 'UAE'}
     }
+}
+
+# Sources included in /api/fetch/all and the email report
+ALL_SOURCES = ('sourcea', 'sourceb')
 
+# Regions fetched alongside them (stored under "regions"; the default region is always included)
+FETCH_REGIONS = {
+    'sourcea': ('dubai', 'abu-dhabi', 'sharjah'),
+    'sourceb': ('kerala', 'tamil-nadu', 'karnataka', 'maharashtra')
+}
 
-def calculate_sovereign_india(price_per_10gm, grams=8):
+
+def source_region(key, region=None):
+    """Resolve a region name (None = default) -> (region, page URL, location)"""
+    source = SOURCES[key]
+    regions = source.get('regions')
+    if not regions:
+        return None, source['url'], source['info'].get('location')
+    region = region or source['default_region']
+    if region not in regions:
+        raise KeyError(f"Unknown region '{region}' for {source['name']}")
+    return region, regions[region]['url'], regions[region]['location']
+
+
+def guard_key(key, region=None):
+    """Circuit breaker / metrics key: the source key for its default page, 'key/region' otherwise"""
+    _, url, _ = source_region(key, region)
+    return key if url == SOURCES[key]['url'] else f'{key}/{region}'
+
+
+def region_pages(regions=None, keys=None):
+    """
+    Distinct pages to fetch -> {(source key, url): [region, ...]}
+    
+    Every source in `keys` (default ALL_SOURCES) gets its default region plus those in
+    `regions` (default FETCH_REGIONS); regions served by the same page share one fetch.
     """
-    Calculate sovereign price for India
-    Formula: (price/10 * grams) + 12% making + 3% GST on making + 5% GST on total
+    regions = FETCH_REGIONS if regions is None else regions
+    pages = {}
+    for key in ALL_SOURCES if keys is None else keys:
+        default = SOURCES[key].get('default_region')
+        for region in dict.fromkeys((default,) + tuple(regions.get(key, ()))):
+            region, url, _ = source_region(key, region)
+            pages.setdefault((key, url), []).append(region)
+    return pages
+
+
+def add_region_entry(results, key, regions, entry):
+    """Store one fetched page under every region it serves (and under sources for the default)"""
+    for region in regions:
+        _, _, location = source_region(key, region)
+        region_entry = dict(entry, location=location)
+        if region is not None:
+            region_entry['region'] = region
+            results.setdefault('regions', {}).setdefault(key, {})[region] = region_entry
+        if region == SOURCES[key].get('default_region'):
+            results['sources'][key] = region_entry
+
+
+# Circuit breaker, adaptive timeout and last-known-good prices per source
+source_guards = SourceGuards(default_timeout=10, min_timeout=2, max_timeout=10,
+                             failure_threshold=3, reset_timeout=60)
+
+
+# Threads for hedged requests (a second request while the first is still in flight)
+hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='hedge')
+
+# Region pages are fetched concurrently, at most 4 at a time per site
+region_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='region')
+host_limiter = HostLimiter(limit=4)
+
+
+# Load the FX rates at startup, off the request path (until then calculations use the built-in ones)
+threading.Thread(target=fx_rates.warm, name='fx-warm', daemon=True).start()
+
+# Set by CLI runs (RUN_FETCH_EMAIL.py): pages and parse results persisted between processes
+http_cache = None
+
+
+def enable_http_cache(max_age=DEFAULT_MAX_AGE, directory=DEFAULT_DIRECTORY):
+    """Keep downloaded pages on disk so the next short-lived run can reuse them"""
+    global http_cache
+    http_cache = HttpCache(directory, max_age)
+
+
+# Trend statistics, fed by every fetch_all_internal(); kept in memory by the API servers
+price_stats = RollingStats()
+stats_file = None
+
+
+def enable_stats_file(path=DEFAULT_STATS_FILE):
+    """Carry the rolling statistics across short-lived runs (RUN_FETCH_EMAIL.py) in a file"""
+    global price_stats, stats_file
+    price_stats = RollingStats.load(path)
+    stats_file = path
+
+
+def record_stats(results):
+    """Feed this fetch's prices to price_stats and attach the current summary as "stats" """
+    if price_stats.update(results['sources']) and stats_file is not None:
+        price_stats.save(stats_file)
+    results['stats'] = price_stats.summary()
+
+
+# Price alerts, matched against every fetch; notification emails go out on their own threads
+alert_engine = AlertEngine()
+alert_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='alerts')
+
+ALERT_KARATS = ('24k', '22k', '18k')
+
+
+def alert_metric_names():
     """
-    price_per_gram = price_per_10gm / 10
-    base_price = price_per_gram * grams
+    Metrics alerts can watch
     
-    making_charges = base_price * 0.12  # 12% making charges (minimum)
-    making_gst = making_charges * 0.03  # 3% GST on making
-    subtotal = base_price + making_charges + making_gst
-    gst = base_price * 0.05  # 5% GST on total
-    total = subtotal + gst
+    '<source>.<region>.<karat>' for every fetched region page ('<source>.<karat>' for
+    sources without regions) and 'spread.<karat>': India over UAE price in percent.
+    """
+    names = ['spread.24k', 'spread.22k']
+    for (key, _), regions in region_pages().items():
+        for region in regions:
+            prefix = f'{key}.{region}' if region is not None else key
+            names.extend(f'{prefix}.{karat}' for karat in ALERT_KARATS)
+    return names
+
+
+def alert_metrics(results):
+    """{metric: value} for this fetch (stale last-known-good entries are left out)"""
+    values = {}
+    for key, entries in results.get('regions', {}).items():
+        for region, entry in entries.items():
+            if not entry.get('stale'):
+                values.update((f'{key}.{region}.{karat}', price) for karat, price in entry['prices'].items())
+    for key, entry in results['sources'].items():
+        if 'region' not in entry and not entry.get('stale'):
+            values.update((f'{key}.{karat}', price) for karat, price in entry['prices'].items())
     
-    return {
-        'base_price': round(base_price, 2),
-        'making_charges': round(making_charges, 2),
-        'making_gst': round(making_gst, 2),
-        'subtotal': round(subtotal, 2),
-        'gst': round(gst, 2),
-        'total': round(total, 2),
-        'grams': grams
-    }
+    uae = results['sources'].get('sourcea', {}).get('prices', {})
+    india = results['sources'].get('sourceb', {}).get('prices', {})
+    if uae and india:
+        aed_to_inr = fx_rates.rate('AED', 'INR')
+        for karat in ('24k', '22k'):
+            if uae.get(karat) and india.get(karat):
+                uae_inr = uae[karat] * aed_to_inr
+                values[f'spread.{karat}'] = round((india[karat] / 10 - uae_inr) / uae_inr * 100, 3)
+    return values
 
 
-def calculate_customs_duty(base_price_inr, grams, channel='red'):
+def process_alerts(results):
+    """Match this fetch against the alert index and queue one email per recipient with crossings"""
+    with ALERT_EVALUATE_SECONDS.time():
+        crossings = alert_engine.evaluate(alert_metrics(results))
+    for crossing in crossings:
+        ALERTS_FIRED.inc(direction=crossing['direction'])
+    for email, fired in group_by_recipient(crossings).items():
+        alert_executor.submit(send_alert_email, email, fired)
+    if crossings:
+        log.info('price alerts fired', extra={'alerts': len(crossings)})
+    return crossings
+
+
+def download_and_parse(key, url, parse, timeout, cancelled, timings=None, upstream=None):
     """
-    Calculate customs duty when bringing gold from UAE to India
-    
-    Args:
-        base_price_inr: Base gold value in INR (without making/GST)
-        grams: Weight in grams
-        channel: 'red' (6%) or 'green' (33%)
+    GET a page and parse its prices; stops reading early once `cancelled` is set
     
-    Rules:
-    - Red Channel: 6%
-    - Green Channel: 33%
-    - ₹50,000 exemption
+    With a `timings` dict (?debug=timing) the dns, queued (waiting for a per-host
+    slot), headers (connect + TLS + server wait), download and parse phases are
+    recorded into it. With the on-disk
+    http_cache enabled, fresh pages skip the network and the parser, and stale
+    ones are revalidated. The seconds the request itself took (headers and body,
+    not the wait for a host slot) are appended to the `upstream` list.
     """
-    exemption = 50000
+    parser = parse.__name__
+    cached = http_cache.get(url) if http_cache is not None else None
+    cached_prices = http_cache.parsed(cached, parser) if cached is not None else None
+    if cached_prices and http_cache.is_fresh(cached):
+        CACHE_REQUESTS.inc(cache='http_disk', result='hit')
+        if timings is not None:
+            timings['cache'] = 'fresh'
+        return cached_prices
     
-    if base_price_inr <= exemption:
-        return {
-            'gold_value': base_price_inr,
-            'exemption': exemption,
-            'taxable_amount': 0,
-            'customs_duty': 0,
-            'gst_on_duty': 0,
-            'total_with_gst': 0,
-            'total_without_gst': 0,
-            'channel': channel.upper(),
-            'grams': grams,
-            'duty_rate': '0%'
-        }
+    headers = REQUEST_HEADERS
+    if cached_prices:
+        headers = dict(REQUEST_HEADERS, **http_cache.validators(cached))
+    
+    record_dns(timings, url)
+    with phase(timings, 'queued'):
+        slot = host_limiter.acquire(url)
+    start = time.perf_counter()
+    try:
+        with phase(timings, 'headers'):
+            response = requests.get(url, headers=headers, timeout=timeout, stream=True)
+        with response:
+            if response.status_code == 304 and cached_prices:
+                http_cache.touch(cached)
+                CACHE_REQUESTS.inc(cache='http_disk', result='revalidated')
+                if timings is not None:
+                    timings['cache'] = 'revalidated'
+                return cached_prices
+            if response.status_code != 200 or cancelled.is_set():
+                return None
+            
+            with phase(timings, 'download'):
+                chunks = []
+                for chunk in response.iter_content(chunk_size=16384):
+                    if cancelled.is_set():
+                        return None
+                    chunks.append(chunk)
+                html = b''.join(chunks).decode(response.encoding or 'utf-8', errors='replace')
+    finally:
+        slot.release()
+        if upstream is not None:
+            upstream.append(time.perf_counter() - start)
+    FETCH_SECONDS.observe(time.perf_counter() - start, source=key)
     
-    taxable_amount = base_price_inr - exemption
+    if http_cache is None:
+        with PARSE_SECONDS.time(source=key), phase(timings, 'parse'):
+            return parse(html) or None
     
-    # Calculate duty based on channel
-    if channel.lower() == 'red':
-        customs_rate = 0.06  # 6% for red channel
-        rate_display = '6%'
+    # Unchanged page from a server without validators: no need to parse it again
+    if cached_prices and cached['digest'] == body_digest(html):
+        prices = cached_prices
+        CACHE_REQUESTS.inc(cache='http_disk', result='unchanged')
     else:
-        customs_rate = 0.33  # 33% for green channel
-        rate_display = '33%'
+        with PARSE_SECONDS.time(source=key), phase(timings, 'parse'):
+            prices = parse(html) or None
+        CACHE_REQUESTS.inc(cache='http_disk', result='miss')
+    if prices:
+        http_cache.put(url, html, prices, parser, etag=response.headers.get('ETag'),
+                       last_modified=response.headers.get('Last-Modified'))
+    return prices
+
+
+def fetch_source(key, timeout=10, timings=None, region=None, profile=None, upstream=None):
+    """
+    Download and parse one source (region) -> {'prices': ..., currency/location...} or None
     
-    customs_duty = taxable_amount * customs_rate
+    profile: a ProfileSession (?profile=1) that also covers the hedge threads.
+    upstream: list collecting each attempt's request time (see download_and_parse)
+    """
+    source = SOURCES[key]
+    region, url, location = source_region(key, region)
+    # Alternates mirror the default page; other regions hedge to their own URL
+    alternates = (source.get('alternates') if url == source['url'] else None) or [{'url': url}]
+    hedge_target = alternates[0]
+    hedge_timings = timings.setdefault('hedge', {}) if timings is not None else None
     
-    # Round up to nearest 50
-    import math
-    customs_duty_rounded = math.ceil(customs_duty / 50) * 50
+    def primary(cancelled):
+        return download_and_parse(key, url, source['parse'], timeout, cancelled, timings, upstream)
     
-    # GST is optional (5% of customs duty)
-    gst_on_duty = customs_duty_rounded * 0.05
-    gst_rounded = math.ceil(gst_on_duty / 50) * 50
+    def hedge(cancelled):
+        parse = hedge_target.get('parse', source['parse'])
+        return download_and_parse(key, hedge_target['url'], parse, timeout, cancelled, hedge_timings, upstream)
     
-    return {
-        'gold_value': round(base_price_inr, 2),
-        'exemption': exemption,
-        'taxable_amount': round(taxable_amount, 2),
-        'customs_duty': customs_duty_rounded,
-        'gst_on_duty': gst_rounded,
-        'total_with_gst': customs_duty_rounded + gst_rounded,
-        'total_without_gst': customs_duty_rounded,
-        'channel': channel.upper(),
-        'duty_rate': rate_display,
-        'grams': grams
-    }
+    if profile is not None:
+        primary, hedge = profile.wrap(primary), profile.wrap(hedge)
+    guard = source_guards.get(guard_key(key, region))
+    prices = hedged_call(primary, hedge, guard.hedge_delay(), hedge_executor, guard.hedge)
+    if hedge_timings == {}:
+        del timings['hedge']
+    if prices:
+        entry = dict({'prices': prices}, **source['info'])
+        if region is not None:
+            entry.update(location=location, region=region)
+        return entry
+    return None
 
 
-@app.route('/api/fetch/sourcea', methods=['GET'])
-def fetch_sourcea():
-    """Fetch Source A (UAE) prices via server (bypasses CORS) - Multiple selectors for robustness"""
-    print("\n📊 [KaratMate Labs] Fetching Source A (UAE) prices...")
+def fetch_source_guarded(key, timings=None, region=None, profile=None):
+    """
+    fetch_source() behind the source's (region page's) circuit breaker
     
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get('https://eshop.joyalukkas.com/', headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            prices = {}
-            
-            # Multiple selector strategies for robustness
-            selectors = [
-                '#myModal table',  # Primary selector
-                '.gold-rate-attribute-list table',  # Alternate class
-                'div.modal-body table',  # Modal body table
-                'table tbody'  # Generic table
-            ]
-            
-            modal = None
-            for selector in selectors:
-                modal = soup.select_one(selector)
-                if modal:
-                    print(f"   ✅ Found table using selector: {selector}")
-                    break
-            
-            if modal:
-                rows = modal.find_all('tr')
-                for idx, row in enumerate(rows):
-                    cells = row.find_all('td')
-                    if len(cells) >= 2:
-                        karat = cells[0].text.strip().lower()
-                        price_text = cells[1].text.strip()
-                        price = extract_price(price_text)
-                        
-                        if price and karat:
-                            prices[karat] = price
-                        
-                        print(f"   Row {idx+1}: {karat} = {price_text} -> {price}")
-            
-            # Try CSS selectors as backup
-            if not prices:
-                css_selectors = [
-                    ('#myModal > div > div > div > div.modal-body > div > table > tbody > tr:nth-child(1) > td:nth-child(2)', '24k'),
-                    ('#myModal > div > div > div > div.modal-body > div > table > tbody > tr:nth-child(2) > td:nth-child(2)', '22k'),
-                    ('#myModal > div > div > div > div.modal-body > div > table > tbody > tr:nth-child(3) > td:nth-child(2)', '18k')
-                ]
-                
-                for selector, karat in css_selectors:
-                    elem = soup.select_one(selector)
-                    if elem:
-                        price = extract_price(elem.text)
-                        if price:
-                            prices[karat] = price
-            
-            if prices:
-                result = {
-                    'success': True,
-                    'source': 'Source A (UAE)',
-                    'timestamp': datetime.now().isoformat(),
-                    'prices': prices,
-                    'currency': 'AED',
-                    'location': 'UAE',
-                    'provider': 'KaratMate Labs'
-                }
-                print(f"   ✅ [KaratMate Labs] Source A (UAE): {prices}")
-                return jsonify(result)
-        
-        return jsonify({
-            'success': False,
-            'error': 'Could not fetch prices',
-            'provider': 'KaratMate Labs'
-        }), 500
+    Skips the call while the breaker is open and falls back to the last-known-good
+    entry (flagged 'stale') whenever fresh prices are unavailable. The latency
+    recorded for the adaptive timeout and hedge delay is the fastest finished
+    request, without the time spent waiting for a host slot or a hedge.
+    """
+    guarded = guard_key(key, region)
+    guard = source_guards.get(guarded)
+    name = SOURCES[key]['name'] if guarded == key else f"{SOURCES[key]['name']} [{region}]"
+    
+    def outcome(result, elapsed=None, **fields):
+        FETCH_RESULTS.inc(source=guarded, outcome=result)
+        if timings is not None:
+            timings['outcome'] = result
+        duration_ms = round(elapsed * 1000, 2) if elapsed is not None else None
+        level = logging.INFO if result == 'success' else logging.WARNING
+        log.log(level, f'{name}: {result}', extra=dict(
+            {'source': guarded, 'duration_ms': duration_ms, 'outcome': result}, **fields))
     
+    if not guard.breaker.allow():
+        outcome('circuit_open')
+        return guard.stale_entry()
+    
+    start = time.perf_counter()
+    error = None
+    upstream = []
+    try:
+        entry = fetch_source(key, timeout=guard.timeout(), timings=timings, region=region, profile=profile,
+                             upstream=upstream)
     except Exception as e:
-        print(f"   ❌ [KaratMate Labs] Error: {e}")
+        error = str(e)
+        entry = None
+    elapsed = time.perf_counter() - start
+    if timings is not None:
+        timings['total_ms'] = round(elapsed * 1000, 2)
+    # None when no request went out (fresh on-disk cache): nothing to learn about the source's latency
+    latency = min(upstream) if upstream else None
+    
+    if entry:
+        guard.record_success(entry, latency)
+        outcome('success', elapsed, prices=entry['prices'])
+        return entry
+    
+    guard.record_failure(latency)
+    stale = guard.stale_entry()
+    outcome('stale' if stale else 'failure', elapsed, error=error)
+    return stale
+
+
+def fetch_source_response(key):
+    """Route body shared by the per-source endpoints (?region=<name> for another region's page)"""
+    source = SOURCES[key]
+    region = request.args.get('region')
+    if region is not None and region not in source.get('regions', {}):
         return jsonify({
             'success': False,
-            'error': str(e),
+            'error': f"Unknown region '{region}'",
+            'regions': sorted(source.get('regions', {})),
             'provider': 'KaratMate Labs'
-        }), 500
-
-
-@app.route('/api/fetch/sourceb', methods=['GET'])
-def fetch_sourceb():
-    """Fetch Source B prices via server (bypasses CORS) - Multiple selectors for robustness"""
-    print("\n📊 [KaratMate Labs] Fetching Source B prices...")
+        }), 400
+    start = time.perf_counter()
     
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get('https://www.candere.com/gold-rate-today/kerala', 
-                               headers=headers, timeout=10)
+        entry = fetch_source(key, region=region)
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
         
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            prices = {}
-            
-            # Multiple selectors for 24K
-            selectors_24k = [
-                '.goldCard--one .goldCard--rate',  # Primary
-                '.goldCard.goldCard--one .goldCard--left p.goldCard--rate',  # Full path
-                '#maincontent > div.columns > div > div.goldRateWrapper > div.sectionBanner > div > div > div.goldCard__wrapper > div.goldCard.goldCard--one > div',  # CSS selector
-                'div.goldCard--one p'  # Generic
-            ]
-            
-            for selector in selectors_24k:
-                card_24k = soup.select_one(selector)
-                if card_24k:
-                    price_text = card_24k.text.strip()
-                    price = extract_price(price_text)
-                    if price:
-                        prices['24k'] = price
-                        print(f"   ✅ 24K found using: {selector} = {price}")
-                        break
-            
-            # Multiple selectors for 22K
-            selectors_22k = [
-                '.goldCard--two .goldCard--rate',  # Primary
-                '.goldCard.goldCard--two .goldCard--left p.goldCard--rate',  # Full path
-                '#maincontent > div.columns > div > div.goldRateWrapper > div.sectionBanner > div > div > div.goldCard__wrapper > div.goldCard.goldCard--two',  # CSS selector
-                'div.goldCard--two p'  # Generic
-            ]
-            
-            for selector in selectors_22k:
-                card_22k = soup.select_one(selector)
-                if card_22k:
-                    price_text = card_22k.text.strip()
-                    price = extract_price(price_text)
-                    if price:
-                        prices['22k'] = price
-                        print(f"   ✅ 22K found using: {selector} = {price}")
-                        break
-            
-            if prices:
-                result = {
-                    'success': True,
-                    'source': 'Source B',
-                    'timestamp': datetime.now().isoformat(),
-                    'prices': prices,
-                    'currency': 'INR',
-                    'location': 'Kerala, India',
-                    'unit': '10gm',
-                    'provider': 'KaratMate Labs'
-                }
-                print(f"   ✅ [KaratMate Labs] Source B: {prices}")
-                return jsonify(result)
+        if entry:
+            result = {
+                'success': True,
+                'source': source['name'],
+                'timestamp': datetime.now().isoformat(),
+                **entry,
+                'provider': 'KaratMate Labs'
+            }
+            log.info(f"{source['name']}: success", extra={
+                'source': key, 'duration_ms': duration_ms, 'outcome': 'success', 'prices': entry['prices']})
+            return jsonify(result)
         
+        log.warning(f"{source['name']}: no prices", extra={
+            'source': key, 'duration_ms': duration_ms, 'outcome': 'failure'})
         return jsonify({
             'success': False,
             'error': 'Could not fetch prices',
@@ -319,7 +727,8 @@ def fetch_sourceb():
         }), 500
     
     except Exception as e:
-        print(f"   ❌ [KaratMate Labs] Error: {e}")
+        log.exception(f"{source['name']}: error", extra={
+            'source': key, 'duration_ms': round((time.perf_counter() - start) * 1000, 2), 'outcome': 'error'})
         return jsonify({
             'success': False,
             'error': str(e),
@@ -327,126 +736,311 @@ def fetch_sourceb():
         }), 500
 
 
+@app.route('/api/fetch/sourcea', methods=['GET'])
+def fetch_sourcea():
+    """Fetch Source A (UAE) prices via server (bypasses CORS)"""
+    return fetch_source_response('sourcea')
+
+
+@app.route('/api/fetch/sourceb', methods=['GET'])
+def fetch_sourceb():
+    """Fetch Source B prices via server (bypasses CORS)"""
+    return fetch_source_response('sourceb')
+
+
 @app.route('/api/fetch/bhima', methods=['GET'])
 def fetch_bhima():
-    """Fetch Bhima Jewellers prices (UAE) - Multiple selectors for robustness"""
-    print("\n📊 [KaratMate Labs] Fetching Bhima prices...")
+    """Fetch Bhima Jewellers prices (UAE)"""
+    return fetch_source_response('bhima')
+
+
+@app.route('/api/fetch/all', methods=['GET'])
+def fetch_all():
+    """
+    Fetch prices from all sources (pre-serialized snapshot with ETag + compression)
     
+    ?since=<version> returns only the sources that changed after that version and the
+    calculations depending on them ("full": false), or the whole snapshot ("full": true)
+    when the version is too old to diff against.
+    
+    ?deadline_ms=<n> bounds the wait when the snapshot has to be scraped: sources not
+    fetched by then come back as their last-known prices ("stale": true) or are listed
+    under "pending", in an uncached response marked "partial": true.
+    
+    ?debug=timing and ?profile=1 bypass the snapshot and scrape afresh; see fetch_all_debug().
+    """
+    if request.args.get('debug') == 'timing' or request.args.get('profile') == '1':
+        return fetch_all_debug()
+    
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'since must be an integer snapshot version',
+                'provider': 'KaratMate Labs'
+            }), 400
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        response = requests.get('https://bhima.ae/gold-rates/', headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            prices = {}
-            
-            # Try multiple strategies to find prices
-            # Strategy 1: Look for price tables
-            tables = soup.find_all('table')
-            for table in tables:
-                rows = table.find_all('tr')
-                for row in rows:
-                    cells = row.find_all(['td', 'th'])
-                    if len(cells) >= 2:
-                        karat_text = cells[0].text.strip().lower()
-                        price_text = cells[1].text.strip()
-                        
-                        if '24' in karat_text:
-                            price = extract_price(price_text)
-                            if price and price > 200:  # Sanity check
-                                prices['24k'] = price
-                        elif '22' in karat_text:
-                            price = extract_price(price_text)
-                            if price and price > 200:
-                                prices['22k'] = price
-                        elif '18' in karat_text:
-                            price = extract_price(price_text)
-                            if price and price > 150:
-                                prices['18k'] = price
-            
-            # Strategy 2: Look for divs with price classes
-            if not prices:
-                price_divs = soup.find_all(['div', 'span', 'p'], class_=lambda x: x and ('price' in x.lower() or 'rate' in x.lower()))
-                for div in price_divs:
-                    text = div.text.strip()
-                    if '24' in text:
-                        price = extract_price(text)
-                        if price:
-                            prices['24k'] = price
-                    elif '22' in text:
-                        price = extract_price(text)
-                        if price:
-                            prices['22k'] = price
-            
-            if prices:
-                result = {
-                    'success': True,
-                    'source': 'Bhima Jewellers',
-                    'timestamp': datetime.now().isoformat(),
-                    'prices': prices,
-                    'currency': 'AED',
-                    'location': 'UAE',
-                    'provider': 'KaratMate Labs'
-                }
-                print(f"   ✅ [KaratMate Labs] Bhima: {prices}")
-                return jsonify(result)
-        
+        deadline = parse_deadline(request.args.get('deadline_ms'))
+        selection = parse_selection(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'provider': 'KaratMate Labs'}), 400
+    force = request.args.get('refresh') == '1'
+    
+    if selection is not None and since is None and (force or not snapshot_is_fresh()):
+        # Scrape only what the selection needs rather than refreshing the whole snapshot
+        return partial_response(selection_results(*selection, force=force, deadline=deadline))
+    
+    try:
+        snapshot = current_snapshot(force=force, deadline=deadline)
+    except DeadlineExceeded as e:
+        return partial_response(e.results)
+    if snapshot is None:
         return jsonify({
             'success': False,
-            'error': 'Could not fetch prices',
+            'error': 'Prices not fetched yet, retry shortly',
             'provider': 'KaratMate Labs'
-        }), 500
+        }), 503
+    if since is not None:
+        snapshot = snapshot_store.delta_since(snapshot, since)
+    if selection is not None:
+        return selection_response(snapshot, *selection)
+    return snapshot_response(snapshot)
+
+
+def fetch_all_debug():
+    """
+    Uncached /api/fetch/all with diagnostics attached to the JSON
     
-    except Exception as e:
-        print(f"   ❌ [KaratMate Labs] Error: {e}")
+    ?debug=timing adds "timing": per-source dns/headers/download/parse phases plus
+    calculation and serialization time. ?profile=1 runs the request under cProfile,
+    the scraping worker threads included, and adds "profile": the hot functions; it needs KARATMATE_PROFILE_TOKEN set on
+    the server and the same value in the X-Profile-Token header.
+    """
+    profile = request.args.get('profile') == '1'
+    if profile and not profile_allowed(request.headers.get('X-Profile-Token')):
         return jsonify({
             'success': False,
-            'error': str(e),
+            'error': 'Profiling is disabled or the X-Profile-Token header is wrong',
             'provider': 'KaratMate Labs'
-        }), 500
+        }), 403
+    
+    timings = {} if request.args.get('debug') == 'timing' else None
+    if profile:
+        payload, hot = run_profiled(fetch_all_timed, timings, top=request.args.get('top', 25, type=int))
+        payload['profile'] = hot
+    else:
+        payload = fetch_all_timed(timings)
+    
+    if timings is not None:
+        payload['timing'] = timings
+    return jsonify(payload)
 
 
-@app.route('/api/fetch/all', methods=['GET'])
-def fetch_all():
-    """Fetch prices from all sources"""
-    print("\n📊 [KaratMate Labs] Fetching all prices...")
-    return jsonify(fetch_all_internal())
+def fetch_all_timed(timings=None, profile=None):
+    """fetch_all_internal() plus the cost of serializing the result as a snapshot"""
+    start = time.perf_counter()
+    payload = fetch_all_internal(timings, profile=profile)
+    with phase(timings, 'serialize'):
+        PriceSnapshot(payload, version=0, digest=content_digest(payload))
+    if timings is not None:
+        timings['total_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return payload
+
+
+def selection_response(snapshot, keys, fields):
+    """A snapshot cut down by ?sources= / ?fields=, with an ETag derived from the snapshot's"""
+    etag = selection_etag(snapshot, keys, fields)
+    if etag_matches(request.headers.get('If-None-Match'), (etag,)):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(select_payload(snapshot.payload, keys, fields))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def partial_response(results):
+    """Deadline-bound or selection results that are not a snapshot: plain JSON, never cached"""
+    response = jsonify(results)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def snapshot_response(snapshot):
+    """Serve a snapshot's pre-built bytes, answering 304 when the client's ETag is current"""
+    coding, body, etag = snapshot.negotiate(request.headers.get('Accept-Encoding', ''))
+    
+    if snapshot.matches(request.headers.get('If-None-Match')):
+        CACHE_REQUESTS.inc(cache='etag', result='hit')
+        response = app.response_class(status=304)
+    else:
+        CACHE_REQUESTS.inc(cache='etag', result='miss')
+        response = app.response_class(body, mimetype='application/json')
+        if coding != 'identity':
+            response.headers['Content-Encoding'] = coding
+    
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def build_email_message(data, config=DEFAULT_EMAIL_CONFIG, html=None):
+    """Build the HTML report email (shared by the Flask and async APIs); pass html to reuse a rendering"""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f"🏅 KaratMate Labs - Gold Price Report {datetime.now().strftime('%d %b %Y, %I:%M %p')}"
+    msg['From'] = config['sender_email']
+    msg['To'] = config['recipient_email']
+    
+    # Create HTML email
+    if html is None:
+        with EMAIL_RENDER_SECONDS.time():
+            html = generate_email_html(data)
+    msg.attach(MIMEText(html, 'html'))
+    return msg
+
+
+def build_digest_message(plan, config=DEFAULT_EMAIL_CONFIG):
+    """Compact "no significant change" email for one recipient's plan (see change_detection.py)"""
+    from email.mime.text import MIMEText
+    
+    msg = MIMEText(format_digest_html(plan, {key: source['name'] for key, source in SOURCES.items()}), 'html')
+    msg['Subject'] = f"🏅 KaratMate Labs - No significant change {datetime.now().strftime('%d %b %Y')}"
+    msg['From'] = config['sender_email']
+    msg['To'] = plan['email']
+    return msg
 
 
 def send_email_report(data):
     """Send email with gold price report and calculations"""
-    print("\n📧 Sending email report...")
+    start = time.perf_counter()
     
     try:
         # Use default config
         config = DEFAULT_EMAIL_CONFIG
-        
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"🏅 KaratMate Labs - Gold Price Report {datetime.now().strftime('%d %b %Y, %I:%M %p')}"
-        msg['From'] = config['sender_email']
-        msg['To'] = config['recipient_email']
-        
-        # Create HTML email
-        html = generate_email_html(data)
-        msg.attach(MIMEText(html, 'html'))
+        msg = build_email_message(data, config)
         
         # Send email
-        with smtplib.SMTP(config['smtp_server'], config['smtp_port']) as server:
-            server.starttls()
-            server.login(config['sender_email'], config['app_password'])
-            server.send_message(msg)
+        send_smtp(config, msg)
         
-        print(f"   ✅ Email sent to {config['recipient_email']}")
+        log.info('email report sent', extra={
+            'recipient': config['recipient_email'], 'outcome': 'success',
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2)})
         return True
     
     except Exception as e:
-        print(f"   ❌ Error sending email: {e}")
+        log.error(f'email report failed: {e}', extra={
+            'outcome': 'failure', 'duration_ms': round((time.perf_counter() - start) * 1000, 2)})
         return False
 
 
+def send_changed_reports(data, force=False, config=DEFAULT_EMAIL_CONFIG):
+    """
+    Scheduled-run counterpart of send_email_report()
+    
+    Only recipients whose prices moved past their threshold since their last full
+    report get it again; the others get a digest or nothing. The report HTML is
+    rendered once for all of them. Returns {email: 'full' | 'digest' | 'skip' | 'failed'}.
+    """
+    prices = flatten_prices(data['sources'])
+    plans = sent_reports.plan(config.get('recipients') or [config['recipient_email']], prices, force)
+    
+    html = None
+    outcomes = {}
+    delivered = []
+    for plan in plans:
+        if plan['action'] == 'skip':
+            outcomes[plan['email']] = 'skip'
+            continue
+        try:
+            if plan['action'] == 'full':
+                if html is None:
+                    with EMAIL_RENDER_SECONDS.time():
+                        html = generate_email_html(data)
+                msg = build_email_message(data, dict(config, recipient_email=plan['email']), html)
+            else:
+                msg = build_digest_message(plan, config)
+            send_smtp(config, msg)
+        except Exception as e:
+            log.error(f'email report failed: {e}', extra={'recipient': plan['email'], 'outcome': 'failure'})
+            outcomes[plan['email']] = 'failed'
+            continue
+        outcomes[plan['email']] = plan['action']
+        if plan['action'] == 'full':
+            delivered.append(plan['email'])
+    
+    if delivered:
+        sent_reports.record(delivered, prices)
+    log.info('scheduled email reports', extra={'outcomes': outcomes})
+    return outcomes
+
+
+def describe_metric(metric):
+    """'sourceb.kerala.22k' -> 'Source B Kerala, India 22K'"""
+    parts = metric.split('.')
+    if parts[0] == 'spread':
+        return f'India vs UAE spread {parts[1].upper()}'
+    key, karat = parts[0], parts[-1]
+    _, _, location = source_region(key, parts[1] if len(parts) == 3 else None)
+    return f"{SOURCES[key]['name']} {location} {karat.upper()}"
+
+
+def send_alert_email(email, crossings, config=DEFAULT_EMAIL_CONFIG):
+    """One email listing every alert of this recipient that fired on a price update"""
+    from email.mime.text import MIMEText
+    
+    rows = ''.join(
+        f"<tr><td>{describe_metric(c['metric'])}</td><td>{c['direction']} {c['threshold']:g}</td>"
+        f"<td>{c['previous']:g} → {c['value']:g}</td></tr>"
+        for c in crossings
+    )
+    html = f"""
+    <html><body style="font-family: Arial, sans-serif;">
+        <h2>🔔 KaratMate Labs - Price Alert</h2>
+        <table cellpadding="8" style="border-collapse: collapse;">
+            <tr><th align="left">Price</th><th align="left">Alert</th><th align="left">Move</th></tr>
+            {rows}
+        </table>
+        <p><small>Spread is the India price above the UAE price, in percent.</small></p>
+    </body></html>
+    """
+    msg = MIMEText(html, 'html')
+    msg['Subject'] = f"🔔 KaratMate Labs - {describe_metric(crossings[0]['metric'])} is " \
+                     f"{crossings[0]['direction']} {crossings[0]['threshold']:g}"
+    msg['From'] = config['sender_email']
+    msg['To'] = email
+    
+    try:
+        send_smtp(config, msg)
+        log.info('alert email sent', extra={'recipient': email, 'alerts': len(crossings), 'outcome': 'success'})
+        return True
+    except Exception as e:
+        log.error(f'alert email failed: {e}', extra={'recipient': email, 'outcome': 'failure'})
+        return False
+
+
+def send_smtp(config, msg):
+    """Deliver a message over STARTTLS SMTP, recording the send time"""
+    import smtplib
+    
+    start = time.perf_counter()
+    outcome = 'failure'
+    try:
+        with smtplib.SMTP(config['smtp_server'], config['smtp_port']) as server:
+            server.starttls()
+            server.login(config['sender_email'], config['app_password'])
+            server.send_message(msg)
+        outcome = 'success'
+    finally:
+        SMTP_SEND_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+
+
 def generate_email_html(data):
     """Generate beautiful HTML email with all prices and calculations"""
     
@@ -603,6 +1197,22 @@ def generate_email_html(data):
         
         html += '</div>'
     
+    # Trends (from the in-memory rolling statistics, see rolling_stats.py)
+    if data.get('stats'):
+        html += '<div class="section"><h2>📈 Trends</h2>'
+        html += '<table><tr><th>Source</th><th>Karat</th><th>Day Avg</th><th>Day Low / High</th>' \
+                '<th>Week Low / High</th><th>24h Change</th></tr>'
+        for source, karats in data['stats'].items():
+            for karat, s in karats.items():
+                change = s.get('change_24h_pct')
+                change_text = f"{change:+.2f}%" if change is not None else 'N/A'
+                html += f"""
+                <tr><td>{SOURCES.get(source, {}).get('name', source)}</td><td>{karat.upper()}</td>
+                <td>{s.get('ma_day', 'N/A')}</td><td>{s.get('day_low', 'N/A')} / {s.get('day_high', 'N/A')}</td>
+                <td>{s.get('week_low', 'N/A')} / {s.get('week_high', 'N/A')}</td><td>{change_text}</td></tr>
+                """
+        html += '</table></div>'
+    
     # Sovereign Calculations
     if 'calculations' in data:
         calc = data['calculations']
@@ -829,13 +1439,20 @@ def generate_email_html(data):
 
 @app.route('/api/fetch-and-email', methods=['POST'])
 def fetch_and_email():
-    """Fetch prices and send email report"""
-    print("\n" + "="*60)
-    print("  🏅 KaratMate Labs - Fetch & Email Report")
-    print("="*60)
+    """
+    Fetch prices and send email report
+    
+    ?deadline_ms=<n> sends whatever was fetched by then (see /api/fetch/all); the late
+    sources still update the snapshot.
+    """
+    log.info('fetch and email report requested')
+    try:
+        deadline = parse_deadline(request.args.get('deadline_ms'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'provider': 'KaratMate Labs'}), 400
     
     # Fetch all prices and calculations
-    data = fetch_all_internal()
+    data = fetch_all_internal(deadline=deadline, publish=shared_snapshot is None)
     
     if data['success']:
         # Send email
@@ -855,115 +1472,460 @@ def fetch_and_email():
         }), 500
 
 
-def fetch_all_internal():
-    """Internal function to fetch all prices (used by both /api/fetch/all and email)"""
-    results = {
+def build_calculations(sources, wanted=None):
+    """
+    Sovereign and customs calculations for the fetched sources
+    
+    wanted(name) -> bool limits them to the blocks a caller asked for (default: all);
+    the others are never computed.
+    """
+    calculations = {}
+    want = wanted or (lambda name: True)
+    
+    # Calculate UAE sovereign prices (8g, 16g, and 20g)
+    if 'sourcea' in sources:
+        price_22k = sources['sourcea']['prices'].get('22k')
+        if price_22k:
+            for grams in SOVEREIGN_GRAMS:
+                if want(f'sourcea_{grams}g'):
+                    calculations[f'sourcea_{grams}g'] = calculate_sovereign_uae(price_22k, grams)
+    
+    # Calculate India sovereign prices and customs (8g, 16g, and 20g)
+    if 'sourceb' in sources:
+        price_22k = sources['sourceb']['prices'].get('22k')
+        if price_22k:
+            # Sovereign calculations
+            for grams in SOVEREIGN_GRAMS:
+                if want(f'sourceb_{grams}g'):
+                    calculations[f'sourceb_{grams}g'] = calculate_sovereign_india(price_22k, grams)
+            
+            # Customs calculations (base price only, no making/GST)
+            price_per_gram = price_22k / 10
+            for grams in SOVEREIGN_GRAMS:
+                for channel in ('red', 'green'):
+                    if want(f'customs_{grams}g_{channel}'):
+                        calculations[f'customs_{grams}g_{channel}'] = calculate_customs_duty(
+                            price_per_gram * grams, grams, channel)
+    
+    # Landed cost of UAE gold in India (reads the cached FX matrix, no request of its own)
+    if 'sourcea' in sources:
+        price_22k = sources['sourcea']['prices'].get('22k')
+        landed = [grams for grams in SOVEREIGN_GRAMS if want(f'landed_{grams}g')]
+        if price_22k and landed:
+            aed_to_inr = fx_rates.rate('AED', 'INR')
+            india_22k = sources.get('sourceb', {}).get('prices', {}).get('22k')
+            for grams in landed:
+                calculations[f'landed_{grams}g'] = calculate_landed_cost(price_22k, grams, aed_to_inr, india_22k)
+    
+    return calculations
+
+
+def history_export_stream(args):
+    """Validated export arguments -> (chunk generator, format, download file name); ValueError if invalid"""
+    query, fmt, grams = export_params(args)
+    rows = HistoryStore().query(**query)
+    breakdown = (lambda row: history_breakdown(row, grams)) if grams else None
+    return export_chunks(rows, fmt, breakdown), fmt, export_filename(fmt, query)
+
+
+def empty_results():
+    return {
         'success': True,
         'timestamp': datetime.now().isoformat(),
         'sources': {},
+        'regions': {},
         'provider': 'KaratMate Labs'
     }
+
+
+def collect_results(fetched, late=(), wanted=None):
+    """
+    Results dict from fetched pages [(key, regions, entry)] (shared by the Flask and async APIs)
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
+    Pages in `late` [(key, regions)] missed the caller's deadline: each comes back as its
+    last-known entry (flagged 'stale') or, if the page never answered, is listed under
+    "pending"; such results are marked "partial" and get their calculations only.
+    `wanted` is passed on to build_calculations().
+    """
+    results = empty_results()
+    for key, regions, entry in fetched:
+        if entry:
+            add_region_entry(results, key, regions, entry)
+    if late:
+        results['partial'] = True
+        results['pending'] = []
+        for key, regions in late:
+            guarded = guard_key(key, regions[0])
+            stale = source_guards.get(guarded).stale_entry()
+            if stale:
+                add_region_entry(results, key, regions, stale)
+            else:
+                results['pending'].append(guarded)
+        with CALCULATION_SECONDS.time():
+            results['calculations'] = build_calculations(results['sources'], wanted)
+    return results
+
+
+def finish_results(results, started, timings=None, wanted=None):
+    """Calculations (the `wanted` ones), trend statistics and alerts for a complete fetch"""
+    with CALCULATION_SECONDS.time(), phase(timings, 'calculations'):
+        results['calculations'] = build_calculations(results['sources'], wanted)
     
-    # Fetch Source A (UAE)
-    try:
-        response = requests.get('https://eshop.joyalukkas.com/', headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            modal = soup.select_one('#myModal table')
-            
-            prices = {}
-            if modal:
-                rows = modal.find_all('tr')
-                for row in rows:
-                    cells = row.find_all('td')
-                    if len(cells) >= 2:
-                        karat = cells[0].text.strip().lower()
-                        price_text = cells[1].text.strip()
-                        price = extract_price(price_text)
-                        if price and karat:
-                            prices[karat] = price
-            
-            if prices:
-                results['sources']['sourcea'] = {
-                    'prices': prices,
-                    'currency': 'AED',
-                    'location': 'UAE'
-                }
-                print(f"   ✅ [KaratMate Labs] Source A (UAE): 24K={prices.get('24k')} AED, 22K={prices.get('22k')} AED")
-    except Exception as e:
-        print(f"   ❌ [KaratMate Labs] Source A (UAE) Error: {e}")
+    with phase(timings, 'stats'):
+        record_stats(results)
+    with phase(timings, 'alerts'):
+        process_alerts(results)
     
-    # Fetch Source B
+    log.info('fetched all prices', extra={
+        'sources': sorted(results['sources']), 'duration_ms': round((time.perf_counter() - started) * 1000, 2)})
+    return results
+
+
+def parse_deadline(value):
+    """?deadline_ms= -> seconds (None when absent); ValueError unless a positive number"""
+    if value is None or value == '':
+        return None
     try:
-        response = requests.get('https://www.candere.com/gold-rate-today/kerala', 
-                               headers=headers, timeout=10)
+        deadline_ms = float(value)
+    except ValueError:
+        raise ValueError('deadline_ms must be a number of milliseconds')
+    if deadline_ms <= 0:
+        raise ValueError('deadline_ms must be positive')
+    return deadline_ms / 1000
+
+
+# Payload sections ?fields= can select from; the envelope keys are always returned
+SELECTABLE_SECTIONS = ('sources', 'regions', 'calculations', 'stats')
+ENVELOPE_KEYS = ('success', 'full', 'since', 'version', 'timestamp', 'partial', 'pending',
+                 'removed_sources', 'removed_regions', 'removed_calculations', 'provider')
+
+
+def parse_selection(args):
+    """
+    ?sources= and ?fields= -> (source keys, fields or None), or None when neither is given
+    
+    fields are comma-separated dotted paths into the payload ('sources.sourceb.prices.22k',
+    'calculations.sourceb_8g', 'regions'). Without ?sources= only the sources the fields
+    refer to are needed. Raises ValueError for unknown sources, sections or calculations.
+    """
+    sources = [key.strip() for key in (args.get('sources') or '').split(',') if key.strip()]
+    fields = [field.strip() for field in (args.get('fields') or '').split(',') if field.strip()]
+    if not sources and not fields:
+        return None
+    
+    needed = set()
+    for field in fields:
+        parts = field.split('.')
+        if parts[0] not in SELECTABLE_SECTIONS:
+            raise ValueError(f"unknown field '{field}', fields start with {', '.join(SELECTABLE_SECTIONS)}")
+        if len(parts) == 1:
+            needed.update(ALL_SOURCES)
+        elif parts[0] == 'calculations':
+            if not calculation_sources(parts[1]):
+                raise ValueError(f"unknown calculation '{parts[1]}'")
+            needed.update(calculation_sources(parts[1]))
+        else:
+            needed.add(parts[1])
+    
+    unknown = sorted(key for key in set(sources) | needed if key not in ALL_SOURCES)
+    if unknown:
+        raise ValueError(f"unknown source '{unknown[0]}', sources are {', '.join(ALL_SOURCES)}")
+    keys = sources or needed
+    return tuple(key for key in ALL_SOURCES if key in keys), fields or None
+
+
+def wanted_calculations(keys, fields):
+    """build_calculations() filter for a selection: blocks of the chosen sources the fields ask for"""
+    keys = set(keys)
+    
+    def wanted(name):
+        if not keys.issuperset(calculation_sources(name)):
+            return False
+        return fields is None or any(
+            field == 'calculations' or field == f'calculations.{name}' or field.startswith(f'calculations.{name}.')
+            for field in fields)
+    return wanted
+
+
+def project_fields(payload, fields):
+    """Copy of payload with only the dotted paths in fields (plus the envelope keys)"""
+    projected = {key: payload[key] for key in ENVELOPE_KEYS if key in payload}
+    for field in fields:
+        source, target = payload, projected
+        parts = field.split('.')
+        for depth, part in enumerate(parts):
+            if not isinstance(source, dict) or part not in source or target.get(part) is source[part]:
+                break  # missing, or already copied whole by a shorter path
+            if depth == len(parts) - 1:
+                target[part] = source[part]
+            else:
+                source = source[part]
+                target = target.setdefault(part, {})
+    return projected
+
+
+def select_payload(payload, keys, fields):
+    """A results / snapshot payload cut down to the chosen sources, then to the fields"""
+    wanted = wanted_calculations(keys, fields)
+    selected = dict(payload)
+    for section in ('sources', 'regions', 'stats'):
+        if section in payload:
+            selected[section] = {key: value for key, value in payload[section].items() if key in keys}
+    if 'calculations' in payload:
+        selected['calculations'] = {name: value for name, value in payload['calculations'].items() if wanted(name)}
+    return project_fields(selected, fields or SELECTABLE_SECTIONS)
+
+
+def selection_pages(keys, fields):
+    """Pages a selection needs: the sources' default pages, their region pages only if "regions" is asked for"""
+    with_regions = fields is None or any(field.split('.')[0] == 'regions' for field in fields)
+    return region_pages(None if with_regions else {}, keys)
+
+
+def no_calculations(name):
+    """build_calculations() filter of shared selection rounds: their callers build their own"""
+    return False
+
+
+def stats_only(fields):
+    """True when a selection asks for nothing but trend statistics"""
+    return fields is not None and all(field.split('.')[0] == 'stats' for field in fields)
+
+
+def selection_payload(results, keys, fields, version=0):
+    """
+    Results of a selection round -> the selection, shaped like one cut from the snapshot
+    
+    Adds just the calculations the selection asks for, the rolling stats and the
+    version of the current snapshot (0 before the first one).
+    """
+    with CALCULATION_SECONDS.time():
+        calculations = build_calculations(results['sources'], wanted_calculations(keys, fields))
+    results = dict(results, calculations=calculations, stats=price_stats.summary(), version=version, full=True)
+    return select_payload(results, keys, fields)
+
+
+# Selection scrapes in progress, keyed by the pages they fetch (and whether they were forced)
+selection_rounds = {}
+
+
+def selection_results(keys, fields, force=False, deadline=None):
+    """
+    Scrape just the pages a selection needs, reusing those fetched in the last SNAPSHOT_MAX_AGE seconds
+    
+    Selections needing the same pages wait on one FetchRound, as refresh_round does
+    for the snapshot. The round stops at the pages (finish=False): no stats or alerts
+    are fed from this partial view of the sources. A stats-only selection is answered
+    from the rolling stats without scraping.
+    """
+    snapshot = snapshot_store.current()
+    version = snapshot.version if snapshot is not None else 0
+    if stats_only(fields):
+        return selection_payload(empty_results(), keys, fields, version)
+    pages = selection_pages(keys, fields)
+    round_key = (frozenset(pages), force)
+    with refresh_round_lock:
+        fetch_round = selection_rounds.get(round_key)
+        if fetch_round is None or fetch_round.done.is_set():
+            fetch_round = selection_rounds[round_key] = FetchRound(
+                pages=pages, max_age=None if force else SNAPSHOT_MAX_AGE, wanted=no_calculations, finish=False)
+    return selection_payload(fetch_round.wait(deadline), keys, fields, version)
+
+
+def selection_etag(snapshot, keys, fields):
+    """ETag of a snapshot cut down by a selection: the snapshot's plus a digest of the selection"""
+    digest = hashlib.sha1(f"{','.join(keys)}|{','.join(fields or ())}".encode('utf-8')).hexdigest()
+    return f'{snapshot.etag}-{digest[:8]}'
+
+
+def snapshot_is_fresh():
+    """True when /api/fetch/all would serve the current snapshot without scraping"""
+    if shared_snapshot is not None:
+        return True
+    snapshot = snapshot_store.current()
+    return snapshot is not None and snapshot.age() <= SNAPSHOT_MAX_AGE
+
+
+class FetchRound:
+    """
+    One concurrent fetch of region pages, which callers wait on up to their own deadline
+    
+    The last page to land builds the full results (calculations, stats, alerts) on its
+    worker thread and, with publish=True, makes them the current snapshot, so pages that
+    missed a caller's deadline still reach the next caller.
+    
+    pages defaults to region_pages(); with max_age, a page fetched successfully within
+    that many seconds is reused instead of downloaded again. wanted limits the
+    calculations (see build_calculations). finish=False stops at the fetched pages:
+    no calculations, stats or alerts. profile: a ProfileSession covering the page
+    fetches and the final calculations on the worker threads.
+    """
+    
+    def __init__(self, timings=None, publish=False, pages=None, max_age=None, wanted=None, finish=True,
+                 profile=None):
+        self.started = time.perf_counter()
+        self.timings = timings
+        self.publish = publish
+        self.wanted = wanted
+        self.finish = finish
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+        self._lock = threading.Lock()
         
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            prices = {}
-            card_24k = soup.select_one('.goldCard--one .goldCard--rate')
-            if card_24k:
-                price = extract_price(card_24k.text.strip())
-                if price:
-                    prices['24k'] = price
-            
-            card_22k = soup.select_one('.goldCard--two .goldCard--rate')
-            if card_22k:
-                price = extract_price(card_22k.text.strip())
-                if price:
-                    prices['22k'] = price
-            
-            if prices:
-                results['sources']['sourceb'] = {
-                    'prices': prices,
-                    'currency': 'INR',
-                    'location': 'Kerala, India',
-                    'unit': '10gm'
-                }
-                print(f"   ✅ [KaratMate Labs] Source B: 24K=₹{prices.get('24k')}/10gm, 22K=₹{prices.get('22k')}/10gm")
-    except Exception as e:
-        print(f"   ❌ [KaratMate Labs] Source B Error: {e}")
+        # Every region page concurrently; host_limiter keeps each site to a few requests at a time
+        self._futures = {}
+        for (key, _), regions in (region_pages() if pages is None else pages).items():
+            reused = source_guards.get(guard_key(key, regions[0])).fresh_entry(max_age) if max_age else None
+            if reused:
+                future = Future()
+                future.set_result(reused)
+            else:
+                page_timings = None
+                if timings is not None:
+                    page_timings = timings.setdefault('sources', {}).setdefault(guard_key(key, regions[0]), {})
+                fetch = profile.wrap(fetch_source_guarded) if profile is not None else fetch_source_guarded
+                future = region_executor.submit(fetch, key, page_timings, regions[0], profile)
+            self._futures[future] = (key, regions)
+        self._remaining = len(self._futures)
+        page_done = profile.wrap(self._page_done) if profile is not None else self._page_done
+        for future in list(self._futures):
+            future.add_done_callback(page_done)
     
-    # Add calculations
-    results['calculations'] = {}
+    def _page_done(self, future):
+        with self._lock:
+            self._remaining -= 1
+            if self._remaining:
+                return
+        try:
+            fetched = [(key, regions, f.result()) for f, (key, regions) in self._futures.items()]
+            self.results = collect_results(fetched)
+            if self.finish:
+                finish_results(self.results, self.started, self.timings, self.wanted)
+            if self.publish:
+                snapshot_store.publish(self.results)
+        except Exception as e:
+            log.exception('fetch round failed')
+            self.error = e
+        finally:
+            self.done.set()
     
-    # Calculate UAE sovereign prices (8g, 16g, and 20g)
-    if 'sourcea' in results['sources']:
-        price_22k = results['sources']['sourcea']['prices'].get('22k')
-        if price_22k:
-            results['calculations']['sourcea_8g'] = calculate_sovereign_uae(price_22k, 8)
-            results['calculations']['sourcea_16g'] = calculate_sovereign_uae(price_22k, 16)
-            results['calculations']['sourcea_20g'] = calculate_sovereign_uae(price_22k, 20)
+    def wait(self, deadline=None):
+        """The full results, or partial ones (see collect_results) if `deadline` seconds pass first"""
+        if self.done.wait(deadline):
+            if self.error is not None:
+                raise self.error
+            return self.results
+        fetched, late = [], []
+        for future, (key, regions) in list(self._futures.items()):
+            if future.done():
+                fetched.append((key, regions, future.result()))
+            else:
+                late.append((key, regions))
+        return collect_results(fetched, late, self.wanted)
+
+
+def fetch_all_internal(timings=None, deadline=None, publish=False, profile=None):
+    """
+    Internal function to fetch all prices (used by both /api/fetch/all and email)
     
-    # Calculate India sovereign prices and customs (8g, 16g, and 20g)
-    if 'sourceb' in results['sources']:
-        price_22k = results['sources']['sourceb']['prices'].get('22k')
-        if price_22k:
-            # Sovereign calculations
-            results['calculations']['sourceb_8g'] = calculate_sovereign_india(price_22k, 8)
-            results['calculations']['sourceb_16g'] = calculate_sovereign_india(price_22k, 16)
-            results['calculations']['sourceb_20g'] = calculate_sovereign_india(price_22k, 20)
-            
-            # Customs calculations (base price only, no making/GST)
-            price_per_gram = price_22k / 10
-            base_8g = price_per_gram * 8
-            base_16g = price_per_gram * 16
-            base_20g = price_per_gram * 20
-            
-            results['calculations']['customs_8g_red'] = calculate_customs_duty(base_8g, 8, 'red')
-            results['calculations']['customs_8g_green'] = calculate_customs_duty(base_8g, 8, 'green')
-            results['calculations']['customs_16g_red'] = calculate_customs_duty(base_16g, 16, 'red')
-            results['calculations']['customs_16g_green'] = calculate_customs_duty(base_16g, 16, 'green')
-            results['calculations']['customs_20g_red'] = calculate_customs_duty(base_20g, 20, 'red')
-            results['calculations']['customs_20g_green'] = calculate_customs_duty(base_20g, 20, 'green')
+    Each source's default region goes under "sources" (and feeds the calculations);
+    every FETCH_REGIONS page goes under "regions" -> {source: {region: entry}}.
+    Pass a dict as `timings` to collect a per-page phase breakdown into it.
+    With a `deadline` (seconds) returns partial results if some pages are still in
+    flight by then; publish=True makes the complete results the snapshot once they land.
+    profile: a ProfileSession to cover the worker threads (?profile=1).
+    """
+    return FetchRound(timings, publish, profile=profile).wait(deadline)
+
+
+@app.route('/api/sources/health', methods=['GET'])
+def sources_health():
+    """Circuit breaker state, adaptive timeout and latency per source"""
+    return jsonify({
+        'success': True,
+        'sources': source_guards.status(),
+        'provider': 'KaratMate Labs'
+    })
+
+
+@app.route('/api/alerts', methods=['POST'])
+def create_alert():
+    """Subscribe to a threshold: {"email", "metric", "direction": "below"|"above", "threshold"}"""
+    body = request.get_json(silent=True) or {}
+    try:
+        if body.get('metric') not in alert_metric_names():
+            raise AlertError(f"unknown metric '{body.get('metric')}', see GET /api/alerts/metrics")
+        alert = alert_engine.add(body['metric'], body.get('direction'), body.get('threshold'), body.get('email'))
+    except AlertError as e:
+        return jsonify({'success': False, 'error': str(e), 'provider': 'KaratMate Labs'}), 400
+    return jsonify({'success': True, 'alert': alert, 'provider': 'KaratMate Labs'}), 201
+
+
+@app.route('/api/alerts', methods=['GET'])
+def list_alerts():
+    """Alerts registered for ?email="""
+    email = request.args.get('email', '').strip().lower()
+    if not email:
+        return jsonify({'success': False, 'error': 'email is required', 'provider': 'KaratMate Labs'}), 400
+    return jsonify({'success': True, 'alerts': alert_engine.alerts(email), 'provider': 'KaratMate Labs'})
+
+
+@app.route('/api/alerts/<int:alert_id>', methods=['DELETE'])
+def delete_alert(alert_id):
+    """Unsubscribe one alert"""
+    if not alert_engine.remove(alert_id):
+        return jsonify({'success': False, 'error': 'No such alert', 'provider': 'KaratMate Labs'}), 404
+    return jsonify({'success': True, 'provider': 'KaratMate Labs'})
+
+
+@app.route('/api/alerts/metrics', methods=['GET'])
+def alert_metrics_route():
+    """Metric names alerts can be registered on"""
+    return jsonify({'success': True, 'metrics': alert_metric_names(), 'provider': 'KaratMate Labs'})
+
+
+@app.route('/api/history/export', methods=['GET'])
+def history_export():
+    """
+    Stream price history as CSV or NDJSON (chunked, constant memory)
     
-    return results
+    ?format=csv|ndjson, ?from= / ?to= (dates or ISO timestamps), ?source=, ?region=, ?karat=;
+    22K rows carry the sovereign/customs breakdown for ?grams= (default 8) unless ?calculations=0.
+    """
+    try:
+        chunks, fmt, filename = history_export_stream(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e), 'provider': 'KaratMate Labs'}), 400
+    return app.response_class(chunks, mimetype=FORMATS[fmt],
+                              headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Rolling trend statistics per source and karat (moving averages, high/low, change, volatility)"""
+    if shared_snapshot is not None:
+        # Workers under serve.py do not fetch; the refresher's summary travels in the snapshot
+        snapshot = current_snapshot()
+        summary = snapshot.payload.get('stats', {}) if snapshot is not None else {}
+    else:
+        summary = price_stats.summary()
+    return jsonify({
+        'success': True,
+        'stats': summary,
+        'provider': 'KaratMate Labs'
+    })
+
+
+@app.route('/api/fx', methods=['GET'])
+def fx():
+    """Cached AED/INR/USD conversion matrix"""
+    return jsonify({
+        'success': True,
+        'rates': fx_rates.matrix(),
+        'fx': fx_rates.status(),
+        'provider': 'KaratMate Labs'
+    })
 
 
 @app.route('/api/health', methods=['GET'])
@@ -987,6 +1949,12 @@ if __name__ == '__main__':
     print("    GET  /api/fetch/sourceb")
     print("    GET  /api/fetch/bhima")
     print("    GET  /api/fetch/all")
+    print("    GET  /api/sources/health")
+    print("    GET  /api/stats")
+    print("    GET  /api/history/export")
+    print("    POST /api/alerts")
+    print("    GET  /api/fx")
+    print("    GET  /metrics")
     print("="*60 + "\n")
     
     app.run(debug=True, host='0.0.0.0', port=5002)
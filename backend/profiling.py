@@ -0,0 +1,179 @@
+"""
+KaratMate Labs - Request Timing and Profiling
+Phase-by-phase timings for ?debug=timing and cProfile hot-function reports
+for ?profile=1 (only when the caller presents KARATMATE_PROFILE_TOKEN)
+
+cProfile only sees the thread it runs in, and the scraping happens on worker
+threads, so a ProfileSession profiles each worker task on its own and merges
+the results into one report.
+"""
+
+import contextlib
+import cProfile
+import hmac
+import os
+import pstats
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+PROFILE_TOKEN_ENV = 'KARATMATE_PROFILE_TOKEN'
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+@contextlib.contextmanager
+def phase(timings, name):
+    """Record the block's wall time as timings[name + '_ms']; a no-op when timings is None"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[f'{name}_ms'] = _ms(time.perf_counter() - start)
+
+
+def record_dns(timings, url):
+    """
+    Time a name lookup for url's host into timings['dns_ms']
+
+    The lookup is done separately from the request, so the request's own lookup
+    then usually hits the resolver cache and its 'headers' phase is mostly
+    connect + TLS + server time.
+    """
+    if timings is None:
+        return
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    with phase(timings, 'dns'):
+        try:
+            socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+        except OSError as e:
+            timings['dns_error'] = str(e)
+
+
+def profile_allowed(token):
+    """True if profiling is enabled on this server and token matches it"""
+    expected = os.environ.get(PROFILE_TOKEN_ENV)
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+class ProfileSession:
+    """
+    One profile across threads: the calling thread plus every task run through wrap()
+
+    Each thread gets its own cProfile.Profile (they are merged with pstats.add).
+    From Python 3.12 a profiler sees every thread and a second one cannot be
+    enabled while it runs; wrapped tasks then run as they are, covered by the first.
+    """
+
+    def __init__(self):
+        self.profilers = []
+        self._running = 0
+        self._changed = threading.Condition()
+        self._local = threading.local()
+
+    def wrap(self, fn):
+        """fn, profiled on whichever thread calls it (unless that thread is profiled already)"""
+        def profiled(*args, **kwargs):
+            if getattr(self._local, 'active', False):
+                return fn(*args, **kwargs)
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is active (3.12+) and already covers this thread
+                return fn(*args, **kwargs)
+            self._local.active = True
+            with self._changed:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.disable()
+                self._local.active = False
+                with self._changed:
+                    self._running -= 1
+                    self.profilers.append(profiler)
+                    self._changed.notify_all()
+        return profiled
+
+    def runcall(self, fn, *args, **kwargs):
+        return self.wrap(fn)(*args, **kwargs)
+
+    def finished(self, timeout=1.0):
+        """
+        The profilers of the finished tasks, after waiting up to timeout seconds for the running ones
+
+        Work done after the caller's result was ready (the last page's calculations, a losing
+        hedge attempt) is still on its way in when the caller returns.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._running == 0, timeout)
+            return list(self.profilers)
+
+
+def hot_functions(profilers, top=25, sort='cumulative'):
+    """The `top` functions of finished cProfile.Profile(s), merged, as JSON-friendly dicts"""
+    if isinstance(profilers, cProfile.Profile):
+        profilers = [profilers]
+    stats = pstats.Stats(profilers[0])
+    for profiler in profilers[1:]:
+        stats.add(profiler)
+    stats.sort_stats(sort)
+    rows = []
+    for func in stats.fcn_list[:top]:
+        filename, line, name = func
+        primitive_calls, calls, total, cumulative, _ = stats.stats[func]
+        rows.append({
+            'function': name,
+            'file': filename,
+            'line': line,
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'total_ms': _ms(total),
+            'cumulative_ms': _ms(cumulative)
+        })
+    return rows
+
+
+def run_profiled(fn, *args, top=25, sort='cumulative', **kwargs):
+    """
+    Run fn under a ProfileSession -> (fn's result, hot_functions list)
+
+    fn is called with profile=<the session> to hand on to the threads it uses.
+    """
+    session = ProfileSession()
+    result = session.runcall(fn, *args, profile=session, **kwargs)
+    return result, hot_functions(session.finished(), top=top, sort=sort)
+
+
+def format_timings(timings):
+    """Plain-text table of a ?debug=timing breakdown (used by RUN_FETCH_EMAIL.py)"""
+    lines = []
+    for key, phases in timings.get('sources', {}).items():
+        parts = [f"{name[:-3]} {value:.1f}ms" for name, value in phases.items()
+                 if name.endswith('_ms') and name != 'total_ms']
+        total = phases.get('total_ms')
+        lines.append(f"   {key:<12} total {total:.1f}ms  ({', '.join(parts) or phases.get('outcome', '-')})"
+                     if total is not None else f"   {key:<12} {phases.get('outcome', '-')}")
+    for name in ('calculations_ms', 'serialize_ms', 'total_ms'):
+        if name in timings:
+            lines.append(f"   {name[:-3]:<12} {timings[name]:.1f}ms")
+    return '\n'.join(lines)
+
+
+def format_hot_functions(rows):
+    """Plain-text table of run_profiled() output"""
+    lines = [f"   {'cumulative':>11} {'own':>9} {'calls':>7}  function"]
+    for row in rows:
+        location = f"{os.path.basename(row['file'])}:{row['line']}" if row['line'] else row['file']
+        lines.append(f"   {row['cumulative_ms']:>9.1f}ms {row['total_ms']:>7.1f}ms {row['calls']:>7}  "
+                     f"{row['function']} ({location})")
+    return '\n'.join(lines)
@@ -0,0 +1,210 @@
+"""
+KaratMate Labs - Rolling Price Statistics
+Incremental per-source, per-karat trends fed one price tick at a time: moving
+averages, day/week high and low, change versus 24 hours ago and volatility
+
+Every update is amortized O(1): running sums for the averages, monotonic
+deques for high/low and a fixed window of log returns for volatility.
+"""
+
+import collections
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+
+DAY = 24 * 3600
+WEEK = 7 * DAY
+
+# A tick is recorded when the price moves, or at least this often while it is flat
+MIN_TICK_INTERVAL = 15 * 60
+
+VOLATILITY_RETURNS = 20
+
+DEFAULT_STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'price_stats.json')
+
+
+class RollingWindow:
+    """Ticks from the last `span` seconds with running mean and high/low"""
+
+    def __init__(self, span):
+        self.span = span
+        self._items = collections.deque()   # (seq, t, value)
+        self._max = collections.deque()     # decreasing values
+        self._min = collections.deque()     # increasing values
+        self._total = 0.0
+        self.last_expired = None            # newest tick that fell out of the window
+
+    def add(self, seq, t, value):
+        self._items.append((seq, t, value))
+        self._total += value
+        while self._max and self._max[-1][2] <= value:
+            self._max.pop()
+        self._max.append((seq, t, value))
+        while self._min and self._min[-1][2] >= value:
+            self._min.pop()
+        self._min.append((seq, t, value))
+        self.expire(t)
+
+    def expire(self, now):
+        while self._items and self._items[0][1] <= now - self.span:
+            item = self._items.popleft()
+            self._total -= item[2]
+            self.last_expired = item
+            if self._max[0][0] == item[0]:
+                self._max.popleft()
+            if self._min[0][0] == item[0]:
+                self._min.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+    def mean(self):
+        return self._total / len(self._items) if self._items else None
+
+    def high(self):
+        return self._max[0][2] if self._max else None
+
+    def low(self):
+        return self._min[0][2] if self._min else None
+
+
+class RollingSeries:
+    """Rolling statistics for one (source, karat) price series"""
+
+    def __init__(self):
+        self.day = RollingWindow(DAY)
+        self.week = RollingWindow(WEEK)
+        self._returns = collections.deque(maxlen=VOLATILITY_RETURNS)
+        self._returns_sum = 0.0
+        self._returns_sq = 0.0
+        self._seq = 0
+        self.last = None  # (t, value)
+
+    def add(self, t, value):
+        """Record a tick; returns False if it was skipped (flat price, too soon)"""
+        if self.last is not None:
+            last_t, last_value = self.last
+            if t <= last_t or (value == last_value and t - last_t < MIN_TICK_INTERVAL):
+                return False
+            if last_value > 0 and value > 0:
+                if len(self._returns) == self._returns.maxlen:
+                    dropped = self._returns[0]
+                    self._returns_sum -= dropped
+                    self._returns_sq -= dropped * dropped
+                r = math.log(value / last_value)
+                self._returns.append(r)
+                self._returns_sum += r
+                self._returns_sq += r * r
+
+        self._seq += 1
+        self.day.add(self._seq, t, value)
+        self.week.add(self._seq, t, value)
+        self.last = (t, value)
+        return True
+
+    def volatility(self):
+        """Standard deviation of the recent tick-to-tick log returns, in percent"""
+        n = len(self._returns)
+        if n < 2:
+            return None
+        variance = (self._returns_sq - self._returns_sum ** 2 / n) / (n - 1)
+        return math.sqrt(max(0.0, variance)) * 100
+
+    def summary(self, now=None):
+        now = time.time() if now is None else now
+        self.day.expire(now)
+        self.week.expire(now)
+        current = self.last[1] if self.last else None
+        yesterday = self.day.last_expired[2] if self.day.last_expired else None
+
+        def rounded(value, digits=2):
+            return round(value, digits) if value is not None else None
+
+        return {
+            'price': current,
+            'ma_day': rounded(self.day.mean()),
+            'ma_week': rounded(self.week.mean()),
+            'day_high': self.day.high(),
+            'day_low': self.day.low(),
+            'week_high': self.week.high(),
+            'week_low': self.week.low(),
+            'change_24h_pct': rounded((current - yesterday) / yesterday * 100, 3)
+                              if current is not None and yesterday else None,
+            'volatility_pct': rounded(self.volatility(), 4),
+            'ticks_week': len(self.week)
+        }
+
+
+class RollingStats:
+    """RollingSeries per (source, karat), fed from fetch results"""
+
+    def __init__(self):
+        self._series = {}
+        self.recorded = 0  # ticks recorded so far: the summary only moves on with a new one
+        self._lock = threading.Lock()
+
+    def add(self, source, karat, value, t=None):
+        t = time.time() if t is None else t
+        with self._lock:
+            series = self._series.get((source, karat))
+            if series is None:
+                series = self._series[(source, karat)] = RollingSeries()
+            recorded = series.add(t, value)
+            self.recorded += recorded
+            return recorded
+
+    def update(self, sources, t=None):
+        """Feed one fetch's {'source': {'prices': {...}}}; stale fallback entries are skipped"""
+        recorded = False
+        for source, entry in sources.items():
+            if entry.get('stale'):
+                continue
+            for karat, value in entry.get('prices', {}).items():
+                if isinstance(value, (int, float)):
+                    recorded = self.add(source, karat, float(value), t) or recorded
+        return recorded
+
+    def summary(self, now=None):
+        """{source: {karat: stats}}"""
+        with self._lock:
+            result = {}
+            for (source, karat), series in sorted(self._series.items()):
+                result.setdefault(source, {})[karat] = series.summary(now)
+            return result
+
+    def ticks(self):
+        """Week of recorded ticks per series (the state save() persists)"""
+        with self._lock:
+            return {
+                f'{source}|{karat}': [[t, value] for _, t, value in series.week._items]
+                for (source, karat), series in self._series.items()
+            }
+
+    def save(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.stats-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.ticks(), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path):
+        """Rebuild from a save() file (a week of ticks), or empty if there is none"""
+        stats = cls()
+        try:
+            with open(path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return stats
+        for name, ticks in saved.items():
+            source, _, karat = name.partition('|')
+            for t, value in ticks:
+                stats.add(source, karat, value, t)
+        return stats
@@ -0,0 +1,82 @@
+"""
+KaratMate Labs - Run Admission Queue
+Bounds how many expensive runs (browser-based tracker runs) execute at once,
+how many may wait, and lets callers asking for the same run share it
+
+A caller whose run (same key) is already queued or running gets that run's
+Future instead of starting another. When every run slot and queue place is
+taken, submit() raises QueueFull with a Retry-After estimate.
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """No run slot or queue place left; retry_after is a suggested wait in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Run queue is full, retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class RunQueue:
+    """At most max_running runs at a time and max_waiting queued behind them"""
+
+    def __init__(self, max_running=1, max_waiting=4, default_duration=60, name='run'):
+        self.max_running = max_running
+        self.max_waiting = max_waiting
+        self.default_duration = default_duration
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix=name)
+        self._inflight = {}  # key -> Future, queued or running
+        self._running = 0
+        self._average = None  # moving average of run durations (seconds)
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) unless a run with this key is already in flight
+
+        Returns (future, shared): shared is True when joining a run another caller started.
+        Raises QueueFull when max_running + max_waiting runs are already in flight.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, True
+            if len(self._inflight) >= self.max_running + self.max_waiting:
+                raise QueueFull(self._retry_after())
+            # _run's cleanup takes the lock too, so the key is registered before it can be removed
+            future = self._executor.submit(self._run, key, fn, args, kwargs)
+            self._inflight[key] = future
+            return future, False
+
+    def _run(self, key, fn, args, kwargs):
+        with self._lock:
+            self._running += 1
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._running -= 1
+                del self._inflight[key]
+                self._average = elapsed if self._average is None else 0.8 * self._average + 0.2 * elapsed
+
+    def _retry_after(self):
+        """Seconds until a queue place frees up, at most: one run's duration spread over the slots"""
+        duration = self._average if self._average is not None else self.default_duration
+        return max(1, math.ceil(duration / self.max_running))
+
+    def status(self):
+        with self._lock:
+            return {
+                'running': self._running,
+                'waiting': len(self._inflight) - self._running,
+                'max_running': self.max_running,
+                'max_waiting': self.max_waiting,
+                'average_run_seconds': round(self._average, 1) if self._average is not None else None
+            }
@@ -0,0 +1,138 @@
+"""
+KaratMate Labs - Production Server
+Runs several worker processes behind one port instead of the Flask debug server
+
+Usage:
+    python serve.py price --workers 4 --port 5002
+    python serve.py tracker --port 5001
+
+For the price API a single refresher (this parent process) scrapes the sources and
+writes the snapshot to a memory-mapped file; every worker serves that same snapshot.
+The tracker always runs as one worker (threaded): its run queue and jobs live in memory.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from shared_snapshot import DEFAULT_PATH, SharedSnapshotFile
+
+APPS = {
+    'price': ('price_fetcher_api', 5002),
+    'tracker': ('api_server', 5001)
+}
+
+# Apps whose state lives in the worker process (tracker: run queue and jobs, see api_server.py)
+SINGLE_WORKER_APPS = {'tracker'}
+
+
+def run_worker(app_name, sock, snapshot_path, threads, access_log):
+    """Worker process entry point: serve the app on the inherited listening socket"""
+    import logging
+    from werkzeug.serving import make_server
+
+    if not access_log:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    module_name, _ = APPS[app_name]
+    module = __import__(module_name)
+    if app_name == 'price':
+        module.attach_shared_snapshot(snapshot_path)
+
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, module.app, threaded=threads > 1, fd=sock.fileno())
+    server.serve_forever()
+
+
+def refresh_loop(shared, interval):
+    """Single refresher: scrape, publish into the shared snapshot, sleep"""
+    import price_fetcher_api
+    from log_config import get_logger
+    log = get_logger('serve')
+
+    while True:
+        try:
+            snapshot = price_fetcher_api.snapshot_store.publish(price_fetcher_api.fetch_all_internal())
+            shared.write(snapshot)
+            log.info('snapshot published', extra={'version': snapshot.version, 'path': shared.path})
+        except Exception:
+            log.exception('snapshot refresh failed')
+        time.sleep(interval)
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if os.name != 'nt':
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(256)
+    return sock
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='KaratMate Labs multi-worker server')
+    parser.add_argument('app', choices=sorted(APPS))
+    parser.add_argument('--workers', type=int, default=max(2, os.cpu_count() or 2))
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker (1 = single-threaded)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--snapshot-file', default=DEFAULT_PATH)
+    parser.add_argument('--refresh-interval', type=float, default=60,
+                        help='seconds between scrapes of the price refresher (0 = no refresher)')
+    parser.add_argument('--access-log', action='store_true', help='log every request (slow on Windows consoles)')
+    args = parser.parse_args(argv)
+
+    if args.app in SINGLE_WORKER_APPS and args.workers != 1:
+        # A second worker would have its own queue (two Chromes at once) and 404 the other's job ids
+        print(f"   ⚠️ {args.app} keeps its run queue and jobs in memory, running 1 worker instead of {args.workers}")
+        args.workers = 1
+    port = args.port or APPS[args.app][1]
+    sock = bind_socket(args.host, port)
+
+    if args.app == 'price':
+        if args.refresh_interval > 0 or not os.path.exists(args.snapshot_file):
+            shared = SharedSnapshotFile(args.snapshot_file, create=True)
+        if args.refresh_interval > 0:
+            threading.Thread(target=refresh_loop, args=(shared, args.refresh_interval), daemon=True).start()
+
+    print("\n" + "="*60)
+    print(f"  🏅 KaratMate Labs - {APPS[args.app][0]} ({args.workers} workers)")
+    print("="*60)
+    print(f"  Serving at: http://{args.host}:{port}")
+    if args.app == 'price':
+        print(f"  Snapshot file: {args.snapshot_file}")
+    print("="*60 + "\n")
+
+    ctx = multiprocessing.get_context('spawn')
+    worker_args = (args.app, sock, args.snapshot_file, args.threads, args.access_log)
+    workers = [ctx.Process(target=run_worker, args=worker_args, daemon=True) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+
+    # Make `kill`/terminate() run the cleanup below so workers do not outlive the parent
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        # Restart any worker that dies
+        while True:
+            time.sleep(1)
+            for i, worker in enumerate(workers):
+                if not worker.is_alive():
+                    print(f"   ⚠️ Worker {worker.pid} exited ({worker.exitcode}), restarting")
+                    workers[i] = ctx.Process(target=run_worker, args=worker_args, daemon=True)
+                    workers[i].start()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        for worker in workers:
+            worker.terminate()
+        sock.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+KaratMate Labs - Shared Price Snapshot
+Memory-mapped snapshot file written by one refresher and read by every worker process
+
+Layout: fixed header followed by the snapshot JSON. The header carries a sequence
+counter (seqlock): the writer makes it odd while writing and even when done, readers
+retry if it was odd or moved while they were copying.
+"""
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+MAGIC = b'KMSNAP01'
+# magic, sequence, version, checked_at, body length, content digest
+HEADER = struct.Struct('<8sQQdI40s')
+DATA_OFFSET = 128
+DEFAULT_SIZE = 1024 * 1024
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'karatmate_price_snapshot.mmap')
+
+
+class SharedSnapshotFile:
+    """Seqlock-protected snapshot in a memory-mapped file"""
+
+    def __init__(self, path=DEFAULT_PATH, size=DEFAULT_SIZE, create=False):
+        self.path = path
+        self.size = size
+        if create:
+            with open(path, 'wb') as f:
+                f.truncate(size)
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), size)
+        if create:
+            self._write_header(0, 0, 0.0, 0, b'')
+        self._written_version = 0
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _write_header(self, sequence, version, checked_at, length, digest):
+        HEADER.pack_into(self._map, 0, MAGIC, sequence, version, checked_at, length, digest)
+
+    def _read_header(self):
+        magic, sequence, version, checked_at, length, digest = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            return None
+        return sequence, version, checked_at, length, digest.decode('ascii')
+
+    def write(self, snapshot):
+        """Publish a PriceSnapshot (only the timestamp is rewritten if the version is unchanged)"""
+        header = self._read_header()
+        sequence = header[0] if header else 0
+
+        if snapshot.version == self._written_version:
+            body_length = header[3]
+            body = None
+        else:
+            body = snapshot.body
+            body_length = len(body)
+            if DATA_OFFSET + body_length > self.size:
+                raise ValueError(f'Snapshot of {body_length} bytes does not fit in {self.path}')
+
+        digest = snapshot.digest.encode('ascii')
+        self._write_header(sequence + 1, snapshot.version, snapshot.checked_at, body_length, digest)
+        if body is not None:
+            self._map[DATA_OFFSET:DATA_OFFSET + body_length] = body
+        self._write_header(sequence + 2, snapshot.version, snapshot.checked_at, body_length, digest)
+        self._written_version = snapshot.version
+
+    def version(self):
+        """Version currently in the file (0 before the first write)"""
+        header = self._read_header()
+        return header[1] if header else 0
+
+    def read(self, retries=100):
+        """Consistent copy of the snapshot -> (version, checked_at, digest, payload) or None"""
+        for _ in range(retries):
+            header = self._read_header()
+            if header is None:
+                return None
+            sequence, version, checked_at, length, digest = header
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            body = self._map[DATA_OFFSET:DATA_OFFSET + length]
+            if self._read_header()[0] != sequence:
+                continue
+            if version == 0:
+                return None
+            return version, checked_at, digest, json.loads(body)
+        return None
+
+    def sync(self, store):
+        """Install the file's snapshot into a local SnapshotStore if it moved; return the current one"""
+        current = store.current()
+        if current is not None and current.version == self.version():
+            return current
+        shared = self.read()
+        if shared is None:
+            return current
+        version, checked_at, digest, payload = shared
+        return store.install(payload, digest, checked_at)
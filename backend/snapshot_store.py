@@ -0,0 +1,239 @@
+"""
+KaratMate Labs - Price Snapshot Store
+Serializes each price snapshot once (plain, gzip and brotli) and tags it with an ETag
+Keeps recent versions so clients can ask for only what changed since theirs
+"""
+
+import collections
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+def content_digest(payload, stats_ticks=None):
+    """
+    Digest of the price content (sources, regions, calculations), ignoring timestamps
+
+    The derived stats summary drifts with the clock, so it is left out; stats_ticks
+    (the number of ticks the stats have recorded) stands in for it instead.
+    """
+    content = {
+        'sources': payload.get('sources', {}),
+        'regions': payload.get('regions', {}),
+        'calculations': payload.get('calculations', {})
+    }
+    if stats_ticks is not None:
+        content['stats_ticks'] = stats_ticks
+    raw = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def parse_accept_encoding(header):
+    """Parse an Accept-Encoding header into {coding: quality}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def etag_matches(if_none_match, etags):
+    """True if an If-None-Match header names any of etags (or is '*')"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = set()
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):  # If-None-Match uses weak comparison
+            tag = tag[2:]
+        tags.add(tag.strip('"'))
+    return any(etag in tags for etag in etags)
+
+
+class PriceSnapshot:
+    """One immutable, pre-serialized price snapshot"""
+
+    def __init__(self, payload, version, digest, tag=None):
+        self.payload = payload
+        self.version = version
+        self.digest = digest
+        self.created_at = time.time()
+        self.checked_at = self.created_at
+        self.deltas = {}  # since-version -> PriceSnapshot holding only the changes
+
+        self.body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.bodies = {
+            'identity': self.body,
+            'gzip': gzip.compress(self.body, compresslevel=6)
+        }
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(self.body, quality=11)
+
+        # Strong validators differ per content-coding (RFC 9110 8.8.3)
+        base_tag = tag or f'v{version}-{digest[:16]}'
+        self.etags = {
+            coding: base_tag if coding == 'identity' else f'{base_tag}-{coding}'
+            for coding in self.bodies
+        }
+
+    @property
+    def etag(self):
+        return self.etags['identity']
+
+    def age(self):
+        """Seconds since the prices were last confirmed against the sources"""
+        return time.time() - self.checked_at
+
+    def negotiate(self, accept_encoding):
+        """Pick the smallest representation the client accepts -> (coding, body, etag)"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for coding in ('br', 'gzip'):
+            quality = accepted.get(coding, accepted.get('*', 0))
+            if coding in self.bodies and quality > 0:
+                return coding, self.bodies[coding], self.etags[coding]
+        return 'identity', self.body, self.etag
+
+    def matches(self, if_none_match):
+        """True if any of the client's cached ETags is still current"""
+        return etag_matches(if_none_match, self.etags.values())
+
+
+def build_delta(old, new, calculation_sources):
+    """
+    Build the changes between two snapshot payloads
+    
+    Args:
+        old, new: Full snapshot payloads
+        calculation_sources: Function mapping a calculation key to the source keys it depends on
+    """
+    old_sources = old.get('sources', {})
+    new_sources = new.get('sources', {})
+    old_calcs = old.get('calculations', {})
+    new_calcs = new.get('calculations', {})
+    
+    changed = {key: value for key, value in new_sources.items() if old_sources.get(key) != value}
+    removed = sorted(key for key in old_sources if key not in new_sources)
+    touched = set(changed) | set(removed)
+    
+    old_regions = old.get('regions', {})
+    new_regions = new.get('regions', {})
+    regions = {}
+    for key, entries in new_regions.items():
+        changed_regions = {region: value for region, value in entries.items()
+                           if old_regions.get(key, {}).get(region) != value}
+        if changed_regions:
+            regions[key] = changed_regions
+    removed_regions = sorted(
+        f'{key}/{region}' for key, entries in old_regions.items()
+        for region in entries if region not in new_regions.get(key, {})
+    )
+    
+    calculations = {
+        key: value for key, value in new_calcs.items()
+        if touched.intersection(calculation_sources(key)) or old_calcs.get(key) != value
+    }
+    
+    return {
+        'success': new.get('success', True),
+        'full': False,
+        'since': old['version'],
+        'version': new['version'],
+        'timestamp': new.get('timestamp'),
+        'sources': changed,
+        'removed_sources': removed,
+        'regions': regions,
+        'removed_regions': removed_regions,
+        'calculations': calculations,
+        'removed_calculations': sorted(key for key in old_calcs if key not in new_calcs),
+        'stats': {key: value for key, value in new.get('stats', {}).items()
+                  if key in touched or old.get('stats', {}).get(key) != value},
+        'provider': new.get('provider')
+    }
+
+
+class SnapshotStore:
+    """
+    Holds the latest price snapshot; the version only moves when prices change or,
+    with stats_ticks (a callable -> ticks recorded), when the stats record a new tick
+    """
+
+    def __init__(self, history=32, calculation_sources=None, stats_ticks=None):
+        self._lock = threading.Lock()
+        self._current = None
+        self._version = 0
+        self._history = collections.OrderedDict()  # version -> PriceSnapshot
+        self._history_size = history
+        self._calculation_sources = calculation_sources or (lambda key: ())
+        self._stats_ticks = stats_ticks
+
+    def current(self):
+        return self._current
+
+    def publish(self, payload):
+        """Publish freshly fetched data, reusing the current snapshot if nothing changed"""
+        digest = content_digest(payload, self._stats_ticks() if self._stats_ticks else None)
+        with self._lock:
+            current = self._current
+            if current is not None and current.digest == digest:
+                current.checked_at = time.time()
+                return current
+
+            self._version += 1
+            payload = dict(payload, version=self._version, full=True)
+            return self._add(PriceSnapshot(payload, self._version, digest))
+
+    def install(self, payload, digest, checked_at):
+        """Adopt a snapshot versioned elsewhere (e.g. by the shared-memory refresher)"""
+        with self._lock:
+            snapshot = PriceSnapshot(payload, payload['version'], digest)
+            snapshot.checked_at = checked_at
+            self._version = max(self._version, snapshot.version)
+            return self._add(snapshot)
+
+    def _add(self, snapshot):
+        self._current = snapshot
+        self._history[snapshot.version] = snapshot
+        while len(self._history) > self._history_size:
+            self._history.popitem(last=False)
+        return snapshot
+
+    def delta_since(self, snapshot, since):
+        """
+        Changes from version `since` up to `snapshot`
+        
+        Falls back to the full snapshot when `since` is no longer retained
+        (client too far behind) or is not a version this store produced.
+        """
+        if since == snapshot.version:
+            since_snapshot = snapshot
+        else:
+            since_snapshot = self._history.get(since)
+        if since_snapshot is None or since > snapshot.version:
+            return snapshot
+        
+        delta = snapshot.deltas.get(since)
+        if delta is None:
+            payload = build_delta(since_snapshot.payload, snapshot.payload, self._calculation_sources)
+            delta = PriceSnapshot(payload, snapshot.version, snapshot.digest,
+                                  tag=f'v{snapshot.version}-since{since}-{snapshot.digest[:16]}')
+            snapshot.deltas[since] = delta
+        return delta
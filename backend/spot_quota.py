@@ -0,0 +1,191 @@
+"""
+KaratMate Labs - Spot-Price API Quotas
+Persistent token bucket per spot-price API plus the last quote it returned
+
+Every tracker run (a fresh process) and the API server share one state file,
+so a burst of runs draws from the same budget. Buckets refill at
+monthly_quota / month, which spreads calls evenly over the month; inside that
+spacing, or when the bucket is empty, callers get the cached quote. A cached
+quote older than max_age is still returned, but flagged stale with its age.
+"""
+
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+MONTH_SECONDS = 30.44 * 24 * 3600
+# Cached quotes older than this are flagged stale (above goldapi.io's ~8h call spacing)
+DEFAULT_MAX_QUOTE_AGE = 24 * 3600
+DEFAULT_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spot_quota.json')
+
+# Calls per month we allow ourselves (a margin under each provider's free tier)
+SPOT_API_BUDGETS = {
+    'gold-api.com': {'monthly_quota': 2900, 'burst': 3},
+    'goldapi.io': {'monthly_quota': 90, 'burst': 2}
+}
+
+
+class TokenBucket:
+    """Classic token bucket; state is plain numbers so it can be persisted"""
+
+    def __init__(self, capacity, refill_per_second, tokens=None, updated_at=None):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity if tokens is None else tokens
+        self.updated_at = time.time() if updated_at is None else updated_at
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated_at)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def take(self, now=None):
+        """Spend one token if available"""
+        self._refill(time.time() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def seconds_until_token(self, now=None):
+        self._refill(time.time() if now is None else now)
+        return max(0.0, (1 - self.tokens) / self.refill_per_second)
+
+
+@contextlib.contextmanager
+def file_lock(path, timeout=10):
+    """Cross-process lock via an exclusively created lock file (works on Windows too)"""
+    lock_path = path + '.lock'
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.time() > deadline:
+                # Left behind by a crashed process
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(lock_path)
+                deadline = time.time() + timeout
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(lock_path)
+
+
+class SpotQuoteCache:
+    """Budgeted access to the spot-price APIs, backed by a JSON state file"""
+
+    def __init__(self, path=DEFAULT_STATE_FILE, budgets=None, max_age=DEFAULT_MAX_QUOTE_AGE):
+        self.path = path
+        self.budgets = budgets or SPOT_API_BUDGETS
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, state):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.spot-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f, indent=4)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @contextlib.contextmanager
+    def _state(self):
+        with self._lock, file_lock(self.path):
+            state = self._load()
+            yield state
+            self._save(state)
+
+    def _bucket(self, api, entry):
+        budget = self.budgets[api]
+        return TokenBucket(budget['burst'], budget['monthly_quota'] / MONTH_SECONDS,
+                           entry.get('tokens'), entry.get('updated_at'))
+
+    def min_interval(self, api):
+        """Even spacing of the monthly quota, in seconds"""
+        return MONTH_SECONDS / self.budgets[api]['monthly_quota']
+
+    def _cached(self, entry, reason):
+        if entry.get('quote') is None:
+            return None
+        age = max(0.0, time.time() - entry['quote_at'])
+        return {'value': entry['quote'], 'fetched_at': entry['quote_at'], 'cached': True, 'reason': reason,
+                'age': round(age), 'stale': age > self.max_age}
+
+    def get(self, api, fetch):
+        """
+        Spot quote from `api` -> {'value', 'fetched_at', 'cached', 'reason', 'age', 'stale'} or None
+
+        fetch() performs the real call and returns a JSON-serializable value, or
+        None on failure. It is only called when the last quote is older than
+        min_interval() and the API's bucket has a token; the token is spent
+        before the call, so concurrent runs cannot overdraw the budget. When the
+        cached quote is returned instead and is older than max_age, it comes
+        back with 'stale': True; 'age' is in seconds.
+        """
+        now = time.time()
+        with self._state() as state:
+            entry = state.setdefault(api, {})
+            if entry.get('quote') is not None and now - entry['quote_at'] < self.min_interval(api):
+                return self._cached(entry, 'fresh')
+            bucket = self._bucket(api, entry)
+            allowed = bucket.take(now)
+            entry['tokens'] = bucket.tokens
+            entry['updated_at'] = bucket.updated_at
+            if not allowed:
+                return self._cached(entry, 'budget')
+            entry['calls'] = entry.get('calls', 0) + 1
+
+        value = fetch()
+        if value is None:
+            with self._state() as state:
+                return self._cached(state.get(api, {}), 'error')
+
+        fetched_at = time.time()
+        with self._state() as state:
+            entry = state.setdefault(api, {})
+            entry['quote'] = value
+            entry['quote_at'] = fetched_at
+        return {'value': value, 'fetched_at': fetched_at, 'cached': False, 'reason': 'fetched',
+                'age': 0, 'stale': False}
+
+    def status(self):
+        """Tokens left, next token ETA and quote age per API"""
+        now = time.time()
+        with self._lock, file_lock(self.path):
+            state = self._load()
+        result = {}
+        for api in self.budgets:
+            entry = state.get(api, {})
+            bucket = self._bucket(api, entry)
+            next_token_in = bucket.seconds_until_token(now)
+            result[api] = {
+                'monthly_quota': self.budgets[api]['monthly_quota'],
+                'tokens': round(bucket.tokens, 2),
+                'next_token_in': round(next_token_in),
+                'calls': entry.get('calls', 0),
+                'quote_age': round(now - entry['quote_at']) if entry.get('quote_at') else None,
+                'quote_stale': bool(entry.get('quote_at')) and now - entry['quote_at'] > self.max_age
+            }
+        return result
+
+
+# Shared by every GoldPriceTracker in this process
+spot_quotes = SpotQuoteCache()
@@ -0,0 +1,141 @@
+"""
+KaratMate Labs - Tracker Jobs
+Runs long tracker runs in the background as jobs: POST returns a job id at once,
+progress events are recorded as each source finishes, and the report stays
+fetchable by id until the finished job expires
+
+Jobs run through a RunQueue (run_queue.py), so its concurrency and queue limits
+apply. A job keeps running when the client that started it goes away; asking
+for a run while one with the same key is queued or running returns that job.
+"""
+
+import threading
+import time
+import uuid
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """One run: its state, progress events and, once done, the report"""
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.state = QUEUED
+        self.events = []
+        self.report = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    def emit(self, event, state=None, **data):
+        """
+        Record a progress event (numbered from 1) and wake anyone waiting for events
+
+        A new state is set together with its event, so a waiter never sees a
+        finished job without its done/failed event.
+        """
+        with self._changed:
+            if state is not None:
+                self.state = state
+            self.events.append(dict({'id': len(self.events) + 1, 'event': event, 'at': time.time()}, **data))
+            self._changed.notify_all()
+
+    def start(self):
+        self.emit('running', state=RUNNING)
+
+    def finish(self, report=None, error=None):
+        self.report = report
+        self.error = error
+        self.finished_at = time.time()
+        if error is not None:
+            self.emit(FAILED, state=FAILED, error=error)
+        else:
+            self.emit(DONE, state=DONE)
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def events_after(self, last_id, timeout=None):
+        """Events newer than last_id, waiting up to timeout seconds for one ([] if none came)"""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > last_id or self.finished, timeout)
+            return self.events[last_id:]
+
+    def wait(self, timeout=None):
+        """Block until the job finishes -> report; raises RuntimeError if it failed"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.finished, timeout)
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        return self.report
+
+    def summary(self, report=True):
+        summary = {
+            'id': self.id,
+            'state': self.state,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'progress': [event for event in self.events if event['event'] == 'source'],
+            'error': self.error
+        }
+        if report:
+            summary['report'] = self.report
+        return summary
+
+
+class JobStore:
+    """Jobs by id; finished ones are dropped `ttl` seconds after they end"""
+
+    def __init__(self, queue, ttl=900):
+        self.queue = queue
+        self.ttl = ttl
+        self._jobs = {}
+        self._active = {}  # key -> queued or running Job
+        self._lock = threading.Lock()
+
+    def start(self, key, fn, *args):
+        """
+        Run fn(*args, progress=job.emit) as a job, or join the active job for key
+
+        Returns (job, shared). Raises QueueFull when the run queue has no room.
+        """
+        with self._lock:
+            self._expire()
+            job = self._active.get(key)
+            if job is not None:
+                return job, True
+            job = Job(key)
+            # Never shares at the queue level: jobs are unique, sharing happens here by key
+            self.queue.submit(job.id, self._run, job, fn, args)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            return job, False
+
+    def _run(self, job, fn, args):
+        job.start()
+        try:
+            report, error = fn(*args, progress=job.emit), None
+        except Exception as e:
+            report, error = None, str(e)
+        with self._lock:
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+        job.finish(report, error)
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < cutoff]:
+            del self._jobs[job_id]
@@ -58,6 +58,7 @@ function App() {
       const data = await response.json();
       
       if (data.success) {
+        setConfig({ ...config, version: data.version });
         showMessage('✅ Configuration saved successfully!', 'success');
       } else {
         showMessage(`❌ Error: ${data.error}`, 'error');
@@ -74,21 +75,47 @@ function App() {
       setLoading(true);
       showMessage('📊 Fetching gold prices from all sources...', 'info');
       
-      const response = await fetch(`${API_URL}/api/fetch-prices`, {
+      // Start a background job and follow its progress instead of holding the request open
+      const response = await fetch(`${API_URL}/api/jobs`, {
         method: 'POST'
       });
       const data = await response.json();
-      
-      if (data.success) {
-        setReport(data.report);
+
+      if (!data.success) {
+        const retry = response.headers.get('Retry-After');
+        showMessage(`❌ Error: ${data.error}${retry ? ` (retry in ${retry}s)` : ''}`, 'error');
+        setLoading(false);
+        return;
+      }
+
+      const jobId = data.job.id;
+      const events = new EventSource(`${API_URL}/api/jobs/${jobId}/events`);
+      events.addEventListener('source', (event) => {
+        const progress = JSON.parse(event.data);
+        showMessage(`📊 ${progress.source}: ${progress.success ? 'done' : 'failed'} (${progress.done}/${progress.total})`, 'info');
+      });
+      events.addEventListener('done', async () => {
+        events.close();
+        const result = await (await fetch(`${API_URL}/api/jobs/${jobId}`)).json();
+        setReport(result.job.report);
         showMessage('✅ Prices fetched successfully!', 'success');
         loadReports(); // Refresh reports list
-      } else {
-        showMessage(`❌ Error: ${data.error}`, 'error');
-      }
+        setLoading(false);
+      });
+      events.addEventListener('failed', (event) => {
+        events.close();
+        showMessage(`❌ Error: ${JSON.parse(event.data).error}`, 'error');
+        setLoading(false);
+      });
+      events.onerror = () => {
+        // Dropped connections reconnect by themselves (resuming after the last event); this is a closed stream
+        if (events.readyState === EventSource.CLOSED) {
+          showMessage('❌ Error: lost track of the price fetch', 'error');
+          setLoading(false);
+        }
+      };
     } catch (error) {
       showMessage(`❌ Error: ${error.message}`, 'error');
-    } finally {
       setLoading(false);
     }
   };